@@ -1,118 +1,274 @@
 from models.db import get_db
-from datetime import datetime, timedelta
+from ai.forecast import forecast_station
+from datetime import date, datetime, timedelta
+import json
 import logging
+import time
+import config
 
 logger = logging.getLogger(__name__)
 
 
-def get_peak_hours(station_name):
+# ===============================
+# SHARED SCAN
+# ===============================
+# Hourly rollup rows (models/hourly_stats.py) of the last 60 days: at
+# most 1440 primary-key rows per station, however long its history. Rows
+# are keyed "YYYY-MM-DD HH:00:00" and compared with the window bounds as
+# text, exactly as started_at used to be.
+_WINDOW_SQL = """
+    SELECT hour, sessions, units, revenue, duration_sessions, total_duration
+    FROM station_hourly_stats
+    WHERE station_id = ? AND hour > ?
+"""
+
+
+def window_bounds(now):
+    """Lower bounds (ISO strings, compared as text as before)"""
+    return (now - timedelta(days=30)).isoformat(), (now - timedelta(days=60)).isoformat()
+
+
+def scan_station(cur, station_name, now=None):
     """
-    Predict peak charging hours for a station based on historical data
-    Returns: List of hours (0-23) and their activity levels
+    Everything the four station reports need: one station lookup and one
+    read of the station's hourly rollup for the 60-day window. None for an
+    unknown station.
+    """
+    cur.execute("""
+        SELECT id, price, chargers, green_score FROM stations WHERE name = ? ORDER BY id LIMIT 1
+    """, (station_name,))
+    station = cur.fetchone()
+    if not station:
+        return None
+    station_id = station[0]
+
+    now = now or datetime.now()
+    since_30, since_60 = window_bounds(now)
+    return make_scan(station, now, *window_totals(window_rows(cur, station_id, since_60), since_30))
+
+
+def window_rows(cur, station_id, since_60):
+    """The station's _WINDOW_SQL rows"""
+    cur.execute(_WINDOW_SQL, (station_id, since_60))
+    return cur.fetchall()
+
+
+def window_totals(rows, since_30, weekdays=None):
     """
+    [hour_counts, weekday_counts, units, revenue, duration_sessions,
+    total_duration] of a station's _WINDOW_SQL rows. weekdays caches
+    day -> weekday and may be shared between stations.
+    """
+    weekdays = {} if weekdays is None else weekdays
+    hour_counts = [0] * 24
+    weekday_counts = [0] * 7
+    units = revenue = duration_sessions = total_duration = 0
+    for hour_key, sessions, hour_units, hour_revenue, hour_durations, hour_minutes in rows:
+        day, hour = hour_key[:10], hour_key[11:13]
+        if day not in weekdays:
+            try:
+                weekdays[day] = date.fromisoformat(day).weekday()
+            except ValueError:
+                weekdays[day] = None
+        if weekdays[day] is None or not hour.isdigit() or int(hour) > 23:
+            continue  # started_at that is not a timestamp
+        weekday_counts[weekdays[day]] += sessions
+        if hour_key > since_30:
+            hour_counts[int(hour)] += sessions
+            units += hour_units
+            revenue += hour_revenue
+            duration_sessions += hour_durations
+            total_duration += hour_minutes
+    return [hour_counts, weekday_counts, units, revenue, duration_sessions, total_duration]
+
+
+def make_scan(station, now, hour_counts, weekday_counts, units, revenue, duration_sessions, total_duration):
+    """Scan dict from a (id, price, chargers, green_score) row and its window totals"""
+    station_id, price, chargers, green_score = station
+    return {
+        "station_id": station_id,
+        "price": price,
+        "chargers": chargers,
+        "green_score": green_score,
+        "now": now,
+        "hour_counts": hour_counts,
+        "weekday_counts": weekday_counts,
+        "avg_unit_price_30d": revenue / units if units > 0 else None,
+        "avg_duration": total_duration / duration_sessions if duration_sessions else None,
+        "duration_sessions": duration_sessions,
+    }
+
+
+def _scan(station_name):
     conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        # Get charging sessions from last 30 days
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        return scan_station(conn.cursor(), station_name)
+    finally:
+        conn.close()
+
+
+# ===============================
+# REPORTS
+# ===============================
+def peak_hours_report(hour_counts):
+    """[{hour, count, intensity 0-10, is_peak}] or None without sessions"""
+    total = sum(hour_counts)
+    if total == 0:
+        return None
+    
+    busiest = max(hour_counts)
+    
+    # Return hours with intensity (0-10 scale)
+    hours_data = []
+    for hour, count in enumerate(hour_counts):
+        hours_data.append({
+            "hour": f"{hour:02d}:00",
+            "count": count,
+            "intensity": min(10, int((count / busiest) * 10)),
+            "is_peak": count > (total / 12)  # Peak if above average
+        })
+    
+    return hours_data
+
+
+def demand_forecast_report(weekday_counts, today, days_ahead=7):
+    """
+    Expected sessions per day: the same weekday's count in the window.
+    Used for stations the demand model (ai/forecast.py) has not fitted yet.
+    """
+    forecast = []
+    
+    for i in range(days_ahead):
+        future_date = today + timedelta(days=i)
+        demand = weekday_counts[future_date.weekday()]
         
+        forecast.append({
+            "date": future_date.strftime("%Y-%m-%d"),
+            "day": future_date.strftime("%A"),
+            "expected_sessions": demand,
+            "confidence": "high" if demand > 5 else "medium" if demand > 0 else "low"
+        })
+    
+    return forecast
+
+
+def price_trend_report(current_price, avg_unit_price):
+    """Current price against the average paid per unit (revenue / units)"""
+    historical_avg = avg_unit_price if avg_unit_price else current_price
+    
+    trend = "stable"
+    if current_price > historical_avg * 1.1:
+        trend = "increasing"
+    elif current_price < historical_avg * 0.9:
+        trend = "decreasing"
+    
+    return {
+        "current_price": round(current_price, 2),
+        "historical_avg": round(historical_avg, 2),
+        "trend": trend,
+        "recommendation": "Consider charging soon - prices are low!" if trend == "decreasing" else "Prices may increase soon" if trend == "increasing" else "Prices are stable"
+    }
+
+
+def efficiency_report(chargers, green_score, avg_duration, total_sessions):
+    """Charging time over the last 30 days and green score rating"""
+    avg_duration = avg_duration or 0
+    total_sessions = total_sessions or 0
+    
+    return {
+        "avg_charging_time_minutes": round(avg_duration, 1) if avg_duration > 0 else "N/A",
+        "total_sessions_30d": total_sessions,
+        "available_chargers": chargers,
+        "green_score": green_score,
+        "efficiency_rating": "Excellent" if avg_duration < 60 and green_score >= 8 else "Good" if avg_duration < 90 and green_score >= 6 else "Standard",
+        "recommendation": "Fast and eco-friendly!" if avg_duration < 60 and green_score >= 8 else "Reliable option" if total_sessions > 50 else "Growing station"
+    }
+
+
+def model_forecast_report(scan, days_ahead=7, model=None):
+    """Demand model forecast with hourly occupancy; weekday counts until it covers the station"""
+    try:
+        forecast = forecast_station(scan["station_id"], days_ahead, model)
+    except Exception as e:
+        logger.error(f"Demand model unavailable: {e}")
+        forecast = None
+    if forecast is None:
+        return demand_forecast_report(scan["weekday_counts"], scan["now"], days_ahead)
+    return forecast
+
+
+def summary_report(scan, model=None):
+    """All four reports from one scan"""
+    return {
+        "peak_hours": peak_hours_report(scan["hour_counts"]),
+        "demand_forecast": model_forecast_report(scan, model=model),
+        "price_trend": price_trend_report(scan["price"], scan["avg_unit_price_30d"]),
+        "efficiency": efficiency_report(scan["chargers"], scan["green_score"],
+                                        scan["avg_duration"], scan["duration_sessions"])
+    }
+
+
+# ===============================
+# SNAPSHOTS (ai/batch_analytics.py)
+# ===============================
+def snapshot_is_fresh(computed_at, now=None):
+    """Written less than ANALYTICS_SNAPSHOT_MAX_AGE ago, on the current UTC day"""
+    now = now or time.time()
+    if now - computed_at > config.ANALYTICS_SNAPSHOT_MAX_AGE:
+        return False
+    # Forecast dates start at the UTC day the snapshot was written
+    return time.gmtime(computed_at)[:3] == time.gmtime(now)[:3]
+
+
+def _snapshot(station_name):
+    """The station's precomputed summary, or None if missing or stale"""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
         cur.execute("""
-            SELECT started_at FROM charging_sessions 
-            WHERE station_name = ? AND started_at > ?
-        """, (station_name, thirty_days_ago))
-        
-        sessions = cur.fetchall()
-        
-        # Count sessions by hour of day
-        hour_counts = [0] * 24
-        for session in sessions:
-            if session[0]:
-                try:
-                    hour = datetime.fromisoformat(session[0]).hour
-                    hour_counts[hour] += 1
-                except:
-                    pass
-        
-        # Calculate average
-        total = sum(hour_counts)
-        if total == 0:
-            return None
-        
-        avg = total / 24
-        
-        # Return hours with intensity (0-10 scale)
-        hours_data = []
-        for hour, count in enumerate(hour_counts):
-            intensity = min(10, int((count / max(hour_counts)) * 10)) if max(hour_counts) > 0 else 0
-            hours_data.append({
-                "hour": f"{hour:02d}:00",
-                "count": count,
-                "intensity": intensity,
-                "is_peak": count > (total / 12)  # Peak if above average
-            })
-        
-        return hours_data
-        
+            SELECT snap.computed_at, snap.report
+            FROM stations s
+            JOIN station_analytics_snapshot snap ON snap.station_id = s.id
+            WHERE s.name = ?
+            ORDER BY s.id LIMIT 1
+        """, (station_name,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if not row or not snapshot_is_fresh(row[0]):
+        return None
+    return json.loads(row[1])
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+def get_peak_hours(station_name):
+    """
+    Predict peak charging hours for a station based on historical data
+    Returns: List of hours (0-23) and their activity levels
+    """
+    try:
+        scan = _scan(station_name)
+        return peak_hours_report(scan["hour_counts"]) if scan else None
     except Exception as e:
         logger.error(f"Error predicting peak hours: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_station_demand_forecast(station_name, days_ahead=7):
     """
-    Forecast demand for a station over next N days
-    Based on historical weekday patterns
+    Forecast demand for a station over next N days: expected sessions,
+    peak hour and predicted charger occupancy per day (ai/forecast.py)
     """
-    conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        # Get data from last 60 days
-        sixty_days_ago = (datetime.now() - timedelta(days=60)).isoformat()
-        
-        cur.execute("""
-            SELECT started_at FROM charging_sessions 
-            WHERE station_name = ? AND started_at > ?
-        """, (station_name, sixty_days_ago))
-        
-        sessions = cur.fetchall()
-        
-        # Count by weekday (0=Monday, 6=Sunday)
-        weekday_counts = [0] * 7
-        for session in sessions:
-            if session[0]:
-                try:
-                    dt = datetime.fromisoformat(session[0])
-                    weekday_counts[dt.weekday()] += 1
-                except:
-                    pass
-        
-        # Generate forecast
-        forecast = []
-        today = datetime.now()
-        
-        for i in range(days_ahead):
-            future_date = today + timedelta(days=i)
-            weekday = future_date.weekday()
-            demand = weekday_counts[weekday]
-            
-            forecast.append({
-                "date": future_date.strftime("%Y-%m-%d"),
-                "day": future_date.strftime("%A"),
-                "expected_sessions": demand,
-                "confidence": "high" if demand > 5 else "medium" if demand > 0 else "low"
-            })
-        
-        return forecast
-        
+        scan = _scan(station_name)
+        if not scan:
+            return demand_forecast_report([0] * 7, datetime.now(), days_ahead)
+        return model_forecast_report(scan, days_ahead)
     except Exception as e:
         logger.error(f"Error forecasting demand: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_price_trend(station_name, days=30):
@@ -120,50 +276,14 @@ def get_price_trend(station_name, days=30):
     Analyze price trends for a station
     Returns: Average price over time, trend direction
     """
-    conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        cur.execute("""
-            SELECT price FROM stations WHERE name = ?
-        """, (station_name,))
-        
-        result = cur.fetchone()
-        if not result:
+        scan = _scan(station_name)
+        if not scan:
             return None
-        
-        current_price = result[0]
-        
-        # Get average historical price
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-        
-        cur.execute("""
-            SELECT AVG(amount/units) as avg_price 
-            FROM charging_sessions 
-            WHERE station_name = ? AND started_at > ? AND units > 0
-        """, (station_name, thirty_days_ago))
-        
-        hist_result = cur.fetchone()
-        historical_avg = hist_result[0] if hist_result and hist_result[0] else current_price
-        
-        trend = "stable"
-        if current_price > historical_avg * 1.1:
-            trend = "increasing"
-        elif current_price < historical_avg * 0.9:
-            trend = "decreasing"
-        
-        return {
-            "current_price": round(current_price, 2),
-            "historical_avg": round(historical_avg, 2),
-            "trend": trend,
-            "recommendation": "Consider charging soon - prices are low!" if trend == "decreasing" else "Prices may increase soon" if trend == "increasing" else "Prices are stable"
-        }
-        
+        return price_trend_report(scan["price"], scan["avg_unit_price_30d"])
     except Exception as e:
         logger.error(f"Error analyzing price trend: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_station_efficiency_metrics(station_name):
@@ -171,55 +291,38 @@ def get_station_efficiency_metrics(station_name):
     Analyze station efficiency metrics
     Returns: Average charging time, throughput, ratings
     """
-    conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        # Get sessions with duration
-        cur.execute("""
-            SELECT AVG(duration_minutes) as avg_duration, COUNT(*) as total_sessions
-            FROM charging_sessions 
-            WHERE station_name = ? AND duration_minutes IS NOT NULL
-        """, (station_name,))
-        
-        result = cur.fetchone()
-        avg_duration = result[0] if result and result[0] else 0
-        total_sessions = result[1] if result and result[1] else 0
-        
-        # Get station info
-        cur.execute("""
-            SELECT chargers, green_score FROM stations WHERE name = ?
-        """, (station_name,))
-        
-        station_info = cur.fetchone()
-        if not station_info:
+        scan = _scan(station_name)
+        if not scan:
             return None
-        
-        chargers, green_score = station_info
-        
-        metrics = {
-            "avg_charging_time_minutes": round(avg_duration, 1) if avg_duration > 0 else "N/A",
-            "total_sessions_30d": total_sessions,
-            "available_chargers": chargers,
-            "green_score": green_score,
-            "efficiency_rating": "Excellent" if avg_duration < 60 and green_score >= 8 else "Good" if avg_duration < 90 and green_score >= 6 else "Standard",
-            "recommendation": "Fast and eco-friendly!" if avg_duration < 60 and green_score >= 8 else "Reliable option" if total_sessions > 50 else "Growing station"
-        }
-        
-        return metrics
-        
+        return efficiency_report(scan["chargers"], scan["green_score"],
+                                 scan["avg_duration"], scan["duration_sessions"])
     except Exception as e:
         logger.error(f"Error getting efficiency metrics: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def get_all_analytics_summary(station_name):
-    """Get comprehensive analytics for a station"""
-    return {
-        "peak_hours": get_peak_hours(station_name),
-        "demand_forecast": get_station_demand_forecast(station_name),
-        "price_trend": get_price_trend(station_name),
-        "efficiency": get_station_efficiency_metrics(station_name)
-    }
+    """
+    Get comprehensive analytics for a station: the batch snapshot when a
+    fresh one exists, otherwise all four reports from a single
+    scan_station() on one connection
+    """
+    try:
+        snapshot = _snapshot(station_name)
+        if snapshot is not None:
+            return snapshot
+        scan = _scan(station_name)
+    except Exception as e:
+        logger.error(f"Error loading station analytics: {e}")
+        return {"peak_hours": None, "demand_forecast": None, "price_trend": None, "efficiency": None}
+    
+    if not scan:
+        return {
+            "peak_hours": None,
+            "demand_forecast": demand_forecast_report([0] * 7, datetime.now()),
+            "price_trend": None,
+            "efficiency": None
+        }
+    
+    return summary_report(scan)
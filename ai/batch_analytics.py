@@ -0,0 +1,194 @@
+"""
+Station analytics for the whole network in one pass.
+
+`flask analytics-snapshot` (run_batch_analytics) builds the four reports
+of ai/analytics.py for every station and stores them in
+station_analytics_snapshot, where the station analytics page reads them
+instead of querying on demand:
+
+1. the stored demand model of ai/forecast.py (refitted here if missing or
+   stale), read once for all stations
+2. stations split into chunks of consecutive ids; each chunk is one
+   grouped primary-key range read of station_hourly_stats (the hourly
+   rollup of charging_sessions): the last 30 days summed per station and
+   hour of day, so SQLite folds the hourly rows instead of Python
+3. each chunk written in its own short transaction
+
+Weekday counts (60 days) only feed the forecast of stations the demand
+model does not cover yet; those few stations are read one at a time.
+"""
+import json
+import logging
+import time
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+import config
+from models.db import get_db
+from ai.analytics import make_scan, summary_report, window_bounds, window_rows, window_totals
+from ai.forecast import fit_demand_model, model_is_stale, read_demand_model
+
+logger = logging.getLogger(__name__)
+
+# A chunk's stations and its 30-day rollup rows grouped per station and
+# hour of day, both in station order (the GROUP BY sorts). Rollup rows
+# are keyed "YYYY-MM-DD HH:00:00"; hours that are not 00-23 are skipped
+# as in window_totals(). One GROUP BY weekday/hour over the whole table
+# was measured slower: strftime() on every row plus one large temp B-tree.
+_CHUNK_STATIONS_SQL = """
+    SELECT id, price, chargers, green_score, name FROM stations
+    WHERE id BETWEEN ? AND ? ORDER BY id
+"""
+_CHUNK_HOURS_SQL = """
+    SELECT station_id, substr(hour, 12, 2) AS hour_of_day, SUM(sessions), SUM(units), SUM(revenue),
+           SUM(duration_sessions), SUM(total_duration)
+    FROM station_hourly_stats
+    WHERE station_id BETWEEN ? AND ? AND hour > ?
+    GROUP BY station_id, hour_of_day
+"""
+_HOURS = {f"{hour:02d}": hour for hour in range(24)}
+
+
+def hour_totals(rows, weekday_counts):
+    """
+    window_totals() of ai/analytics.py from a station's _CHUNK_HOURS_SQL
+    rows and its weekday counts
+    """
+    hour_counts = [0] * 24
+    units = revenue = duration_sessions = total_duration = 0
+    for hour_of_day, sessions, hour_units, hour_revenue, hour_durations, hour_minutes in rows:
+        hour = _HOURS.get(hour_of_day)
+        if hour is None:
+            continue  # started_at that is not a timestamp
+        hour_counts[hour] += sessions
+        units += hour_units
+        revenue += hour_revenue
+        duration_sessions += hour_durations
+        total_duration += hour_minutes
+    return [hour_counts, weekday_counts, units, revenue, duration_sessions, total_duration]
+
+
+def build_snapshots(first_id, last_id, model, now):
+    """[(station_id, name, report JSON)] for the stations with ids first_id..last_id"""
+    since_30, since_60 = window_bounds(now)
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(_CHUNK_STATIONS_SQL, (first_id, last_id))
+        stations = cur.fetchall()
+        cur.execute(_CHUNK_HOURS_SQL, (first_id, last_id, since_30))
+        rows = {station_id: [row[1:] for row in group]
+                for station_id, group in groupby(cur.fetchall(), itemgetter(0))}
+
+        weekdays = {}
+        snapshots = []
+        for station_id, price, chargers, green_score, name in stations:
+            station = (station_id, price, chargers, green_score)
+            if model is not None and station_id in model.rows:
+                # The model forecast replaces the weekday counts
+                totals = hour_totals(rows.get(station_id, ()), None)
+            else:
+                totals = window_totals(window_rows(cur, station_id, since_60), since_30, weekdays)
+            scan = make_scan(station, now, *totals)
+            snapshots.append((station_id, name, json.dumps(summary_report(scan, model))))
+    finally:
+        conn.close()
+    return snapshots
+
+
+def _write(conn, snapshots, computed_at):
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT OR REPLACE INTO station_analytics_snapshot (station_id, station_name, computed_at, report)
+        VALUES (?, ?, ?, ?)
+    """, [(station_id, name, computed_at, report) for station_id, name, report in snapshots])
+    conn.commit()
+
+
+def run_batch_analytics(chunk_size=500, progress=None):
+    """
+    Rebuild every station's snapshot. progress(done, total, elapsed) is
+    called after each chunk is written. Returns timings and counts.
+    """
+    start = time.perf_counter()
+    now = datetime.now()
+
+    # A batch job may fit; the stored fit is used unless missing or stale
+    model = read_demand_model()
+    if model is None or model_is_stale(model):
+        model = fit_demand_model()
+    fitted = time.perf_counter()
+
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM stations ORDER BY id")
+        ids = [row[0] for row in cur.fetchall()]
+        computed_at = time.time()
+        done = 0
+        write_seconds = 0.0
+
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            snapshots = build_snapshots(chunk[0], chunk[-1], model, now)
+            began = time.perf_counter()
+            _write(conn, snapshots, computed_at)
+            write_seconds += time.perf_counter() - began
+            done += len(snapshots)
+            if progress:
+                progress(done, len(ids), time.perf_counter() - start)
+
+        # Stations deleted since the last run
+        cur.execute("""
+            DELETE FROM station_analytics_snapshot
+            WHERE station_id NOT IN (SELECT id FROM stations)
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+    finished = time.perf_counter()
+    result = {
+        "stations": done,
+        "seconds": round(finished - start, 2),
+        "model_ms": round((fitted - start) * 1000, 1),
+        "build_ms": round((finished - fitted - write_seconds) * 1000, 1),
+        "write_ms": round(write_seconds * 1000, 1),
+    }
+    logger.info(f"Analytics snapshot: {result}")
+    return result
+
+
+def snapshot_stats():
+    """Number of snapshots and the age (seconds) of the newest and oldest"""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(computed_at), MIN(computed_at) FROM station_analytics_snapshot")
+        count, newest, oldest = cur.fetchone()
+    finally:
+        conn.close()
+    now = time.time()
+    return {
+        "stations": count,
+        "newest_age_seconds": round(now - newest, 1) if newest else None,
+        "oldest_age_seconds": round(now - oldest, 1) if oldest else None,
+        "max_age": config.ANALYTICS_SNAPSHOT_MAX_AGE,
+    }
+
+
+def init_app(app):
+    """Register the `flask analytics-snapshot` command"""
+    import click
+
+    @app.cli.command("analytics-snapshot")
+    @click.option("--chunk-size", type=int, default=500, help="Stations per chunk")
+    def analytics_snapshot(chunk_size):
+        """Precompute station analytics for every station"""
+        def progress(done, total, elapsed):
+            print(f"  {done}/{total} stations ({done / total:.0%}) {elapsed:.1f} s")
+
+        result = run_batch_analytics(chunk_size, progress)
+        print(f"✓ {result['stations']} station snapshots in {result['seconds']} s "
+              f"(model {result['model_ms']} ms, "
+              f"scans and reports {result['build_ms']} ms, writes {result['write_ms']} ms)")
@@ -0,0 +1,263 @@
+"""
+Bounded LRU caches with a TTL for results of slow AI calls.
+
+Entries live in process memory (least recently used evicted first once
+max_size is reached, expired after ttl seconds). A cache created with
+persist=True also writes its entries to the ai_cache table of ev.db, so
+they survive restarts and are shared by every worker process: a memory
+miss falls back to one primary-key lookup before the caller pays for
+the real call. Persisted values must be JSON serializable.
+
+get_or_compute() also deduplicates concurrent misses (single flight):
+while one thread computes a key, other threads asking for the same key
+wait for its result instead of making the same slow call.
+
+Cache failures are logged and treated as misses; they never break the
+request that asked.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from models.db import get_db
+
+logger = logging.getLogger(__name__)
+
+# Expired ai_cache rows are deleted every this many persisted writes
+PURGE_EVERY = 200
+
+
+class _Flight:
+    """One in-progress computation other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """Thread-safe LRU + TTL cache with hit/miss counters"""
+
+    def __init__(self, name, max_size=1024, ttl=3600.0, persist=False):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at monotonic, value)
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._writes = 0
+        self._errors = 0
+        self._flights = {}              # key -> _Flight being computed
+        self._computes = 0
+        self._compute_seconds = 0.0
+        self._shared = 0
+
+    # ===============================
+    # MEMORY
+    # ===============================
+    def _remember(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key):
+        """Cached value or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._expired += 1
+
+        if self.persist:
+            found = self._load(key)
+            if found is not None:
+                value, remaining = found
+                with self._lock:
+                    self._disk_hits += 1
+                    self._remember(key, value, remaining)
+                return value
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store a value"""
+        with self._lock:
+            self._remember(key, value, self.ttl)
+        if self.persist:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Cached value, or compute() run once for all concurrent callers of
+        the same key. Results are stored unless cacheable(result) is
+        false (e.g. a degraded fallback answer that should be retried).
+        Exceptions from compute() reach every waiting caller.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            # Finished by another thread since our miss?
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            start = time.perf_counter()
+            flight.value = compute()
+            with self._lock:
+                self._computes += 1
+                self._compute_seconds += time.perf_counter() - start
+            if cacheable is None or cacheable(flight.value):
+                self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything (memory and disk) when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self.persist:
+            self._delete(key)
+
+    # ===============================
+    # SQLITE BACKING (ai_cache table)
+    # ===============================
+    @staticmethod
+    def _connection():
+        """
+        Connection for the ai_cache table, or None while the request's
+        shared connection has uncommitted writes: committing would take
+        them along and closing would roll them back.
+        """
+        conn = get_db()
+        if conn.in_transaction:
+            return None
+        return conn
+
+    def _load(self, key):
+        """(value, remaining ttl) from ai_cache, or None"""
+        now = time.time()
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT value, expires_at FROM ai_cache WHERE namespace=? AND key=? AND expires_at > ?",
+                (self.name, key, now)
+            )
+            row = cur.fetchone()
+        except sqlite3.Error as e:
+            self._error(f"read failed: {e}")
+            return None
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1] - now
+
+    def _store(self, key, value):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.name, key, json.dumps(value), now + self.ttl)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % PURGE_EVERY == 0
+            if purge:
+                conn.execute("DELETE FROM ai_cache WHERE namespace=? AND expires_at <= ?", (self.name, now))
+            conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._error(f"write failed: {e}")
+        finally:
+            conn.close()
+
+    def _delete(self, key):
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            if key is None:
+                conn.execute("DELETE FROM ai_cache WHERE namespace=?", (self.name,))
+            else:
+                conn.execute("DELETE FROM ai_cache WHERE namespace=? AND key=?", (self.name, key))
+            conn.commit()
+        except sqlite3.Error as e:
+            self._error(f"delete failed: {e}")
+        finally:
+            conn.close()
+
+    def _error(self, message):
+        with self._lock:
+            self._errors += 1
+        logger.warning(f"{self.name} cache {message}")
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            average = self._compute_seconds / self._computes if self._computes else 0.0
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "persist": self.persist,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 3) if lookups else None,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "writes": self._writes,
+                "errors": self._errors,
+                "computes": self._computes,
+                "shared": self._shared,
+                "in_flight": len(self._flights),
+                "avg_compute_ms": round(average * 1000, 1),
+                # Hits and shared waits each avoided one average compute
+                "saved_seconds": round(average * (self._hits + self._disk_hits + self._shared), 2),
+            }
@@ -1,19 +1,8 @@
-import google.genai as genai
-import os
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from ai.client import ai_client
 
 logger = logging.getLogger(__name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    logger.info("✅ Gemini API key configured")
-else:
-    logger.warning("⚠️ GEMINI_API_KEY not set. Chatbot will use fallback responses.")
-
 
 def chat_with_bot(user_message, conversation_history=None):
     """
@@ -28,7 +17,7 @@ def chat_with_bot(user_message, conversation_history=None):
         (response_text, is_error)
     """
     
-    if not GEMINI_API_KEY:
+    if not ai_client.is_configured():
         logger.info("ℹ️ No Gemini API key - using fallback response")
         return _get_fallback_response(user_message), False
     
@@ -65,15 +54,11 @@ Today's date: January 23, 2026."""
         
         logger.debug(f"🔄 Sending message to Gemini API: {user_message[:50]}...")
         
-        model = genai.Client().models.get("models/gemini-2.0-flash")
-        response = model.generate_content(
-            messages,
-            generation_config={"temperature": 0.7, "max_output_tokens": 500}
-        )
+        text = ai_client.generate(messages, caller="chatbot", temperature=0.7, max_output_tokens=500)
         
-        if response and response.text:
+        if text:
             logger.info("✅ Gemini API response received successfully")
-            return response.text, False
+            return text, False
         else:
             logger.warning("⚠️ Gemini API returned empty response")
             return _get_fallback_response(user_message), False
@@ -0,0 +1,209 @@
+"""
+Shared Gemini client for the chatbot, the recommender and natural
+language search.
+
+One google.genai client per worker process, created on first use. Every
+call:
+
+- waits at most AI_QUEUE_TIMEOUT for one of AI_MAX_CONCURRENT call slots,
+  so a slow or hanging LLM can occupy only that many threads and never
+  every Flask worker thread (AIBusy otherwise)
+- returns within AI_TIMEOUT seconds (AITimeout otherwise); the HTTP
+  request carries the same timeout, so an abandoned call still ends
+  and frees its slot
+- is recorded in a per-caller latency histogram
+
+Callers treat AIClientError like any other Gemini failure and use their
+fallback answers. Tests and scripts can swap in FakeClient with
+set_client().
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from bisect import bisect_left
+import google.genai as genai
+from dotenv import load_dotenv
+import config
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+if GEMINI_API_KEY:
+    logger.info("✅ Gemini API key configured")
+else:
+    logger.warning("⚠️ GEMINI_API_KEY not set. AI features will use fallback responses.")
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class AIClientError(Exception):
+    """Base class for calls the shared client refused or gave up on"""
+
+
+class AIBusy(AIClientError):
+    """Every call slot stayed taken for AI_QUEUE_TIMEOUT"""
+
+
+class AITimeout(AIClientError):
+    """No response within the call's deadline"""
+
+
+class FakeClient:
+    """
+    Stand-in for genai.Client: answers every generate_content call with
+    reply (a string, or a callable taking the contents) after delay
+    seconds, or raises error. Records the calls it received.
+    """
+
+    def __init__(self, reply="{}", delay=0.0, error=None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.calls.append({"model": model, "contents": contents, "config": config})
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        text = self.reply(contents) if callable(self.reply) else self.reply
+        return type("FakeResponse", (), {"text": text})()
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.outcomes = {"ok": 0, "error": 0, "timeout": 0, "busy": 0}
+
+    def record(self, elapsed_ms, outcome):
+        self.outcomes[outcome] += 1
+        if outcome == "busy":
+            return
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.count,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+            "histogram": dict(zip(labels, self.buckets)),
+            **self.outcomes,
+        }
+
+
+class AIClient:
+    """Lazily created client, call slots and latency stats"""
+
+    def __init__(self, max_concurrent=4, timeout=10.0, queue_timeout=0.5, model="models/gemini-2.0-flash"):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.model = model
+        self._client = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_concurrent, thread_name_prefix="gemini")
+        self._histograms = {}
+
+    def is_configured(self):
+        """True when calls can be made (API key set or a client injected)"""
+        return self._client is not None or bool(GEMINI_API_KEY)
+
+    def set_client(self, client):
+        """Use client (e.g. FakeClient) for every call; None resets"""
+        with self._lock:
+            self._client = client
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options={"timeout": int(self.timeout * 1000)}
+                )
+            return self._client
+
+    def _record(self, caller, start, outcome):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._histograms.setdefault(caller, _Histogram()).record(elapsed_ms, outcome)
+
+    def generate(self, contents, caller="gemini", timeout=None, **generation_config):
+        """
+        Response text of one generate_content call (None when empty).
+        generation_config: temperature, max_output_tokens, ...
+        Raises AIBusy, AITimeout, or the client's own exception.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._record(caller, start, "busy")
+            raise AIBusy(f"All {self.max_concurrent} Gemini call slots busy")
+
+        try:
+            client = self._get_client()
+            request_config = dict(generation_config, http_options={"timeout": int(timeout * 1000)})
+            future = self._executor.submit(
+                client.models.generate_content, model=self.model, contents=contents, config=request_config
+            )
+        except Exception:
+            self._slots.release()
+            self._record(caller, start, "error")
+            raise
+        # The slot is held until the call really ends, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            response = future.result(timeout=timeout)
+        except FutureTimeout:
+            self._record(caller, start, "timeout")
+            raise AITimeout(f"Gemini call ({caller}) took longer than {timeout}s")
+        except Exception:
+            self._record(caller, start, "error")
+            raise
+        self._record(caller, start, "ok")
+        return response.text if response else None
+
+    def stats(self):
+        """Per-caller latency histograms and outcome counts"""
+        with self._lock:
+            return {
+                "configured": self.is_configured(),
+                "model": self.model,
+                "max_concurrent": self.max_concurrent,
+                "timeout": self.timeout,
+                "queue_timeout": self.queue_timeout,
+                "callers": {name: h.snapshot() for name, h in self._histograms.items()},
+            }
+
+
+def strip_code_fences(text):
+    """Remove the ```json ... ``` wrapper Gemini often puts around JSON"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+ai_client = AIClient(config.AI_MAX_CONCURRENT, config.AI_TIMEOUT, config.AI_QUEUE_TIMEOUT, config.AI_MODEL)
@@ -0,0 +1,423 @@
+"""
+Demand forecasting for every station at once.
+
+Fitted in one NumPy batch on the last FORECAST_HISTORY_DAYS of
+station_hourly_stats (sessions started per station per UTC hour):
+
+- seasonal baselines: how a station's sessions split over the weekdays
+  and, per weekday, over the hours of the day, smoothed toward the
+  fleet-wide shape so a quiet station does not get a spiky profile from
+  a handful of sessions
+- level and trend: damped Holt exponential smoothing of the
+  weekday-adjusted daily totals, every station updated together one day
+  at a time
+- occupancy: sessions expected to start per hour times the station's
+  average charging time (Little's law), over its chargers
+
+Only the fitted parameters are kept (a few hundred floats per station),
+stored in the demand_model table; forecasts for any horizon are derived
+from them on request. Requests never fit: `flask fit-demand-model` (from
+cron) or a background thread refits once the stored fit is older than
+FORECAST_REFRESH_SECONDS or the UTC day changes, and each worker reads
+the stored parameters. Until a first fit exists, forecast_station()
+returns None and the reports use the weekday counts.
+"""
+import io
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import config
+from models.db import get_db
+
+logger = logging.getLogger(__name__)
+
+ALPHA = 0.3                 # level smoothing
+BETA = 0.1                  # trend smoothing
+PHI = 0.9                   # trend damping per day
+PRIOR_SESSIONS = 20.0       # pseudo-sessions pulling a station's profile toward the fleet's
+MIN_WEEKDAY_INDEX = 0.2     # quieter weekdays do not update the level
+WARMUP_DAYS = 7             # one-step errors are not scored in the first week
+DEFAULT_SESSION_MINUTES = 60.0
+
+# Hourly rollup of every existing station in the fitting window: one
+# primary-key range per station, the history before the window is not read
+_HISTORY_SQL = """
+    SELECT h.station_id,
+           CAST(julianday(substr(h.hour, 1, 10)) - julianday(?) AS INTEGER),
+           CAST(substr(h.hour, 12, 2) AS INTEGER),
+           h.sessions, h.duration_sessions, h.total_duration
+    FROM station_hourly_stats h
+    WHERE h.station_id IN (SELECT id FROM stations)
+      AND h.hour >= ? AND h.hour < ?
+"""
+
+
+# ===============================
+# FITTING
+# ===============================
+def fit_demand(counts, first_weekday):
+    """
+    Fit every station in one batch.
+    counts: (stations, days, 24) sessions started per hour, oldest day first
+    first_weekday: weekday (0 = Monday) of counts[:, 0]
+    Returns a dict of parameter arrays with one row per station.
+    """
+    stations, days, _ = counts.shape
+    weekdays = (first_weekday + np.arange(days)) % 7
+    onehot = np.zeros((days, 7))
+    onehot[np.arange(days), weekdays] = 1
+
+    daily = counts.sum(axis=2, dtype=np.float64)                    # (S, D)
+    sessions = daily.sum(axis=1)
+    daily_mean = sessions / days
+    weight = (sessions / (sessions + PRIOR_SESSIONS))[:, None]
+
+    # Weekday index: mean sessions on that weekday over the mean day
+    weekday_mean = daily @ onehot / np.maximum(onehot.sum(axis=0), 1)  # (S, 7)
+    fleet = weekday_mean.sum(axis=0)
+    fleet_index = fleet / fleet.mean() if fleet.sum() > 0 else np.ones(7)
+    station_index = np.divide(weekday_mean, daily_mean[:, None], out=np.ones_like(weekday_mean),
+                              where=daily_mean[:, None] > 0)
+    weekday_index = weight * station_index + (1 - weight) * fleet_index
+    weekday_index /= np.maximum(weekday_index.mean(axis=1, keepdims=True), 1e-9)
+
+    # Hour-of-day share per weekday, shrunk toward the station's all-week
+    # share, which is shrunk toward the fleet's
+    hour_totals = np.einsum("sdh,dw->swh", counts, onehot).astype(np.float64)  # (S, 7, 24)
+    station_hours = hour_totals.sum(axis=1)
+    fleet_hours = station_hours.sum(axis=0)
+    fleet_share = fleet_hours / fleet_hours.sum() if fleet_hours.sum() > 0 else np.full(24, 1 / 24)
+    station_share = ((station_hours + PRIOR_SESSIONS * fleet_share)
+                     / (station_hours.sum(axis=1, keepdims=True) + PRIOR_SESSIONS))
+    hour_profile = ((hour_totals + PRIOR_SESSIONS * station_share[:, None, :])
+                    / (hour_totals.sum(axis=2, keepdims=True) + PRIOR_SESSIONS))
+
+    # Damped Holt smoothing of the weekday-adjusted daily totals
+    seasonal = weekday_index[:, weekdays]
+    usable = seasonal >= MIN_WEEKDAY_INDEX
+    adjusted = np.where(usable, daily / np.maximum(seasonal, MIN_WEEKDAY_INDEX), 0.0)
+    first_week = usable[:, :WARMUP_DAYS]
+    level = adjusted[:, :WARMUP_DAYS].sum(axis=1) / np.maximum(first_week.sum(axis=1), 1)
+    trend = np.zeros(stations)
+    abs_error = np.zeros(stations)
+    scored = np.zeros(stations)
+    for day in range(days):
+        expected = level + PHI * trend
+        observed, ok = adjusted[:, day], usable[:, day]
+        if day >= WARMUP_DAYS:
+            abs_error += np.where(ok, np.abs(observed - expected), 0.0)
+            scored += ok
+        new_level = np.where(ok, ALPHA * observed + (1 - ALPHA) * expected, expected)
+        trend = np.where(ok, BETA * (new_level - level) + (1 - BETA) * PHI * trend, PHI * trend)
+        level = new_level
+
+    mean_error = abs_error / np.maximum(scored, 1)
+    rel_error = np.divide(mean_error, daily_mean, out=np.full(stations, np.inf),
+                          where=(daily_mean > 0) & (scored > 0))
+    return {
+        "level": level,
+        "trend": trend,
+        "weekday_index": weekday_index,
+        "hour_profile": hour_profile,
+        "rel_error": rel_error,
+        "sessions": sessions,
+    }
+
+
+def confidence(rel_error):
+    """One-step-ahead error relative to the mean day"""
+    return "high" if rel_error <= 0.35 else "medium" if rel_error <= 0.7 else "low"
+
+
+class DemandModel:
+    """Fitted parameters of every station, looked up by station id"""
+
+    def __init__(self, station_ids, chargers, session_minutes, params, last_day, history_days):
+        self.rows = {station_id: row for row, station_id in enumerate(station_ids)}
+        self.chargers = chargers
+        self.session_minutes = session_minutes
+        self.params = params
+        self.last_day = last_day
+        self.history_days = history_days
+        self.fitted_at = time.time()
+        self.load_ms = 0.0
+        self.fit_ms = 0.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def forecast(self, station_id, start, days_ahead=7):
+        """
+        Daily forecasts from start (a date) for days_ahead days, or None
+        for a station the fit has not seen. Each day carries the expected
+        sessions per hour and the predicted occupancy (busy chargers /
+        chargers) per hour.
+        """
+        row = self.rows.get(station_id)
+        if row is None:
+            return None
+        p = self.params
+        level, trend = p["level"][row], p["trend"][row]
+        chargers = self.chargers[row]
+        busy_hours = self.session_minutes[row] / 60
+        label = confidence(p["rel_error"][row])
+
+        forecast = []
+        for i in range(days_ahead):
+            day = start + timedelta(days=i)
+            ahead = max((day - self.last_day).days, 1)
+            damped = PHI * (1 - PHI ** ahead) / (1 - PHI)
+            weekday = day.weekday()
+            expected = max(level + damped * trend, 0.0) * p["weekday_index"][row, weekday]
+            hourly = expected * p["hour_profile"][row, weekday]
+            occupancy = hourly * busy_hours / chargers if chargers > 0 else None
+            peak = int(np.argmax(hourly)) if expected > 0 else None
+
+            forecast.append({
+                "date": day.strftime("%Y-%m-%d"),
+                "day": day.strftime("%A"),
+                "expected_sessions": round(float(expected), 1),
+                "confidence": label,
+                "peak_hour": f"{peak:02d}:00" if peak is not None else None,
+                "peak_occupancy": (round(float(occupancy[peak]), 2)
+                                   if occupancy is not None and peak is not None else None),
+                "hourly_sessions": hourly.round(2).tolist(),
+                "hourly_occupancy": occupancy.round(2).tolist() if occupancy is not None else None,
+            })
+        return forecast
+
+
+# ===============================
+# LOADING
+# ===============================
+def _utc_today():
+    # started_at (and so the rollup hours) are UTC
+    return datetime.now(timezone.utc).date()
+
+
+def load_demand_model(conn=None, today=None, history_days=None):
+    """Read the fitting window of every station from SQL and fit it"""
+    today = today or _utc_today()
+    history_days = history_days or config.FORECAST_HISTORY_DAYS
+    last_day = today - timedelta(days=1)
+    first_day = today - timedelta(days=history_days)
+
+    start = time.perf_counter()
+    own = conn is None
+    conn = conn or get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, COALESCE(chargers, 0) FROM stations ORDER BY id")
+        stations = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 2)
+        cur.execute(_HISTORY_SQL, (first_day.isoformat(), first_day.isoformat(), today.isoformat()))
+        rows = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 6)
+    finally:
+        if own:
+            conn.close()
+
+    station_ids = stations[:, 0]
+    rows = rows[np.isfinite(rows).all(axis=1)]
+    row_index = np.searchsorted(station_ids, rows[:, 0]).clip(0, max(len(station_ids) - 1, 0))
+    day, hour = rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64)
+    # Stations added between the two reads, and keys outside the window
+    keep = (day >= 0) & (day < history_days) & (hour >= 0) & (hour < 24)
+    keep &= station_ids[row_index] == rows[:, 0] if len(station_ids) else False
+    rows, row_index, day, hour = rows[keep], row_index[keep], day[keep], hour[keep]
+
+    counts = np.zeros((len(station_ids), history_days, 24), dtype=np.float32)
+    counts[row_index, day, hour] = rows[:, 3]
+    timed = np.bincount(row_index, weights=rows[:, 4], minlength=len(station_ids))
+    minutes = np.bincount(row_index, weights=rows[:, 5], minlength=len(station_ids))
+    session_minutes = np.divide(minutes, timed, out=np.full(len(station_ids), DEFAULT_SESSION_MINUTES),
+                                where=timed > 0)
+    loaded = time.perf_counter()
+
+    params = fit_demand(counts, first_day.weekday())
+    model = DemandModel(station_ids.tolist(), stations[:, 1], session_minutes, params, last_day, history_days)
+    model.load_ms = (loaded - start) * 1000
+    model.fit_ms = (time.perf_counter() - loaded) * 1000
+    return model
+
+
+# ===============================
+# STORED MODEL
+# ===============================
+def save_demand_model(model, conn=None):
+    """Store the fitted parameters, replacing the previous fit"""
+    buffer = io.BytesIO()
+    np.savez(buffer, station_ids=np.array(list(model.rows), dtype=np.int64), chargers=model.chargers,
+             session_minutes=model.session_minutes, **model.params)
+    own = conn is None
+    conn = conn or get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT OR REPLACE INTO demand_model (id, fitted_at, last_day, history_days, fit_ms, params)
+            VALUES (1, ?, ?, ?, ?, ?)
+        """, (model.fitted_at, model.last_day.isoformat(), model.history_days, model.fit_ms,
+              buffer.getvalue()))
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+
+
+def read_demand_model(conn=None):
+    """The stored model, or None before the first fit"""
+    start = time.perf_counter()
+    own = conn is None
+    conn = conn or get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT fitted_at, last_day, history_days, fit_ms, params FROM demand_model WHERE id = 1
+        """)
+        row = cur.fetchone()
+    finally:
+        if own:
+            conn.close()
+    if not row:
+        return None
+
+    fitted_at, last_day, history_days, fit_ms, blob = row
+    with np.load(io.BytesIO(blob), allow_pickle=False) as arrays:
+        params = {name: arrays[name] for name in arrays.files}
+    model = DemandModel(params.pop("station_ids").tolist(), params.pop("chargers"),
+                        params.pop("session_minutes"), params,
+                        datetime.strptime(last_day, "%Y-%m-%d").date(), history_days)
+    model.fitted_at = fitted_at
+    model.fit_ms = fit_ms
+    model.load_ms = (time.perf_counter() - start) * 1000
+    return model
+
+
+def fit_demand_model():
+    """Fit every station from station_hourly_stats and store the parameters"""
+    model = load_demand_model()
+    save_demand_model(model)
+    logger.info(f"Demand model fitted for {len(model)} stations "
+                f"(load {model.load_ms:.0f} ms, fit {model.fit_ms:.0f} ms)")
+    return model
+
+
+def model_is_stale(model):
+    """Older than FORECAST_REFRESH_SECONDS or fitted before yesterday (UTC)"""
+    return (time.time() - model.fitted_at > config.FORECAST_REFRESH_SECONDS
+            or model.last_day < _utc_today() - timedelta(days=1))
+
+
+# ===============================
+# CACHED MODEL
+# ===============================
+_model = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+_read_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refreshes = 0
+_errors = 0
+
+
+def _install(model):
+    global _model, _refreshes
+    with _lock:
+        _model = model
+        _refreshes += 1
+
+
+def _read_stored():
+    """Install the stored fit if it is newer than this worker's"""
+    global _checked_at
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT fitted_at FROM demand_model WHERE id = 1")
+        row = cur.fetchone()
+        if row and (_model is None or row[0] > _model.fitted_at):
+            model = read_demand_model(conn)
+            _install(model)
+            logger.info(f"Demand model read for {len(model)} stations ({model.load_ms:.0f} ms)")
+    finally:
+        conn.close()
+    _checked_at = time.monotonic()
+
+
+def _refresh():
+    global _errors
+    try:
+        # Another worker or the cron job may have stored a newer fit
+        _read_stored()
+        model = _model
+        if config.FORECAST_FIT_IN_BACKGROUND and (model is None or model_is_stale(model)):
+            _install(fit_demand_model())
+    except Exception as e:
+        _errors += 1
+        logger.error(f"Demand model refresh failed: {e}")
+    finally:
+        _refresh_lock.release()
+
+
+def get_demand_model():
+    """
+    The stored model, or None before the first fit. A worker reads it on
+    first use and checks for a newer fit every FORECAST_RELOAD_SECONDS in
+    a background thread, which also refits (FORECAST_FIT_IN_BACKGROUND)
+    once the stored fit is missing or stale. Callers never wait for a fit.
+    """
+    with _lock:
+        model = _model
+    if time.monotonic() - _checked_at <= config.FORECAST_RELOAD_SECONDS:
+        return model
+    if model is None:
+        # First use in this worker: a read of the stored parameters
+        with _read_lock:
+            if _model is None and time.monotonic() - _checked_at > config.FORECAST_RELOAD_SECONDS:
+                try:
+                    _read_stored()
+                except Exception as e:
+                    logger.error(f"Demand model unavailable: {e}")
+            model = _model
+    if _refresh_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh, name="forecast-refresh", daemon=True).start()
+    return model
+
+
+def forecast_station(station_id, days_ahead=7, model=None):
+    """Forecast from today (UTC), or None before the first fit or for a station added since"""
+    if model is None:
+        model = get_demand_model()
+        if model is None:
+            return None
+    return model.forecast(station_id, _utc_today(), days_ahead)
+
+
+def forecast_stats():
+    with _lock:
+        model = _model
+        return {
+            "stations": len(model) if model else 0,
+            "history_days": model.history_days if model else config.FORECAST_HISTORY_DAYS,
+            "last_day": model.last_day.isoformat() if model else None,
+            "age_seconds": round(time.time() - model.fitted_at, 1) if model else None,
+            "load_ms": round(model.load_ms, 1) if model else None,
+            "fit_ms": round(model.fit_ms, 1) if model else None,
+            "refresh_seconds": config.FORECAST_REFRESH_SECONDS,
+            "reload_seconds": config.FORECAST_RELOAD_SECONDS,
+            "fit_in_background": config.FORECAST_FIT_IN_BACKGROUND,
+            "refreshing": _refresh_lock.locked(),
+            "refreshes": _refreshes,
+            "errors": _errors,
+        }
+
+
+def init_app(app):
+    """Register the `flask fit-demand-model` command"""
+
+    @app.cli.command("fit-demand-model")
+    def fit_command():
+        """Fit the demand forecast for every station and store it"""
+        model = fit_demand_model()
+        print(f"✓ Demand model fitted for {len(model)} stations "
+              f"(load {model.load_ms:.0f} ms, fit {model.fit_ms:.0f} ms)")
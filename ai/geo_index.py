@@ -0,0 +1,157 @@
+"""
+In-memory spatial index for nearby-station search.
+
+Approved stations with coordinates are bucketed into a fixed lat/lng
+grid. A radius query only visits the cells overlapping the query's
+bounding box, drops candidates outside the box, and computes exact
+haversine distances for what is left. k-nearest queries widen the
+radius until at least k stations are found.
+
+The index is built lazily from SQLite, rebuilt after GEO_INDEX_TTL
+seconds (so other workers' changes are picked up) and invalidated
+straight away when a station is added, approved or moved.
+"""
+import logging
+import math
+import threading
+import time
+import numpy as np
+from models.db import get_db
+from models.station import bounding_box
+from ai.map_utils import EARTH_RADIUS_KM, haversine_distances, get_marker_color
+
+logger = logging.getLogger(__name__)
+
+CELL_DEGREES = 0.25         # ~28 km of latitude per cell
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+EARTH_HALF_CIRCUMFERENCE_KM = 20038
+GEO_INDEX_TTL = 300
+
+
+class GeoIndex:
+    """Grid-bucketed station coordinates with radius and kNN queries"""
+
+    def __init__(self, stations, cell_degrees=CELL_DEGREES):
+        """stations: list of dicts with at least "lat" and "lng" """
+        self.stations = stations
+        self.cell_degrees = cell_degrees
+        self.lat = np.array([s["lat"] for s in stations], dtype=float)
+        self.lng = np.array([s["lng"] for s in stations], dtype=float)
+
+        cells = {}
+        for i, key in enumerate(zip(self._cell(self.lat), self._cell(self.lng))):
+            cells.setdefault(key, []).append(i)
+        self.cells = {key: np.array(ids) for key, ids in cells.items()}
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _cell(self, degrees):
+        return np.floor(np.asarray(degrees) / self.cell_degrees).astype(int).tolist()
+
+    def _bbox(self, lat, lng, radius_km):
+        """Smallest lat/lng box containing the circle"""
+        return bounding_box(lat, lng, radius_km)
+
+    def _candidates(self, min_lat, max_lat, min_lng, max_lng):
+        lat_cells = range(math.floor(min_lat / self.cell_degrees), math.floor(max_lat / self.cell_degrees) + 1)
+        if max_lng - min_lng >= 360 or len(lat_cells) * (max_lng - min_lng) / self.cell_degrees > len(self.cells):
+            # Box covers more cells than exist: cheaper to walk the cells
+            buckets = [ids for (i, _), ids in self.cells.items() if i in lat_cells]
+        else:
+            buckets = []
+            for i in lat_cells:
+                for j in range(math.floor(min_lng / self.cell_degrees), math.floor(max_lng / self.cell_degrees) + 1):
+                    # Wrap cells across the antimeridian
+                    wrapped = math.floor(((j * self.cell_degrees + 180) % 360 - 180) / self.cell_degrees)
+                    ids = self.cells.get((i, wrapped))
+                    if ids is not None:
+                        buckets.append(ids)
+        if not buckets:
+            return np.empty(0, dtype=int)
+        return np.concatenate(buckets)
+
+    def within(self, lat, lng, radius_km):
+        """[(distance_km, station)] within radius_km, nearest first"""
+        min_lat, max_lat, min_lng, max_lng = self._bbox(lat, lng, radius_km)
+        ids = self._candidates(min_lat, max_lat, min_lng, max_lng)
+        if not len(ids):
+            return []
+
+        # Bounding-box prefilter, then exact distance on what survives
+        lats, lngs = self.lat[ids], self.lng[ids]
+        in_box = (lats >= min_lat) & (lats <= max_lat)
+        if max_lng - min_lng < 360:
+            offset = (lngs - min_lng) % 360
+            in_box &= offset <= (max_lng - min_lng)
+        ids = ids[in_box]
+
+        distances = haversine_distances(lat, lng, self.lat[ids], self.lng[ids])
+        keep = distances <= radius_km
+        ids, distances = ids[keep], distances[keep]
+        order = np.lexsort((ids, distances))
+        return [(float(distances[i]), self.stations[ids[i]]) for i in order]
+
+    def nearest(self, lat, lng, k=5):
+        """[(distance_km, station)] for the k nearest stations"""
+        if not self.stations or k <= 0:
+            return []
+        radius = self.cell_degrees * KM_PER_DEGREE_LAT
+        while True:
+            found = self.within(lat, lng, radius)
+            if len(found) >= min(k, len(self.stations)) or radius >= EARTH_HALF_CIRCUMFERENCE_KM:
+                return found[:k]
+            radius *= 2
+
+
+# ===============================
+# SHARED INDEX FOR THE APP
+# ===============================
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def _load_index():
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT name, location, chargers, price, green_score, id, lat, lng
+            FROM stations
+            WHERE approved = 1 AND lat IS NOT NULL AND lng IS NOT NULL
+            ORDER BY id
+        """)
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    return GeoIndex([{
+        "id": station_id,
+        "name": name,
+        "location": location,
+        "chargers": chargers,
+        "price": price,
+        "green_score": green_score,
+        "lat": lat,
+        "lng": lng,
+        "marker_color": get_marker_color(green_score)
+    } for name, location, chargers, price, green_score, station_id, lat, lng in rows])
+
+
+def get_geo_index():
+    """Index of approved stations, rebuilt after GEO_INDEX_TTL or invalidation"""
+    global _index, _built_at
+    with _lock:
+        if _index is None or time.monotonic() - _built_at > GEO_INDEX_TTL:
+            _index = _load_index()
+            _built_at = time.monotonic()
+            logger.info(f"Geo index built over {len(_index)} stations")
+        return _index
+
+
+def invalidate_geo_index():
+    """Call after stations are added, approved or given new coordinates"""
+    global _index
+    with _lock:
+        _index = None
@@ -1,215 +1,188 @@
 from models.db import get_db
+from flask import g, has_app_context
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def get_user_charging_statistics(user_id):
-    """Get comprehensive charging statistics for a user"""
+# ===============================
+# SHARED SCAN
+# ===============================
+# Every figure of the insights page comes from these two statements: the
+# user's completed sessions grouped by station (idx_sessions_user_status_started),
+# with the spending windows as conditional sums, and the latest session.
+# The station join only feeds the eco figures, as the inner join of the
+# eco query did before.
+_STATION_TOTALS_SQL = """
+    SELECT cs.station_name,
+           COUNT(*),
+           SUM(cs.units),
+           SUM(cs.amount),
+           AVG(cs.amount),
+           AVG(CASE WHEN cs.units > 0 THEN cs.amount / cs.units END),
+           SUM(CASE WHEN s.id IS NOT NULL THEN cs.units END),
+           SUM(s.green_score),
+           COUNT(s.green_score),
+           SUM(CASE WHEN cs.started_at > :since_7 THEN cs.amount END),
+           COUNT(CASE WHEN cs.started_at > :since_7 THEN 1 END),
+           SUM(CASE WHEN cs.started_at > :since_14 THEN cs.amount END),
+           COUNT(CASE WHEN cs.started_at > :since_14 THEN 1 END),
+           SUM(CASE WHEN cs.started_at > :since_30 THEN cs.amount END),
+           COUNT(CASE WHEN cs.started_at > :since_30 THEN 1 END)
+    FROM charging_sessions cs
+    LEFT JOIN stations s ON s.id = cs.station_id
+    WHERE cs.user_id = :user_id AND cs.status = 'Completed'
+    GROUP BY cs.station_name
+    ORDER BY cs.station_name
+"""
+_LAST_SESSION_SQL = """
+    SELECT started_at, units, amount, station_name, status
+    FROM charging_sessions
+    WHERE user_id = ?
+    ORDER BY started_at DESC
+    LIMIT 1
+"""
+_PERIODS = (7, 14, 30)
+
+
+def _scan_user(user_id):
+    """(per-station rows of _STATION_TOTALS_SQL, latest session row)"""
+    now = datetime.now()
+    params = {"user_id": user_id}
+    for days in _PERIODS:
+        params[f"since_{days}"] = (now - timedelta(days=days)).isoformat()
     conn = get_db()
-    cur = conn.cursor()
-    
     try:
-        # Total sessions and kWh
-        cur.execute("""
-            SELECT COUNT(*) as total_sessions, SUM(units) as total_units, 
-                   SUM(amount) as total_spent
-            FROM charging_sessions 
-            WHERE user_id = ? AND status = 'Completed'
-        """, (user_id,))
-        
-        stats = cur.fetchone()
-        total_sessions = stats[0] if stats and stats[0] else 0
-        total_units = stats[1] if stats and stats[1] else 0
-        total_spent = stats[2] if stats and stats[2] else 0
-        
-        # Average per session
-        avg_per_session = (total_spent / total_sessions) if total_sessions > 0 else 0
-        avg_units_per_session = (total_units / total_sessions) if total_sessions > 0 else 0
-        
-        # Most used station
-        cur.execute("""
-            SELECT station_name, COUNT(*) as count
-            FROM charging_sessions 
-            WHERE user_id = ? AND status = 'Completed'
-            GROUP BY station_name
-            ORDER BY count DESC
-            LIMIT 1
-        """, (user_id,))
-        
-        fav_station = cur.fetchone()
-        
-        # Last charging session
-        cur.execute("""
-            SELECT started_at, units, amount, station_name, status
-            FROM charging_sessions 
-            WHERE user_id = ?
-            ORDER BY started_at DESC
-            LIMIT 1
-        """, (user_id,))
-        
+        cur = conn.cursor()
+        cur.execute(_STATION_TOTALS_SQL, params)
+        stations = cur.fetchall()
+        cur.execute(_LAST_SESSION_SQL, (user_id,))
         last_session = cur.fetchone()
-        
-        return {
-            "total_sessions": total_sessions,
-            "total_units_charged": round(total_units, 2),
-            "total_spent": round(total_spent, 2),
-            "avg_per_session": round(avg_per_session, 2),
-            "avg_units_per_session": round(avg_units_per_session, 2),
-            "favorite_station": fav_station[0] if fav_station else "N/A",
-            "favorite_count": fav_station[1] if fav_station else 0,
-            "last_session": {
-                "date": last_session[0] if last_session and last_session[0] else "N/A",
-                "units": last_session[1] if last_session and last_session[1] else 0,
-                "amount": last_session[2] if last_session and last_session[2] else 0,
-                "station": last_session[3] if last_session and last_session[3] else "N/A",
-                "status": last_session[4] if last_session and last_session[4] else "N/A"
-            } if last_session else None
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting user stats: {e}")
-        return None
     finally:
         conn.close()
+    return stations, last_session
 
 
-def get_user_eco_impact(user_id):
-    """Calculate environmental impact of user's charging habits"""
-    conn = get_db()
-    cur = conn.cursor()
-    
-    try:
-        # Get total units and average green score
-        cur.execute("""
-            SELECT SUM(cs.units), AVG(s.green_score)
-            FROM charging_sessions cs
-            JOIN stations s ON cs.station_name = s.name
-            WHERE cs.user_id = ? AND cs.status = 'Completed'
-        """, (user_id,))
-        
-        result = cur.fetchone()
-        total_units = result[0] if result and result[0] else 0
-        avg_green_score = result[1] if result and result[1] else 0
-        
-        # Carbon footprint calculation
-        # Average EV charging: 0.4-0.6 kg CO2 per kWh (depends on grid source)
-        # High green score: 0.2 kg CO2 per kWh
-        # Low green score: 0.6 kg CO2 per kWh
-        
-        co2_factor = 0.2 + (10 - avg_green_score) * 0.04 if avg_green_score else 0.4
-        carbon_saved = total_units * co2_factor
-        
-        # Trees equivalent (1 tree absorbs ~20kg CO2/year)
-        trees_equivalent = carbon_saved / 20
-        
-        # Green charging percentage
-        green_percentage = avg_green_score * 10 if avg_green_score else 0
-        
-        return {
-            "total_green_charges": total_units,
-            "avg_green_score": round(avg_green_score, 1),
-            "estimated_co2_emissions_kg": round(carbon_saved, 2),
-            "trees_equivalent": round(trees_equivalent, 1),
-            "eco_percentage": round(green_percentage, 1),
-            "eco_rating": "Excellent Eco-Warrior!" if avg_green_score >= 8 else "Good Green Citizen" if avg_green_score >= 6 else "Moderate" if avg_green_score >= 4 else "Standard",
-            "recommendation": "Amazing! Keep using green stations!" if avg_green_score >= 8 else "Try to choose higher-rated green stations when possible"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error calculating eco impact: {e}")
-        return None
-    finally:
-        conn.close()
+def _total(stations, column):
+    return sum(row[column] or 0 for row in stations)
 
 
-def get_user_spending_insights(user_id):
-    """Analyze user spending patterns and savings opportunities"""
-    conn = get_db()
-    cur = conn.cursor()
-    
-    try:
-        # Spending by station
-        cur.execute("""
-            SELECT station_name, SUM(amount) as total, COUNT(*) as count, 
-                   AVG(amount) as avg_session
-            FROM charging_sessions 
-            WHERE user_id = ? AND status = 'Completed'
-            GROUP BY station_name
-            ORDER BY total DESC
-            LIMIT 5
-        """, (user_id,))
-        
-        spending_by_station = cur.fetchall()
-        
-        # Spending trends (last 7, 14, 30 days)
-        def get_spending_period(days):
-            date_threshold = (datetime.now() - timedelta(days=days)).isoformat()
-            cur.execute("""
-                SELECT SUM(amount), COUNT(*)
-                FROM charging_sessions 
-                WHERE user_id = ? AND status = 'Completed' AND started_at > ?
-            """, (user_id, date_threshold))
-            result = cur.fetchone()
-            return (result[0] if result and result[0] else 0, result[1] if result and result[1] else 0)
-        
-        spending_7d = get_spending_period(7)
-        spending_14d = get_spending_period(14)
-        spending_30d = get_spending_period(30)
-        
-        # Find cheapest station used
-        cur.execute("""
-            SELECT station_name, AVG(amount/units) as avg_price_per_unit
-            FROM charging_sessions 
-            WHERE user_id = ? AND status = 'Completed' AND units > 0
-            GROUP BY station_name
-            ORDER BY avg_price_per_unit ASC
-            LIMIT 1
-        """, (user_id,))
-        
-        cheapest = cur.fetchone()
-        
-        return {
-            "spending_last_7_days": {
-                "total": round(spending_7d[0], 2),
-                "sessions": spending_7d[1]
-            },
-            "spending_last_14_days": {
-                "total": round(spending_14d[0], 2),
-                "sessions": spending_14d[1]
-            },
-            "spending_last_30_days": {
-                "total": round(spending_30d[0], 2),
-                "sessions": spending_30d[1]
-            },
-            "top_stations": [
-                {
-                    "name": s[0],
-                    "total": round(s[1], 2),
-                    "sessions": s[2],
-                    "avg_per_session": round(s[3], 2)
-                }
-                for s in spending_by_station
-            ],
-            "cheapest_station": cheapest[0] if cheapest else "N/A",
-            "recommendation": f"Save money by charging at {cheapest[0]} more often!" if cheapest else "No spending data available yet"
+def _statistics(stations, last_session):
+    total_sessions = _total(stations, 1)
+    total_units = _total(stations, 2)
+    total_spent = _total(stations, 3)
+
+    # Average per session
+    avg_per_session = (total_spent / total_sessions) if total_sessions > 0 else 0
+    avg_units_per_session = (total_units / total_sessions) if total_sessions > 0 else 0
+
+    # Most used station (ties go to the first name)
+    fav_station = max(stations, key=lambda row: row[1], default=None)
+
+    return {
+        "total_sessions": total_sessions,
+        "total_units_charged": round(total_units, 2),
+        "total_spent": round(total_spent, 2),
+        "avg_per_session": round(avg_per_session, 2),
+        "avg_units_per_session": round(avg_units_per_session, 2),
+        "favorite_station": fav_station[0] if fav_station else "N/A",
+        "favorite_count": fav_station[1] if fav_station else 0,
+        "last_session": {
+            "date": last_session[0] if last_session and last_session[0] else "N/A",
+            "units": last_session[1] if last_session and last_session[1] else 0,
+            "amount": last_session[2] if last_session and last_session[2] else 0,
+            "station": last_session[3] if last_session and last_session[3] else "N/A",
+            "status": last_session[4] if last_session and last_session[4] else "N/A"
+        } if last_session else None
+    }
+
+
+def _eco_impact(stations):
+    total_units = _total(stations, 6)
+    green_sessions = _total(stations, 8)
+    avg_green_score = _total(stations, 7) / green_sessions if green_sessions else 0
+
+    # Carbon footprint calculation
+    # Average EV charging: 0.4-0.6 kg CO2 per kWh (depends on grid source)
+    # High green score: 0.2 kg CO2 per kWh
+    # Low green score: 0.6 kg CO2 per kWh
+
+    co2_factor = 0.2 + (10 - avg_green_score) * 0.04 if avg_green_score else 0.4
+    carbon_saved = total_units * co2_factor
+
+    # Trees equivalent (1 tree absorbs ~20kg CO2/year)
+    trees_equivalent = carbon_saved / 20
+
+    # Green charging percentage
+    green_percentage = avg_green_score * 10 if avg_green_score else 0
+
+    return {
+        "total_green_charges": round(total_units, 2),
+        "avg_green_score": round(avg_green_score, 1),
+        "estimated_co2_emissions_kg": round(carbon_saved, 2),
+        "trees_equivalent": round(trees_equivalent, 1),
+        "eco_percentage": round(green_percentage, 1),
+        "eco_rating": "Excellent Eco-Warrior!" if avg_green_score >= 8 else "Good Green Citizen" if avg_green_score >= 6 else "Moderate" if avg_green_score >= 4 else "Standard",
+        "recommendation": "Amazing! Keep using green stations!" if avg_green_score >= 8 else "Try to choose higher-rated green stations when possible"
+    }
+
+
+def _spending(stations):
+    # Spending by station
+    spending_by_station = sorted(stations, key=lambda row: row[3] or 0, reverse=True)[:5]
+
+    # Spending trends (last 7, 14, 30 days): sums and counts of the conditional columns
+    periods = {
+        days: (_total(stations, 9 + 2 * i), _total(stations, 10 + 2 * i))
+        for i, days in enumerate(_PERIODS)
+    }
+
+    # Cheapest station used
+    priced = [row for row in stations if row[5] is not None]
+    cheapest = min(priced, key=lambda row: row[5], default=None)
+
+    return {
+        **{
+            f"spending_last_{days}_days": {
+                "total": round(total, 2),
+                "sessions": sessions
+            }
+            for days, (total, sessions) in periods.items()
+        },
+        "top_stations": [
+            {
+                "name": s[0],
+                "total": round(s[3] or 0, 2),
+                "sessions": s[1],
+                "avg_per_session": round(s[4] or 0, 2)
+            }
+            for s in spending_by_station
+        ],
+        "cheapest_station": cheapest[0] if cheapest else "N/A",
+        "recommendation": f"Save money by charging at {cheapest[0]} more often!" if cheapest else "No spending data available yet"
+    }
+
+
+def _user_insights(user_id):
+    """
+    Statistics, eco impact and spending from one _scan_user(), memoized
+    for the rest of the request
+    """
+    cache = g.setdefault("user_insights", {}) if has_app_context() else {}
+    if user_id not in cache:
+        stations, last_session = _scan_user(user_id)
+        cache[user_id] = {
+            "statistics": _statistics(stations, last_session),
+            "eco_impact": _eco_impact(stations),
+            "spending": _spending(stations),
         }
-        
-    except Exception as e:
-        logger.error(f"Error analyzing spending: {e}")
-        return None
-    finally:
-        conn.close()
+    return cache[user_id]
 
 
-def get_personalized_recommendations(user_id):
-    """Generate personalized recommendations for user"""
+def _recommendations(stats, eco, spending):
+    """Recommendations from the user's statistics, eco impact and spending"""
     try:
-        stats = get_user_charging_statistics(user_id)
-        eco = get_user_eco_impact(user_id)
-        spending = get_user_spending_insights(user_id)
-        
         recommendations = []
         
         # Recommendation 1: Charging frequency
@@ -278,11 +251,51 @@ def get_personalized_recommendations(user_id):
         return []
 
 
+# ===============================
+# PUBLIC API
+# ===============================
+def get_user_charging_statistics(user_id):
+    """Get comprehensive charging statistics for a user"""
+    try:
+        return _user_insights(user_id)["statistics"]
+    except Exception as e:
+        logger.error(f"Error getting user stats: {e}")
+        return None
+
+
+def get_user_eco_impact(user_id):
+    """Calculate environmental impact of user's charging habits"""
+    try:
+        return _user_insights(user_id)["eco_impact"]
+    except Exception as e:
+        logger.error(f"Error calculating eco impact: {e}")
+        return None
+
+
+def get_user_spending_insights(user_id):
+    """Analyze user spending patterns and savings opportunities"""
+    try:
+        return _user_insights(user_id)["spending"]
+    except Exception as e:
+        logger.error(f"Error analyzing spending: {e}")
+        return None
+
+
+def get_personalized_recommendations(user_id):
+    """Generate personalized recommendations for user"""
+    return _recommendations(get_user_charging_statistics(user_id),
+                            get_user_eco_impact(user_id),
+                            get_user_spending_insights(user_id))
+
+
 def get_user_insights_dashboard(user_id):
-    """Get complete insights dashboard for user"""
-    return {
-        "statistics": get_user_charging_statistics(user_id),
-        "eco_impact": get_user_eco_impact(user_id),
-        "spending": get_user_spending_insights(user_id),
-        "recommendations": get_personalized_recommendations(user_id)
-    }
+    """Get complete insights dashboard for user: one scan, every report built once"""
+    try:
+        insights = dict(_user_insights(user_id))
+    except Exception as e:
+        logger.error(f"Error loading user insights: {e}")
+        insights = {"statistics": None, "eco_impact": None, "spending": None}
+    insights["recommendations"] = _recommendations(
+        insights["statistics"], insights["eco_impact"], insights["spending"]
+    )
+    return insights
@@ -0,0 +1,342 @@
+"""
+Server-side marker clustering for the station map.
+
+The world is cut into square lat/lng tiles of 360 / 2^zoom degrees.
+Up to CLUSTER_MAX_ZOOM each tile is split into CELLS_PER_TILE x
+CELLS_PER_TILE cells, and every cell holds a precomputed cluster: station
+count, centroid, best green score and lowest price. Above that zoom a
+tile lists its individual stations instead.
+
+All levels are built once from SQLite and then updated incrementally
+when a station is approved (one cell per level). Tile ETags are a hash
+of the tile's content, so they stay valid across rebuilds and unchanged
+tiles are answered with 304 Not Modified.
+
+Other workers' changes are picked up through the stations counter in
+data_versions (bumped by triggers on stations): when it moves, the grid
+is rebuilt in a background thread while requests keep the current one.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import numpy as np
+from models.db import get_db
+from ai.map_utils import get_marker_color
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_MAX_ZOOM = 12
+MAX_ZOOM = 21
+CELLS_PER_TILE = 4
+MAX_TILES_PER_VIEWPORT = 64
+VERSION_CHECK_SECONDS = 1.0
+
+
+def tile_degrees(zoom):
+    return 360.0 / (2 ** zoom)
+
+
+def tile_etag(content):
+    """ETag of a tile (or viewport) payload, equal for equal content"""
+    return hashlib.md5(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class ClusterGrid:
+    """Multi-resolution cluster aggregates with per-tile versions"""
+
+    def __init__(self, stations):
+        self._lock = threading.Lock()
+        # level -> {cell: cluster}; finest level also keeps station lists
+        self.levels = {zoom: {} for zoom in range(CLUSTER_MAX_ZOOM + 1)}
+        self.cell_stations = {}
+        # (zoom, x, y) -> version, for zoom <= CLUSTER_MAX_ZOOM
+        self.versions = {}
+        self.total = 0
+        self._green_sum = 0.0
+        self._price_sum = 0.0
+        if stations:
+            self._build(stations)
+
+    @staticmethod
+    def _finest_cell(lat, lng):
+        """
+        Cell index at CLUSTER_MAX_ZOOM. Cell sizes halve exactly from one
+        level to the next, so coarser cells are this index shifted right.
+        """
+        size = tile_degrees(CLUSTER_MAX_ZOOM) / CELLS_PER_TILE
+        return (lng + 180) // size % (2 ** CLUSTER_MAX_ZOOM * CELLS_PER_TILE), (lat + 90) // size
+
+    def _build(self, stations):
+        """Bulk load: one vectorized group-by per level"""
+        lat = np.array([s["lat"] for s in stations], dtype=float)
+        lng = np.array([s["lng"] for s in stations], dtype=float)
+        green = np.array([s["green_score"] for s in stations], dtype=float)
+        price = np.array([s["price"] for s in stations], dtype=float)
+        fx, fy = (a.astype(np.int64) for a in self._finest_cell(lat, lng))
+
+        for zoom, cells in self.levels.items():
+            shift = CLUSTER_MAX_ZOOM - zoom
+            cx, cy = fx >> shift, fy >> shift
+            keys, first, inverse, counts = np.unique(
+                cx * (1 << 32) + cy, return_index=True, return_inverse=True, return_counts=True
+            )
+            lat_sums = np.bincount(inverse, lat)
+            lng_sums = np.bincount(inverse, lng)
+            best_green = np.full(len(keys), -np.inf)
+            np.maximum.at(best_green, inverse, green)
+            min_price = np.full(len(keys), np.inf)
+            np.minimum.at(min_price, inverse, price)
+
+            for i, (x, y) in enumerate(zip(cx[first].tolist(), cy[first].tolist())):
+                cells[(x, y)] = {
+                    "count": int(counts[i]),
+                    "lat_sum": float(lat_sums[i]),
+                    "lng_sum": float(lng_sums[i]),
+                    "best_green_score": stations[first[i]]["green_score"] if counts[i] == 1 else int(best_green[i]),
+                    "min_price": float(min_price[i]),
+                    "station": stations[first[i]] if counts[i] == 1 else None,
+                }
+                tile = (zoom, x // CELLS_PER_TILE, y // CELLS_PER_TILE)
+                self.versions[tile] = self.versions.get(tile, 0) + int(counts[i])
+
+        for station, x, y in zip(stations, fx.tolist(), fy.tolist()):
+            self.cell_stations.setdefault((x, y), []).append(station)
+        self.total = len(stations)
+        self._green_sum = float(green.sum())
+        self._price_sum = float(price.sum())
+
+    def _add(self, station):
+        lat, lng = station["lat"], station["lng"]
+        fx, fy = (int(v) for v in self._finest_cell(lat, lng))
+        for zoom, cells in self.levels.items():
+            shift = CLUSTER_MAX_ZOOM - zoom
+            cell = (fx >> shift, fy >> shift)
+            cluster = cells.get(cell)
+            if cluster is None:
+                cells[cell] = {
+                    "count": 1,
+                    "lat_sum": lat,
+                    "lng_sum": lng,
+                    "best_green_score": station["green_score"],
+                    "min_price": station["price"],
+                    "station": station,
+                }
+            else:
+                cluster["count"] += 1
+                cluster["lat_sum"] += lat
+                cluster["lng_sum"] += lng
+                cluster["best_green_score"] = max(cluster["best_green_score"], station["green_score"])
+                cluster["min_price"] = min(cluster["min_price"], station["price"])
+                cluster["station"] = None
+
+            tile = (zoom, cell[0] // CELLS_PER_TILE, cell[1] // CELLS_PER_TILE)
+            self.versions[tile] = self.versions.get(tile, 0) + 1
+
+        self.cell_stations.setdefault((fx, fy), []).append(station)
+        self.total += 1
+        self._green_sum += station["green_score"]
+        self._price_sum += station["price"]
+
+    def add(self, station):
+        """Incremental update for one newly visible station"""
+        with self._lock:
+            self._add(station)
+
+    def summary(self):
+        """Totals for the page's quick stats"""
+        with self._lock:
+            if not self.total:
+                return {"total": 0}
+            return {
+                "total": self.total,
+                "avg_green_score": round(self._green_sum / self.total, 1),
+                "avg_price": round(self._price_sum / self.total, 2),
+            }
+
+    # ===============================
+    # TILE QUERIES
+    # ===============================
+    def _finest_cells(self, zoom, x, y):
+        """Finest-level cells overlapping a high-zoom tile"""
+        scale = 2 ** (zoom - CLUSTER_MAX_ZOOM)
+        if scale >= CELLS_PER_TILE:
+            # Tile is no bigger than one finest cell
+            sub = scale // CELLS_PER_TILE
+            return [(x // sub, y // sub)]
+        per = CELLS_PER_TILE // scale
+        return [(x * per + i, y * per + j) for i in range(per) for j in range(per)]
+
+    def tile(self, zoom, x, y):
+        """Clusters (zoom <= CLUSTER_MAX_ZOOM) or stations inside one tile"""
+        size = tile_degrees(zoom)
+        west, south = x * size - 180, y * size - 90
+        with self._lock:
+            if zoom > CLUSTER_MAX_ZOOM:
+                stations = [
+                    s for c in self._finest_cells(zoom, x, y) for s in self.cell_stations.get(c, ())
+                    if south <= s["lat"] < south + size and (s["lng"] - west) % 360 < size
+                ]
+                return {"zoom": zoom, "x": x, "y": y, "clusters": [], "stations": stations}
+
+            cells = self.levels[zoom]
+            clusters, stations = [], []
+            for i in range(CELLS_PER_TILE):
+                for j in range(CELLS_PER_TILE):
+                    cluster = cells.get((x * CELLS_PER_TILE + i, y * CELLS_PER_TILE + j))
+                    if cluster is None:
+                        continue
+                    if cluster["count"] == 1:
+                        stations.append(cluster["station"])
+                        continue
+                    clusters.append({
+                        "count": cluster["count"],
+                        "lat": round(cluster["lat_sum"] / cluster["count"], 6),
+                        "lng": round(cluster["lng_sum"] / cluster["count"], 6),
+                        "best_green_score": cluster["best_green_score"],
+                        "min_price": cluster["min_price"],
+                    })
+        return {"zoom": zoom, "x": x, "y": y, "clusters": clusters, "stations": stations}
+
+
+def viewport_tiles(south, west, north, east, zoom):
+    """(zoom, x, y) tiles covering a viewport; west > east crosses the antimeridian"""
+    zoom = max(0, min(int(zoom), MAX_ZOOM))
+    size = tile_degrees(zoom)
+    columns = 2 ** zoom
+    x0 = int((west + 180) // size)
+    x1 = int((east + 180) // size)
+    if west > east:
+        x1 += columns
+    xs = sorted({x % columns for x in range(x0, min(x1, x0 + columns - 1) + 1)})
+    south, north = max(south, -90.0), min(north, 89.999999)
+    ys = range(int((south + 90) // size), int((north + 90) // size) + 1)
+    return [(zoom, x, y) for x in xs for y in ys]
+
+
+# ===============================
+# SHARED GRID FOR THE APP
+# ===============================
+_grid = None
+_built_version = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+_STATION_SQL = """
+    SELECT name, location, chargers, price, green_score, id, lat, lng
+    FROM stations
+    WHERE approved = 1 AND lat IS NOT NULL AND lng IS NOT NULL
+"""
+_STATIONS_VERSION_SQL = "SELECT version FROM data_versions WHERE name = 'stations'"
+
+
+def _station(row):
+    name, location, chargers, price, green_score, station_id, lat, lng = row
+    return {
+        "id": station_id,
+        "name": name,
+        "location": location,
+        "chargers": chargers,
+        "price": price,
+        "green_score": green_score,
+        "lat": lat,
+        "lng": lng,
+        "marker_color": get_marker_color(green_score)
+    }
+
+
+def _stations_version(cur):
+    cur.execute(_STATIONS_VERSION_SQL)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _load_grid():
+    """(grid, stations version it was built from)"""
+    start = time.perf_counter()
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        # Version first: a change landing mid-read only costs a second rebuild
+        version = _stations_version(cur)
+        cur.execute(_STATION_SQL + " ORDER BY id")
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    grid = ClusterGrid([_station(r) for r in rows])
+    logger.info(f"Map cluster grid built over {grid.total} stations "
+                f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return grid, version
+
+
+def _install(grid, version):
+    global _grid, _built_version, _checked_at
+    with _lock:
+        _grid, _built_version = grid, version
+        _checked_at = time.monotonic()
+
+
+def _rebuild():
+    try:
+        _install(*_load_grid())
+    except Exception as e:
+        logger.error(f"Map cluster grid rebuild failed: {e}")
+    finally:
+        _rebuild_lock.release()
+
+
+def get_cluster_grid():
+    """
+    Grid of approved stations. Built on first use; afterwards the stations
+    counter is read at most every VERSION_CHECK_SECONDS and, only when it
+    has moved, one background thread rebuilds while callers keep the
+    current grid.
+    """
+    global _checked_at
+    with _lock:
+        grid, version = _grid, _built_version
+        due = time.monotonic() - _checked_at > VERSION_CHECK_SECONDS
+    if grid is None:
+        with _rebuild_lock:
+            if _grid is None:
+                _install(*_load_grid())
+            return _grid
+    if not due:
+        return grid
+
+    conn = get_db()
+    try:
+        current = _stations_version(conn.cursor())
+    finally:
+        conn.close()
+    _checked_at = time.monotonic()
+    if current != version and _rebuild_lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild, name="map-tiles-rebuild", daemon=True).start()
+    return grid
+
+
+def station_approved(station_id):
+    """Add a newly approved station to the built grid (no full rebuild)"""
+    with _lock:
+        grid = _grid
+    if grid is None:
+        return
+
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(_STATION_SQL + " AND id = ?", (station_id,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if row:
+        grid.add(_station(row))
+
+
+def invalidate_cluster_grid():
+    """Check the stations counter on next use (e.g. a station moved)"""
+    global _checked_at
+    with _lock:
+        _checked_at = float("-inf")
@@ -1,65 +1,62 @@
 import os
 import logging
+from math import radians, cos, sin, asin, sqrt
+import numpy as np
 from models.db import get_db
 
 logger = logging.getLogger(__name__)
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
+EARTH_RADIUS_KM = 6371
+
+
+def _map_station(row, index):
+    """
+    Map marker dict for a (name, location, chargers, price, green_score,
+    id, lat, lng[, distance]) row. Stations without stored coordinates are
+    placed near the default map center (offset by index for visibility)
+    so they still appear on the map.
+    """
+    name, location, chargers, price, green_score, station_id, lat, lng = row[:8]
+    located = lat is not None and lng is not None
+    
+    if not located:
+        lat = 28.6139 + (index * 0.01)  # Offset for visibility
+        lng = 77.2090 + (index * 0.01)
+    
+    station = {
+        "id": station_id,
+        "name": name,
+        "location": location,
+        "chargers": chargers,
+        "price": price,
+        "green_score": green_score,
+        "lat": lat,
+        "lng": lng,
+        "located": located,
+        "marker_color": get_marker_color(green_score)
+    }
+    if len(row) > 8 and row[8] is not None:
+        station["distance"] = round(row[8], 2)
+    return station
 
 
 def get_all_stations_with_location():
     """
     Get all approved stations with their location coordinates
-    For now, uses hardcoded coordinates for popular petrol pumps in India
     """
     conn = get_db()
     cur = conn.cursor()
     
     try:
         cur.execute("""
-            SELECT name, location, chargers, price, green_score, id
+            SELECT name, location, chargers, price, green_score, id, lat, lng
             FROM stations
             WHERE approved = 1
+            ORDER BY id
         """)
         
-        stations = cur.fetchall()
-        
-        # Add coordinates for stations
-        # In production, you would geocode these addresses or have coordinates in DB
-        station_coordinates = {
-            "Central Hub": {"lat": 28.6139, "lng": 77.2090},  # Delhi
-            "Downtown Station": {"lat": 19.0760, "lng": 72.8777},  # Mumbai
-            "Tech Park Charger": {"lat": 12.9716, "lng": 77.5946},  # Bangalore
-            "Airport Plaza": {"lat": 28.5921, "lng": 77.1385},  # Delhi Airport area
-            "Highway Rest Point": {"lat": 28.4595, "lng": 77.0266},  # Noida
-            "Shopping Mall Charging": {"lat": 18.9220, "lng": 72.8347},  # Mumbai area
-            "Business District": {"lat": 13.0827, "lng": 80.2707},  # Chennai
-            "Metro Station Hub": {"lat": 28.7041, "lng": 77.1025},  # Delhi Metro
-        }
-        
-        stations_list = []
-        for station in stations:
-            name, location, chargers, price, green_score, station_id = station
-            
-            # Get coordinates from predefined list or use defaults
-            coords = station_coordinates.get(name, {
-                "lat": 28.6139 + (len(stations_list) * 0.01),  # Offset for visibility
-                "lng": 77.2090 + (len(stations_list) * 0.01)
-            })
-            
-            stations_list.append({
-                "id": station_id,
-                "name": name,
-                "location": location,
-                "chargers": chargers,
-                "price": price,
-                "green_score": green_score,
-                "lat": coords.get("lat", 28.6139),
-                "lng": coords.get("lng", 77.2090),
-                "marker_color": get_marker_color(green_score)
-            })
-        
-        return stations_list
+        return [_map_station(row, i) for i, row in enumerate(cur.fetchall())]
         
     except Exception as e:
         logger.error(f"Error fetching stations: {e}")
@@ -68,6 +65,34 @@ def get_all_stations_with_location():
         conn.close()
 
 
+def filter_stations(filters, origin=None, page=1, per_page=50):
+    """
+    One page of approved stations matching filters (see
+    models.station.build_station_query), filtered and sorted in SQL.
+    With an origin, stations carry "distance" and come nearest first.
+    
+    Returns: {"stations": [...], "total", "page", "per_page", "pages"}
+    """
+    from models.station import search_stations
+    
+    conn = get_db()
+    try:
+        result = search_stations(
+            conn.cursor(), filters, origin=origin,
+            sort_by="distance" if origin else None,
+            page=page, per_page=per_page
+        )
+    except Exception as e:
+        logger.error(f"Error filtering stations: {e}")
+        return {"stations": [], "total": 0, "page": 1, "per_page": per_page, "pages": 1}
+    finally:
+        conn.close()
+    
+    offset = (result["page"] - 1) * per_page
+    result["stations"] = [_map_station(row, offset + i) for i, row in enumerate(result.pop("rows"))]
+    return result
+
+
 def get_marker_color(green_score):
     """Determine marker color based on green score"""
     if green_score >= 8:
@@ -83,57 +108,32 @@ def get_marker_color(green_score):
 def search_stations_by_location(lat, lng, radius_km=10):
     """
     Search stations within radius of given coordinates
-    Uses Haversine formula for distance calculation
+    Uses the spatial grid index (ai/geo_index.py): bounding-box prefilter,
+    exact Haversine distance only for candidates
     """
-    conn = get_db()
-    cur = conn.cursor()
+    from ai.geo_index import get_geo_index
     
     try:
-        cur.execute("""
-            SELECT name, location, chargers, price, green_score, id
-            FROM stations
-            WHERE approved = 1
-        """)
-        
-        stations = cur.fetchall()
-        station_coordinates = _get_station_coordinates()
-        
-        nearby_stations = []
+        nearby = get_geo_index().within(lat, lng, radius_km)
         
-        for station in stations:
-            name, location, chargers, price, green_score, station_id = station
-            coords = station_coordinates.get(name)
-            
-            if coords:
-                distance = calculate_distance(
-                    lat, lng,
-                    coords.get("lat", 28.6139),
-                    coords.get("lng", 77.2090)
-                )
-                
-                if distance <= radius_km:
-                    nearby_stations.append({
-                        "id": station_id,
-                        "name": name,
-                        "location": location,
-                        "chargers": chargers,
-                        "price": price,
-                        "green_score": green_score,
-                        "lat": coords.get("lat", 28.6139),
-                        "lng": coords.get("lng", 77.2090),
-                        "distance": round(distance, 2),
-                        "marker_color": get_marker_color(green_score)
-                    })
-        
-        # Sort by distance
-        nearby_stations.sort(key=lambda x: x.get("distance", 0))
-        return nearby_stations
+        # Nearest first
+        return [dict(station, distance=round(distance, 2)) for distance, station in nearby]
         
     except Exception as e:
         logger.error(f"Error searching stations: {e}")
         return []
-    finally:
-        conn.close()
+
+
+def find_nearest_stations(lat, lng, k=5):
+    """k nearest approved stations to the given coordinates, nearest first"""
+    from ai.geo_index import get_geo_index
+    
+    try:
+        nearest = get_geo_index().nearest(lat, lng, k)
+        return [dict(station, distance=round(distance, 2)) for distance, station in nearest]
+    except Exception as e:
+        logger.error(f"Error finding nearest stations: {e}")
+        return []
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -141,8 +141,6 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     Calculate distance between two coordinates using Haversine formula
     Returns distance in kilometers
     """
-    from math import radians, cos, sin, asin, sqrt
-    
     # Convert to radians
     lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
     
@@ -151,23 +149,36 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     dlat = lat2 - lat1
     a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
     c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of Earth in km
+    r = EARTH_RADIUS_KM
     
     return c * r
 
 
-def _get_station_coordinates():
-    """Helper to get station coordinates"""
-    return {
-        "Central Hub": {"lat": 28.6139, "lng": 77.2090},
-        "Downtown Station": {"lat": 19.0760, "lng": 72.8777},
-        "Tech Park Charger": {"lat": 12.9716, "lng": 77.5946},
-        "Airport Plaza": {"lat": 28.5921, "lng": 77.1385},
-        "Highway Rest Point": {"lat": 28.4595, "lng": 77.0266},
-        "Shopping Mall Charging": {"lat": 18.9220, "lng": 72.8347},
-        "Business District": {"lat": 13.0827, "lng": 80.2707},
-        "Metro Station Hub": {"lat": 28.7041, "lng": 77.1025},
-    }
+def haversine_distances(lat, lng, lats, lngs):
+    """
+    Distances in km from one origin to many points in a single vectorized
+    call (same formula as calculate_distance). lats/lngs are array-likes;
+    returns a NumPy array, NaN where a point has no coordinates.
+    """
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lng2 = np.radians(np.asarray(lngs, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    # Clip rounding error just above 1 (antipodal points) before asin
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(origin_lats, origin_lngs, lats, lngs):
+    """
+    origins x points distance matrix in km, e.g. every vehicle of a fleet
+    against every station. Memory is 8 bytes per pair, so split very
+    large fleets into batches of origins.
+    """
+    origin_lats = np.asarray(origin_lats, dtype=float)[:, None]
+    origin_lngs = np.asarray(origin_lngs, dtype=float)[:, None]
+    return haversine_distances(origin_lats, origin_lngs,
+                               np.asarray(lats, dtype=float)[None, :],
+                               np.asarray(lngs, dtype=float)[None, :])
 
 
 def add_station_coordinates(station_name, lat, lng):
@@ -175,14 +186,31 @@ def add_station_coordinates(station_name, lat, lng):
     Add or update coordinates for a station
     Can be called when adding new stations
     """
+    conn = get_db()
     try:
-        # In production, store in database
-        coords_db = _get_station_coordinates()
-        coords_db[station_name] = {"lat": lat, "lng": lng}
-        return True
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE stations SET lat=?, lng=? WHERE name=?",
+            (lat, lng, station_name)
+        )
+        conn.commit()
+        updated = cur.rowcount > 0
     except Exception as e:
         logger.error(f"Error adding coordinates: {e}")
         return False
+    finally:
+        conn.close()
+    
+    if updated:
+        # Cached station data must pick up the new position
+        from ai.geo_index import invalidate_geo_index
+        from ai.scoring import invalidate_station_scorer
+        from ai.map_tiles import invalidate_cluster_grid
+        invalidate_geo_index()
+        invalidate_station_scorer()
+        # A moved station leaves its old clusters: rebuild the grid
+        invalidate_cluster_grid()
+    return updated
 
 
 def get_map_config():
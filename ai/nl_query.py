@@ -1,22 +1,69 @@
-import google.genai as genai
-import os
+import re
 import json
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+import unicodedata
+import config
+from ai.cache import LRUCache
+from ai.client import ai_client, strip_code_fences
+from models.db import get_db
+from models.station import search_stations
 
 logger = logging.getLogger(__name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    logger.info("✅ Gemini API key configured for NL Query")
-else:
-    logger.warning("⚠️ GEMINI_API_KEY not set for NL Query")
+
+# ===============================
+# PARSED QUERY CACHE
+# ===============================
+# Gemini parses are also persisted (see ai/cache.py). Fallback parses
+# are cheaper to redo than to look up on disk, so they get their own
+# memory-only cache and a miss there never reads ai_cache.
+_parse_cache = LRUCache("nl_query", config.NL_CACHE_SIZE, config.NL_CACHE_TTL,
+                        persist=config.NL_CACHE_PERSIST)
+_fallback_cache = LRUCache("nl_query_fallback", config.NL_CACHE_SIZE, config.NL_CACHE_TTL)
+
+# Anything but letters, digits, "_", ₹ and decimal points separates words
+_PUNCTUATION = re.compile(r"[^\w₹.]+|(?<!\d)\.|\.(?!\d)")
+
+
+def normalize_query(query):
+    """
+    Cache key for a query: Unicode NFKC, lowercase, punctuation folded to
+    spaces (decimal points kept) and whitespace collapsed, so
+    "Cheapest station near me!" and "cheapest  station near me" share
+    one parse.
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def parse_cache_stats():
+    return {"ai": _parse_cache.stats(), "fallback": _fallback_cache.stats()}
 
 
 def parse_natural_language_query(query):
+    """
+    Cached front of the parsers: the normalized query is parsed once (by
+    Gemini when configured, else by the fallback parser) and reused
+    until NL_CACHE_TTL. Results that fell back because Gemini failed are
+    not cached, so the next request tries Gemini again.
+    
+    Returns a fresh dict the caller may modify.
+    """
+    normalized = normalize_query(query)
+    use_ai = ai_client.is_configured()
+    method = "ai" if use_ai else "fallback"
+    cache = _parse_cache if use_ai else _fallback_cache
+    key = f"{method}:{normalized}"
+    
+    filters = cache.get(key)
+    if filters is None:
+        filters = _parse_with_gemini(normalized) if use_ai else _parse_fallback_query(normalized)
+        if filters.get("query_method") == method:
+            cache.set(key, filters)
+    return dict(filters)
+
+
+def _parse_with_gemini(query):
     """
     Convert natural language query to structured search filters
     
@@ -35,9 +82,6 @@ def parse_natural_language_query(query):
     }
     """
     
-    if not GEMINI_API_KEY:
-        return _parse_fallback_query(query)
-    
     try:
         prompt = f"""Parse this EV charging station search query into structured filters.
 
@@ -64,30 +108,16 @@ Rules:
 - If price mentioned: extract price_max
 - Only return valid JSON, no extra text"""
         
-        client = genai.Client()
-        response = client.models.generate_content(
-            model="models/gemini-2.0-flash",
-            contents=prompt,
-            config={"temperature": 0.3}
-        )
+        text = ai_client.generate(prompt, caller="nl_query", temperature=0.3)
         
-        if response and response.text:
+        if text:
             try:
-                # Clean up response
-                text = response.text.strip()
-                if text.startswith("```json"):
-                    text = text[7:]
-                if text.startswith("```"):
-                    text = text[3:]
-                if text.endswith("```"):
-                    text = text[:-3]
-                
-                filters = json.loads(text.strip())
+                filters = json.loads(strip_code_fences(text))
                 filters["query_method"] = "ai"
                 filters["natural_explanation"] = _generate_explanation(query, filters)
                 return filters
             except json.JSONDecodeError:
-                logger.warning(f"Failed to parse Gemini response: {response.text}")
+                logger.warning(f"Failed to parse Gemini response: {text}")
                 return _parse_fallback_query(query)
         
         return _parse_fallback_query(query)
@@ -97,52 +127,81 @@ Rules:
         return _parse_fallback_query(query)
 
 
+# ===============================
+# FALLBACK PARSER RULES
+# ===============================
+# (keywords, filter updates, takes a price) applied in order when any
+# keyword appears anywhere in the lowercased query - a substring match,
+# so "cheapest" and "eco-friendly" count. Later rules win on sort_by.
+FALLBACK_RULES = (
+    (("green", "eco", "environment", "renewable", "clean"),
+     {"green_score_min": 7, "sort_by": "green_score", "intent": "greenest"}, False),
+    (("cheap", "budget", "affordable", "inexpensive", "cost", "price"),
+     {"sort_by": "price", "intent": "cheapest"}, True),
+    (("fast", "quick", "rapid", "speed"),
+     {"fast_charging": True, "sort_by": "availability"}, False),
+)
+
+FALLBACK_DEFAULTS = {
+    "green_score_min": None,
+    "green_score_max": None,
+    "price_min": None,
+    "price_max": None,
+    "max_distance": None,
+    "min_chargers": None,
+    "fast_charging": False,
+    "sort_by": "distance",
+    "intent": "balanced",
+    "query_method": "fallback"
+}
+
+DEFAULT_MAX_DISTANCE = 10  # km when the query names none
+
+# Prices ("200 rupees", group 2 set) and distances ("15 km") in one pass
+_NUMBER_UNITS = re.compile(r"(\d+)\s*(?:(rupees?|rs|₹)|km|kilometer|mile)")
+
+
+def _has_digit(text):
+    """Cheap pre-check before scanning for numbers (any Unicode digit counts)"""
+    if not text.isascii():
+        return True
+    return any(map(text.__contains__, "0123456789"))
+
+
+def _extract_numbers(query_lower):
+    """(first price, first distance) as ints, None when absent"""
+    price = distance = None
+    if _has_digit(query_lower):
+        for match in _NUMBER_UNITS.finditer(query_lower):
+            if match.group(2):
+                if price is None:
+                    price = int(match.group(1))
+            elif distance is None:
+                distance = int(match.group(1))
+            if price is not None and distance is not None:
+                break
+    return price, distance
+
+
 def _parse_fallback_query(query):
-    """Fallback parser when Gemini API is unavailable"""
+    """Fallback parser when Gemini API is unavailable (keyword rules above)"""
     
     query_lower = query.lower()
-    filters = {
-        "green_score_min": None,
-        "green_score_max": None,
-        "price_min": None,
-        "price_max": None,
-        "max_distance": None,
-        "min_chargers": None,
-        "fast_charging": False,
-        "sort_by": "distance",
-        "intent": "balanced",
-        "query_method": "fallback"
-    }
+    filters = dict(FALLBACK_DEFAULTS)
+    price, distance = _extract_numbers(query_lower)
     
-    # Green/Eco check
-    if any(word in query_lower for word in ["green", "eco", "environment", "renewable", "clean"]):
-        filters["green_score_min"] = 7
-        filters["sort_by"] = "green_score"
-        filters["intent"] = "greenest"
-    
-    # Cheap/Budget check
-    if any(word in query_lower for word in ["cheap", "budget", "affordable", "inexpensive", "cost", "price"]):
-        filters["sort_by"] = "price"
-        filters["intent"] = "cheapest"
-        # Try to extract price
-        import re
-        price_match = re.search(r'(\d+)\s*(rupees?|rs|₹)', query_lower)
-        if price_match:
-            filters["price_max"] = int(price_match.group(1))
-    
-    # Fast/Quick check
-    if any(word in query_lower for word in ["fast", "quick", "quick", "rapid", "speed"]):
-        filters["fast_charging"] = True
-        filters["sort_by"] = "availability"
-    
-    # Distance check
-    import re
-    distance_match = re.search(r'(\d+)\s*(km|kilometer|mile)', query_lower)
-    if distance_match:
-        distance = int(distance_match.group(1))
+    for keywords, updates, takes_price in FALLBACK_RULES:
+        if any(map(query_lower.__contains__, keywords)):
+            filters.update(updates)
+            if takes_price and price is not None:
+                filters["price_max"] = price
+    
+    # "km" anywhere means kilometres, otherwise the number is read as
+    # miles (so "5 kilometers" is converted too)
+    if distance is not None:
         filters["max_distance"] = distance if "km" in query_lower else distance * 1.6
     else:
-        filters["max_distance"] = 10  # Default to 10km if not specified
+        filters["max_distance"] = DEFAULT_MAX_DISTANCE
     
     filters["natural_explanation"] = _generate_explanation(query, filters)
     return filters
@@ -177,32 +236,44 @@ def _generate_explanation(query, filters):
     return " ".join(parts) if parts else "Searching for charging stations"
 
 
-def apply_filters_to_stations(stations, filters):
+def apply_filters_to_stations(stations, filters, origin=None):
     """
     Apply parsed filters to station list
-    stations: list of (name, location, chargers, price, green_score) tuples
+    stations: list of (name, location, chargers, price, green_score[, lat, lng]) tuples
     filters: output from parse_natural_language_query()
+    origin: optional (lat, lng) of the user; enables the max_distance filter
     
     Returns: filtered and sorted station list
     """
     
     filtered = stations
     
-    # Apply filters
-    if filters.get("green_score_min"):
-        filtered = [s for s in filtered if s[4] >= filters["green_score_min"]]
-    
-    if filters.get("green_score_max"):
-        filtered = [s for s in filtered if s[4] <= filters["green_score_max"]]
-    
-    if filters.get("price_max"):
-        filtered = [s for s in filtered if s[3] <= filters["price_max"]]
-    
-    if filters.get("price_min"):
-        filtered = [s for s in filtered if s[3] >= filters["price_min"]]
+    # Distance filter: one vectorized haversine over all stations
+    if origin and filters.get("max_distance") and filtered and len(filtered[0]) >= 7:
+        from ai.map_utils import haversine_distances
+        distances = haversine_distances(
+            origin[0], origin[1],
+            [s[5] if s[5] is not None else float("nan") for s in filtered],
+            [s[6] if s[6] is not None else float("nan") for s in filtered]
+        )
+        # Stations without coordinates (NaN) cannot be shown to be in range
+        in_range = distances <= filters["max_distance"]
+        filtered = [s for s, keep in zip(filtered, in_range) if keep]
     
-    if filters.get("min_chargers"):
-        filtered = [s for s in filtered if s[2] >= filters["min_chargers"]]
+    # Apply every filter in a single pass
+    green_min = filters.get("green_score_min")
+    green_max = filters.get("green_score_max")
+    price_max = filters.get("price_max")
+    price_min = filters.get("price_min")
+    min_chargers = filters.get("min_chargers")
+    filtered = [
+        s for s in filtered
+        if (not green_min or s[4] >= green_min)
+        and (not green_max or s[4] <= green_max)
+        and (not price_max or s[3] <= price_max)
+        and (not price_min or s[3] >= price_min)
+        and (not min_chargers or s[2] >= min_chargers)
+    ]
     
     # Sort
     sort_by = filters.get("sort_by", "distance")
@@ -213,31 +284,115 @@ def apply_filters_to_stations(stations, filters):
         filtered.sort(key=lambda x: x[3])  # Lower is better
     elif sort_by == "chargers":
         filtered.sort(key=lambda x: x[2], reverse=True)
+    elif sort_by == "distance" and origin and filtered and len(filtered[0]) >= 7:
+        from ai.map_utils import haversine_distances
+        distances = haversine_distances(
+            origin[0], origin[1],
+            [s[5] if s[5] is not None else float("nan") for s in filtered],
+            [s[6] if s[6] is not None else float("nan") for s in filtered]
+        )
+        # Nearest first; stations without coordinates (NaN) go last
+        filtered = [filtered[i] for i in distances.argsort(kind="stable")]
     
     return filtered
 
 
-def search_with_natural_language(query, all_stations):
+# Parsed filter keys understood by models.station.build_station_query
+SQL_FILTER_KEYS = ("green_score_min", "green_score_max", "price_min", "price_max",
+                   "min_chargers", "max_distance")
+SQL_SORTS = ("green_score", "price", "chargers", "distance")
+# Parsers say "availability"; the closest stored measure is charger count
+SORT_ALIASES = {"availability": "chargers"}
+
+
+def result_ordering(filters, origin=None):
+    """
+    (sort_by, weights) for models.station.search_stations.
+    
+    A single-criterion sort the parser asked for is used as is (distance
+    needs the user's position). Balanced queries, and sorts that cannot
+    be applied, get a combined ranking: the recommender's "nearest"
+    weighting with a position, its default weighting without.
+    """
+    from ai.scoring import WEIGHTINGS
+    
+    sort_by = SORT_ALIASES.get(filters.get("sort_by"), filters.get("sort_by"))
+    balanced = filters.get("intent") == "balanced" and sort_by in (None, "distance")
+    if not balanced and sort_by in SQL_SORTS and (sort_by != "distance" or origin):
+        return sort_by, None
+    return "rank", WEIGHTINGS["nearest" if origin else "default"]
+
+
+def search_stations_with_filters(filters, origin=None, page=1, per_page=50):
+    """
+    Run parsed filters as one SQL query over approved stations (same
+    semantics as apply_filters_to_stations: empty/zero filters are
+    ignored, max_distance needs an origin). The distance filter is a
+    bounding box on the lat index plus an exact haversine check, and
+    sorting/ranking happen in SQL, so only one page reaches Python.
+    
+    Returns: {"rows": [(name, location, chargers, price, green_score, lat, lng[, distance])],
+              "total", "page", "per_page", "pages", "sort_by"}
+    """
+    spec = {key: filters.get(key) or None for key in SQL_FILTER_KEYS}
+    sort_by, weights = result_ordering(filters, origin)
+    
+    conn = get_db()
+    try:
+        found = search_stations(
+            conn.cursor(), spec,
+            columns=("name", "location", "chargers", "price", "green_score", "lat", "lng"),
+            origin=origin,
+            sort_by=sort_by,
+            weights=weights,
+            page=page, per_page=per_page
+        )
+    finally:
+        conn.close()
+    
+    found["sort_by"] = sort_by
+    return found
+
+
+def search_with_natural_language(query, all_stations=None, origin=None, page=1, per_page=50):
     """
     End-to-end natural language search
     query: user input like "Find me a green station near me"
-    all_stations: list of station tuples
+    all_stations: optional list of station tuples to search in memory;
+                  by default the filters run in SQL, one page at a time
+    origin: optional (lat, lng) of the user for distance filtering
     
     Returns: {
         "explanation": "Searching for eco-friendly stations within 10km",
+        "sort_by": "green_score|price|chargers|distance|rank",
         "filters": {...},
         "results": [stations],
-        "result_count": N
+        "result_count": N,
+        "page": 1, "pages": 1
     }
     """
     
     filters = parse_natural_language_query(query)
-    results = apply_filters_to_stations(all_stations, filters)
+    explanation = filters.get("natural_explanation")
+    
+    if all_stations is None:
+        found = search_stations_with_filters(filters, origin, page, per_page)
+        results, total = found["rows"], found["total"]
+        page, pages, sort_by = found["page"], found["pages"], found["sort_by"]
+    else:
+        results = apply_filters_to_stations(all_stations, filters, origin)
+        total, page, pages, sort_by = len(results), 1, 1, filters.get("sort_by")
+    
+    if filters.get("max_distance") and origin is None:
+        explanation += " (share your location to apply the distance limit)"
     
     return {
-        "explanation": filters.get("natural_explanation"),
+        "explanation": explanation,
+        "sort_by": sort_by,
         "filters": filters,
         "results": results,
-        "result_count": len(results),
+        "result_count": total,
+        "page": page,
+        "pages": pages,
         "query_method": filters.get("query_method")
     }
@@ -1,47 +1,32 @@
-import google.generativeai as genai
-import os
 import json
+import hashlib
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+import config
+from ai.cache import LRUCache
+from ai.client import ai_client, strip_code_fences
+from ai.scoring import StationScorer
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    logger.info("✅ Gemini API key configured for Recommender")
-else:
-    logger.warning("⚠️ GEMINI_API_KEY not set for Recommender")
-
 
-def recommend_station(battery, distance, stations):
+def recommend_station(battery, distance, stations, weighting="default", origin=None):
     """
     battery: current battery percentage (0–100)
     distance: distance to destination (km)
-    stations: list of stations from DB
+    stations: StationScorer (see ai/scoring.py) or list of station rows
+    weighting: name in ai.scoring.WEIGHTINGS, a weights dict or a callable
+    origin: optional (lat, lng) to check reachability per station
     Returns: (station_data, explanation) or (None, error_message)
     """
+    if not isinstance(stations, StationScorer):
+        stations = StationScorer(stations)
 
-    reachable_stations = []
-
-    # Assume: 1% battery ≈ 1 km (simple heuristic)
-    max_distance = battery * 1
-
-    for s in stations:
-        name, location, chargers, price, green_score = s
-
-        if max_distance >= distance:
-            score = (green_score * 2) - price
-            reachable_stations.append((score, s))
+    # Top 5 reachable stations, best first (scored in one vectorized pass)
+    reachable_stations = stations.top_k(battery, distance, k=5, weighting=weighting, origin=origin)
 
     if not reachable_stations:
         return None, "No reachable stations found with your current battery level."
 
-    # Pick station with highest score
-    reachable_stations.sort(reverse=True, key=lambda x: x[0])
     best_station = reachable_stations[0][1]
     
     # Generate AI explanation using Gemini if API is configured
@@ -50,19 +35,62 @@ def recommend_station(battery, distance, stations):
     return best_station, explanation
 
 
+# ===============================
+# EXPLANATION CACHE
+# ===============================
+# Content-addressed: the key is a hash of everything the prompt depends
+# on, with battery and distance bucketed so nearby inputs share one call
+_explanation_cache = LRUCache("explanations", config.EXPLANATION_CACHE_SIZE,
+                              config.EXPLANATION_CACHE_TTL, persist=config.EXPLANATION_CACHE_PERSIST)
+
+
+def bucket_inputs(battery, distance):
+    """
+    Battery rounded down and distance rounded up to their bucket size,
+    so the explanation never promises more range than the user has
+    """
+    battery_step = config.EXPLANATION_BATTERY_BUCKET
+    distance_step = config.EXPLANATION_DISTANCE_BUCKET
+    return battery // battery_step * battery_step, -(-distance // distance_step) * distance_step
+
+
+def explanation_key(battery, distance, stations):
+    """sha256 of the (bucketed) prompt inputs and the top station rows"""
+    payload = json.dumps([battery, distance, [list(s) for s in stations]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def explanation_cache_stats():
+    return _explanation_cache.stats()
+
+
 def _generate_ai_explanation(battery, distance, best_station, all_reachable):
     """
-    Generate an AI-powered explanation for the recommendation using Gemini API
+    Generate an AI-powered explanation for the recommendation using Gemini API.
+    Identical (bucketed) requests are answered from the cache, and
+    concurrent ones share a single Gemini call.
     """
-    if not GEMINI_API_KEY:
+    if not ai_client.is_configured():
         return _generate_fallback_explanation(battery, distance, best_station)
     
+    battery_bucket, distance_bucket = bucket_inputs(battery, distance)
+    stations = [tuple(station) for _, station in all_reachable[:5]]  # Top 5 reachable
+    explanation = _explanation_cache.get_or_compute(
+        explanation_key(battery_bucket, distance_bucket, stations),
+        lambda: _ask_gemini(battery_bucket, distance_bucket, stations),
+        cacheable=lambda text: text is not None
+    )
+    return explanation or _generate_fallback_explanation(battery, distance, best_station)
+
+
+def _ask_gemini(battery, distance, stations):
+    """Gemini explanation for the ranked stations; None if the call fails"""
     try:
-        name, location, chargers, price, green_score = best_station
+        name, location, chargers, price, green_score = stations[0]
         
         # Prepare station data for Gemini
         stations_info = []
-        for i, (score, station) in enumerate(all_reachable[:5], 1):  # Top 5 reachable
+        for i, station in enumerate(stations, 1):
             s_name, s_loc, s_chargers, s_price, s_green = station
             stations_info.append({
                 "rank": i,
@@ -97,26 +125,12 @@ Please provide:
 
 Keep the response concise and practical. Format as JSON with keys: "why", "benefits", "tip"."""
         
-        client = genai.Client()
-        response = client.models.generate_content(
-            model="models/gemini-2.0-flash",
-            contents=prompt,
-            config={"temperature": 0.7}
-        )
+        text = ai_client.generate(prompt, caller="recommender", temperature=0.7)
         
-        if response and response.text:
+        if text:
             # Try to parse JSON response
             try:
-                response_text = response.text.strip()
-                # Remove markdown code blocks if present
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                
-                ai_data = json.loads(response_text.strip())
+                ai_data = json.loads(strip_code_fences(text))
                 explanation = f"""
 {ai_data.get('why', 'Recommended based on availability and pricing.')}
 
@@ -128,13 +142,13 @@ Tip: {ai_data.get('tip', 'Charge during off-peak hours for better rates!')}
                 return explanation.strip()
             except json.JSONDecodeError:
                 # If JSON parsing fails, use the raw response
-                return f"AI Recommendation:\n{response.text}"
+                return f"AI Recommendation:\n{text}"
         
-        return _generate_fallback_explanation(battery, distance, best_station)
+        return None
         
     except Exception as e:
         logger.error(f"Error generating AI explanation: {e}")
-        return _generate_fallback_explanation(battery, distance, best_station)
+        return None
 
 
 def _generate_fallback_explanation(battery, distance, best_station):
@@ -0,0 +1,158 @@
+"""
+Vectorized station scoring for recommendations.
+
+Stations are held as NumPy column arrays (price, green_score, chargers,
+lat, lng, approved) so scoring, reachability and top-k selection are a
+few array operations instead of a Python loop over every station.
+
+Weightings are pluggable: a dict of column -> coefficient (plus
+"distance" when an origin is given), or any callable taking the scorer
+and returning one score per station.
+"""
+import logging
+import threading
+import time
+import numpy as np
+from models.db import get_db
+from ai.map_utils import haversine_distances
+
+logger = logging.getLogger(__name__)
+
+# Assume: 1% battery ≈ 1 km (simple heuristic)
+KM_PER_BATTERY_PERCENT = 1
+
+# Named weightings; "default" is the original (green_score * 2) - price
+WEIGHTINGS = {
+    "default": {"green_score": 2.0, "price": -1.0},
+    "eco": {"green_score": 4.0, "price": -0.5},
+    "budget": {"green_score": 0.5, "price": -3.0},
+    "availability": {"green_score": 1.0, "price": -1.0, "chargers": 1.0},
+    "nearest": {"green_score": 0.5, "price": -0.5, "distance": -1.0},
+}
+
+SCORER_TTL = 300  # seconds before the cached scorer is rebuilt from SQL
+
+
+class StationScorer:
+    """Column store of stations with vectorized scoring and top-k"""
+
+    def __init__(self, rows):
+        """
+        rows: (name, location, chargers, price, green_score[, approved,
+        lat, lng]) tuples as read from the stations table; approved
+        defaults to 1 and missing coordinates to NaN.
+        """
+        self.rows = [tuple(r[:5]) for r in rows]
+        n = len(self.rows)
+
+        def column(index, default=np.nan):
+            return np.array(
+                [r[index] if len(r) > index and r[index] is not None else default for r in rows],
+                dtype=float
+            ) if n else np.empty(0)
+
+        self.chargers = column(2)
+        self.price = column(3)
+        self.green_score = column(4)
+        self.approved = column(5, 1.0) > 0
+        self.lat = column(6)
+        self.lng = column(7)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def distances_from(self, origin):
+        """km from origin (lat, lng) to every station; NaN without coordinates"""
+        return haversine_distances(origin[0], origin[1], self.lat, self.lng)
+
+    def score(self, weighting="default", origin=None):
+        if callable(weighting):
+            return np.asarray(weighting(self), dtype=float)
+
+        weights = WEIGHTINGS[weighting] if isinstance(weighting, str) else weighting
+        scores = np.zeros(len(self))
+        for name, weight in weights.items():
+            if name == "distance":
+                if origin is not None:
+                    scores += weight * np.nan_to_num(self.distances_from(origin), nan=0.0)
+                continue
+            scores += weight * getattr(self, name)
+        return scores
+
+    def reachable(self, battery, distance, origin=None):
+        """
+        Boolean mask of approved stations the battery can reach. Without
+        an origin this is the trip-level check (range covers the whole
+        trip); with one, each station's own distance must be in range.
+        """
+        max_distance = battery * KM_PER_BATTERY_PERCENT
+        mask = self.approved.copy()
+        if origin is not None:
+            mask &= self.distances_from(origin) <= max_distance
+        elif max_distance < distance:
+            mask[:] = False
+        return mask
+
+    def top_k(self, battery, distance, k=5, weighting="default", origin=None):
+        """
+        [(score, row)] for the k best reachable stations, best first. Ties
+        keep table order, as the original stable sort did.
+        """
+        scores = self.score(weighting, origin)
+        mask = self.reachable(battery, distance, origin) & ~np.isnan(scores)
+        candidates = np.flatnonzero(mask)
+        if not len(candidates) or k <= 0:
+            return []
+
+        candidate_scores = scores[candidates]
+        k = min(k, len(candidates))
+        if k < len(candidates):
+            # O(n) selection; resolve ties at the cut-off by table order
+            threshold = np.partition(-candidate_scores, k - 1)[k - 1]
+            better = candidates[-candidate_scores < threshold]
+            tied = candidates[-candidate_scores == threshold][:k - len(better)]
+            candidates = np.concatenate([better, tied])
+
+        order = np.lexsort((candidates, -scores[candidates]))
+        return [(float(scores[i]), self.rows[i]) for i in candidates[order]]
+
+
+# ===============================
+# CACHED SCORER FOR THE APP
+# ===============================
+_scorer = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def _load_scorer():
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT name, location, chargers, price, green_score, approved, lat, lng
+            FROM stations
+            ORDER BY id
+        """)
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+    return StationScorer(rows)
+
+
+def get_station_scorer():
+    """Scorer over every station, rebuilt after SCORER_TTL or invalidation"""
+    global _scorer, _built_at
+    with _lock:
+        if _scorer is None or time.monotonic() - _built_at > SCORER_TTL:
+            _scorer = _load_scorer()
+            _built_at = time.monotonic()
+            logger.info(f"Station scorer built over {len(_scorer)} stations")
+        return _scorer
+
+
+def invalidate_station_scorer():
+    """Call after stations are added or approved"""
+    global _scorer
+    with _lock:
+        _scorer = None
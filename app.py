@@ -1,6 +1,8 @@
 from flask import Flask, redirect, render_template, session
 from dotenv import load_dotenv
-from models.db import init_db, get_db
+from models.db import init_db, init_app, get_db
+from models import hourly_stats, occupancy
+from ai import batch_analytics, forecast
 from routes.admin_routes import admin_bp
 from routes.auth_routes import auth_bp 
 from routes.station_routes import station_bp
@@ -11,23 +13,23 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = "secret123"  # required for session
 
-# Initialize DB
+# Return pooled DB connections at the end of every request
+init_app(app)
+
+# Initialize DB (runs pending migrations, including the default admin)
 init_db()
 
-# Pre-create admin
-def create_admin():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM admin")
-    if not cur.fetchone():
-        cur.execute(
-            "INSERT INTO admin (username, password) VALUES (?, ?)",
-            ("admin", "admin123")
-        )
-        conn.commit()
-    conn.close()
+# Load per-station occupancy counts into memory (and its CLI check)
+occupancy.init_app(app)
+
+# `flask backfill-hourly-stats` for the station analytics rollup
+hourly_stats.init_app(app)
+
+# `flask fit-demand-model` refits the demand forecast (cron)
+forecast.init_app(app)
 
-create_admin()
+# `flask analytics-snapshot` precomputes every station's analytics page
+batch_analytics.init_app(app)
 
 # Register blueprint
 app.register_blueprint(admin_bp)
@@ -59,7 +61,7 @@ def user_dashboard():
     cur.execute("""
         SELECT COALESCE(AVG(s.green_score), 0)
         FROM charging_sessions cs
-        JOIN stations s ON cs.station_name = s.name
+        JOIN stations s ON cs.station_id = s.id
         WHERE cs.user_id = ?
     """, (session.get('user_id'),))
     avg_green_score = cur.fetchone()[0]
@@ -86,7 +88,7 @@ def owner_dashboard():
     cur.execute("""
         SELECT COUNT(DISTINCT cs.user_id)
         FROM charging_sessions cs
-        JOIN stations s ON cs.station_name = s.name
+        JOIN stations s ON cs.station_id = s.id
         WHERE s.owner_id = ?
     """, (session.get('user_id'),))
     users_served = cur.fetchone()[0]
@@ -95,7 +97,7 @@ def owner_dashboard():
     cur.execute("""
         SELECT COALESCE(SUM(cs.amount), 0)
         FROM charging_sessions cs
-        JOIN stations s ON cs.station_name = s.name
+        JOIN stations s ON cs.station_id = s.id
         WHERE s.owner_id = ?
     """, (session.get('user_id'),))
     total_revenue = cur.fetchone()[0]
@@ -0,0 +1,144 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# ===============================
+# DATABASE
+# ===============================
+# One single DB path used everywhere
+DB_PATH = os.getenv("EV_DB_PATH", os.path.join("database", "ev.db"))
+
+# Connection pool: max open connections per worker process and how long
+# a request waits for a free connection before giving up (seconds)
+DB_POOL_SIZE = int(os.getenv("EV_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("EV_DB_POOL_TIMEOUT", "10"))
+
+# SQLite tuning profile applied to every pooled connection.
+# Both profiles use WAL so readers never block the charging write path;
+# production trades a little durability (synchronous=NORMAL is still
+# crash-safe in WAL mode) and memory for throughput.
+DB_PROFILES = {
+    "development": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,        # KiB (negative = size in KiB)
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,       # ms
+    },
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 268435456,     # 256 MiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+DB_PROFILE = os.getenv(
+    "EV_DB_PROFILE",
+    "production" if os.getenv("FLASK_ENV") == "production" else "development"
+)
+DB_PRAGMAS = DB_PROFILES[DB_PROFILE]
+
+# Application-level retry when SQLite still reports "database is locked"
+# after busy_timeout (e.g. a read transaction upgraded to a write in WAL)
+DB_BUSY_RETRIES = int(os.getenv("EV_DB_BUSY_RETRIES", "5"))
+DB_BUSY_BACKOFF = float(os.getenv("EV_DB_BUSY_BACKOFF", "0.05"))
+
+# Count every SQL statement run on pooled connections (shown in pool
+# stats); off by default, used by the benchmark scripts
+DB_COUNT_QUERIES = os.getenv("EV_DB_COUNT_QUERIES", "0") == "1"
+
+# ===============================
+# STATION OCCUPANCY REGISTRY
+# ===============================
+# Seconds between reconciling the in-memory active/queue counts with SQL
+OCCUPANCY_RECONCILE_SECONDS = float(os.getenv("EV_OCCUPANCY_RECONCILE_SECONDS", "60"))
+
+# ===============================
+# APP SERVER (gunicorn.conf.py)
+# ===============================
+# Worker processes, worker class and threads per worker. Streams hold a
+# thread for their whole lifetime, so the default is gthread; "gevent"
+# also works (pip install gevent), "sync" disables queue streams
+WORKERS = int(os.getenv("EV_WORKERS", "4"))
+WORKER_CLASS = os.getenv("EV_WORKER_CLASS", "gthread")
+WORKER_THREADS = int(os.getenv("EV_WORKER_THREADS", "16"))
+
+# ===============================
+# QUEUE PUSH UPDATES (SSE)
+# ===============================
+# Max concurrently open queue-status streams per worker process; beyond
+# this clients are told to fall back to polling. Under gunicorn gthread
+# workers the cap is further limited to WORKER_THREADS minus
+# QUEUE_STREAM_FREE_THREADS, and sync workers never hold streams
+QUEUE_STREAM_MAX = int(os.getenv("EV_QUEUE_STREAM_MAX", "500"))
+# Threads per gthread worker kept free for ordinary requests
+QUEUE_STREAM_FREE_THREADS = int(os.getenv("EV_QUEUE_STREAM_FREE_THREADS", "4"))
+# Seconds between heartbeats; each heartbeat also re-reads the queue
+# state so updates made by other worker processes are picked up
+QUEUE_STREAM_HEARTBEAT = float(os.getenv("EV_QUEUE_STREAM_HEARTBEAT", "15"))
+
+# ===============================
+# STATION SEARCH
+# ===============================
+# Results per page for map filter search and natural language search
+SEARCH_PAGE_SIZE = int(os.getenv("EV_SEARCH_PAGE_SIZE", "50"))
+
+# ===============================
+# NATURAL LANGUAGE QUERY CACHE
+# ===============================
+# Parsed search filters per normalized query: LRU entries kept per
+# worker and how long a parse stays valid (seconds)
+NL_CACHE_SIZE = int(os.getenv("EV_NL_CACHE_SIZE", "1024"))
+NL_CACHE_TTL = float(os.getenv("EV_NL_CACHE_TTL", "86400"))
+# Also keep Gemini parses in the ai_cache table of ev.db, so they survive
+# restarts and are shared by every worker process
+NL_CACHE_PERSIST = os.getenv("EV_NL_CACHE_PERSIST", "1") == "1"
+
+# ===============================
+# RECOMMENDATION EXPLANATION CACHE
+# ===============================
+# Gemini explanations keyed by the top stations and bucketed inputs:
+# battery rounds down to BATTERY_BUCKET percent, distance up to
+# DISTANCE_BUCKET km
+EXPLANATION_CACHE_SIZE = int(os.getenv("EV_EXPLANATION_CACHE_SIZE", "512"))
+EXPLANATION_CACHE_TTL = float(os.getenv("EV_EXPLANATION_CACHE_TTL", "21600"))
+EXPLANATION_CACHE_PERSIST = os.getenv("EV_EXPLANATION_CACHE_PERSIST", "1") == "1"
+EXPLANATION_BATTERY_BUCKET = int(os.getenv("EV_EXPLANATION_BATTERY_BUCKET", "5"))
+EXPLANATION_DISTANCE_BUCKET = int(os.getenv("EV_EXPLANATION_DISTANCE_BUCKET", "5"))
+
+# ===============================
+# GEMINI CLIENT (ai/client.py)
+# ===============================
+AI_MODEL = os.getenv("EV_AI_MODEL", "models/gemini-2.0-flash")
+# Seconds a request waits for a Gemini answer before using its fallback
+AI_TIMEOUT = float(os.getenv("EV_AI_TIMEOUT", "10"))
+# Concurrent Gemini calls per worker process, and how long (seconds) a
+# request waits for a free call slot before using its fallback
+AI_MAX_CONCURRENT = int(os.getenv("EV_AI_MAX_CONCURRENT", "4"))
+AI_QUEUE_TIMEOUT = float(os.getenv("EV_AI_QUEUE_TIMEOUT", "0.5"))
+
+# ===============================
+# DEMAND FORECAST (ai/forecast.py)
+# ===============================
+# Days of hourly history the forecast model is fitted on
+FORECAST_HISTORY_DAYS = int(os.getenv("EV_FORECAST_HISTORY_DAYS", "56"))
+# Seconds before the stored fit is stale and refitted, by
+# `flask fit-demand-model` from cron or in a background thread
+FORECAST_REFRESH_SECONDS = float(os.getenv("EV_FORECAST_REFRESH_SECONDS", "3600"))
+# Seconds between a worker's checks for a newer stored fit
+FORECAST_RELOAD_SECONDS = float(os.getenv("EV_FORECAST_RELOAD_SECONDS", "60"))
+# Refit a missing or stale model in a background thread of the app
+# (0 when the cron job is the only one fitting)
+FORECAST_FIT_IN_BACKGROUND = os.getenv("EV_FORECAST_FIT_IN_BACKGROUND", "1") == "1"
+
+# ===============================
+# STATION ANALYTICS SNAPSHOTS (ai/batch_analytics.py)
+# ===============================
+# Seconds a snapshot written by `flask analytics-snapshot` is served to
+# the station analytics page before it falls back to computing live
+ANALYTICS_SNAPSHOT_MAX_AGE = float(os.getenv("EV_ANALYTICS_SNAPSHOT_MAX_AGE", "3600"))
@@ -0,0 +1,14 @@
+"""
+gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+Queue-status streams (SSE) hold a worker thread for as long as the page
+is open, so workers run threaded. The stream cap per worker is derived
+from the same settings (see models.queue_events.stream_capacity).
+"""
+import os
+import config
+
+bind = os.getenv("EV_BIND", "0.0.0.0:5000")
+workers = config.WORKERS
+worker_class = config.WORKER_CLASS
+threads = config.WORKER_THREADS
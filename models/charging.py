@@ -0,0 +1,193 @@
+"""
+Charger admission and waiting-queue operations.
+
+Functions taking a connection run their own BEGIN IMMEDIATE transaction,
+so the "is a charger free?" check and the write that depends on it cannot
+interleave with another request's, and update the occupancy registry once
+committed. Functions taking a cursor run inside the caller's transaction;
+the caller updates the registry after its commit.
+"""
+from models.db import retry_on_busy
+from models.occupancy import registry
+
+
+def get_station_occupancy(conn, station_name):
+    """
+    (station_id, chargers, active_sessions) for a station name, or None if
+    the station does not exist. Served from the in-memory registry, so the
+    counts can lag behind other workers: use them to pick a page, and
+    leave admission and queueing to the SQL checks below.
+    """
+    return registry.lookup(conn, station_name)
+
+
+def queue_position(cur, station_id, user_id):
+    """
+    1-based queue position of the user at the station, or None if they are
+    not queued. seq - head_seq: two index lookups, independent of queue
+    length.
+    """
+    cur.execute("""
+        SELECT w.seq - h.head_seq
+        FROM waiting_queue w
+        JOIN queue_heads h ON h.station_id = w.station_id
+        WHERE w.station_id=? AND w.user_id=?
+        ORDER BY w.seq
+        LIMIT 1
+    """, (station_id, user_id))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def queue_snapshot(cur, station_id, user_id=None):
+    """
+    Everything needed to derive queue status for a station in one query:
+    charger count, active sessions, the served-up-to head and (when a
+    user is given) that user's sequence number, or None if not queued.
+    """
+    cur.execute("""
+        SELECT s.chargers,
+               (SELECT COUNT(*) FROM charging_sessions cs
+                WHERE cs.station_id = s.id AND cs.status = 'Active'),
+               COALESCE(h.head_seq, 0),
+               (SELECT w.seq FROM waiting_queue w
+                WHERE w.station_id = s.id AND w.user_id = ?
+                ORDER BY w.seq LIMIT 1)
+        FROM stations s
+        LEFT JOIN queue_heads h ON h.station_id = s.id
+        WHERE s.id = ?
+    """, (user_id, station_id))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "total_chargers": row[0],
+        "active_sessions": row[1],
+        "head_seq": row[2],
+        "seq": row[3],
+    }
+
+
+def _enqueue(cur, station_id, station_name, user_id):
+    """(position, added) - added is False if the user was already queued"""
+    position = queue_position(cur, station_id, user_id)
+    if position is not None:
+        # Prevent duplicate queue entry
+        return position, False
+
+    # Take the next sequence number for this station
+    cur.execute("INSERT OR IGNORE INTO queue_heads (station_id) VALUES (?)", (station_id,))
+    cur.execute("UPDATE queue_heads SET next_seq = next_seq + 1 WHERE station_id=?", (station_id,))
+    cur.execute("""
+        INSERT INTO waiting_queue (station_id, station_name, user_id, seq)
+        VALUES (?, ?, ?, (SELECT next_seq FROM queue_heads WHERE station_id=?))
+    """, (station_id, station_name, user_id, station_id))
+    return queue_position(cur, station_id, user_id), True
+
+
+def dequeue_next(cur, station_id):
+    """
+    Remove the first user from the station's queue (FIFO) and advance the
+    served-up-to head. Runs inside the caller's write transaction so the
+    head moves atomically with the session update that freed the charger.
+    Returns the removed user's id, or None if the queue was empty.
+    """
+    cur.execute("""
+        SELECT id, user_id, seq FROM waiting_queue
+        WHERE station_id=?
+        ORDER BY seq
+        LIMIT 1
+    """, (station_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    entry_id, user_id, seq = row
+    cur.execute("DELETE FROM waiting_queue WHERE id=?", (entry_id,))
+    cur.execute("UPDATE queue_heads SET head_seq=? WHERE station_id=?", (seq, station_id))
+    return user_id
+
+
+def join_queue(conn, station_id, station_name, user_id):
+    """
+    Add the user to the station's queue (once) and return their position.
+    Returns None instead when a charger is actually free: the caller's
+    full-station check comes from the registry, which may lag behind
+    other workers, so it is repeated here in SQL.
+    """
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM charging_sessions
+                    WHERE station_id=? AND status='Active')
+                   < (SELECT chargers FROM stations WHERE id=?)
+        """, (station_id, station_id))
+        if cur.fetchone()[0]:
+            conn.commit()
+            return None
+        position, added = _enqueue(cur, station_id, station_name, user_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if added:
+        registry.queue_joined(station_id)
+    return position
+
+
+def admit_or_enqueue(conn, station_id, station_name, user_id, units, amount):
+    """
+    Atomically start an Active session if the station has a free charger,
+    otherwise queue the user.
+
+    The session INSERT is guarded by the active-session count inside the
+    same IMMEDIATE transaction, so concurrent requests for the last free
+    charger cannot both be admitted. The session starts unpaid: the
+    caller pays only once a charger is claimed and records it with
+    attach_payment(), so a queued request is never charged.
+
+    Returns ("charging", session_id) or ("queued", queue_position).
+    """
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("""
+            INSERT INTO charging_sessions
+            (user_id, station_id, station_name, units, amount, status)
+            SELECT ?, ?, ?, ?, ?, 'Active'
+            WHERE (SELECT COUNT(*) FROM charging_sessions
+                   WHERE station_id=? AND status='Active')
+                  < (SELECT chargers FROM stations WHERE id=?)
+        """, (user_id, station_id, station_name, units, amount,
+              station_id, station_id))
+
+        added = False
+        if cur.rowcount:
+            result = ("charging", cur.lastrowid)
+        else:
+            position, added = _enqueue(cur, station_id, station_name, user_id)
+            result = ("queued", position)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if result[0] == "charging":
+        registry.session_started(station_id)
+    elif added:
+        registry.queue_joined(station_id)
+    return result
+
+
+@retry_on_busy
+def attach_payment(conn, session_id, tx_hash):
+    """
+    Record the payment of a session started by admit_or_enqueue(). Retried
+    on its own on SQLITE_BUSY, so a busy database never repeats the payment.
+    """
+    cur = conn.cursor()
+    cur.execute("UPDATE charging_sessions SET tx_hash=? WHERE id=?", (tx_hash, session_id))
+    conn.commit()
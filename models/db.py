@@ -1,113 +1,282 @@
 import sqlite3
 import os
+import queue
+import random
+import threading
+import time
+from functools import wraps
+from flask import g, has_app_context
+import config
+from models.station import haversine_km
 
 # Ensure database folder exists
-os.makedirs("database", exist_ok=True)
+os.makedirs(os.path.dirname(config.DB_PATH) or ".", exist_ok=True)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared by all threads of a worker.
+    Connections are opened lazily, handed out LIFO (the most recently used
+    connection has the warmest page cache) and rolled back on release.
+    """
+
+    def __init__(self, path, size=8, timeout=10.0, pragmas=None, count_queries=False):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self.count_queries = count_queries
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._created = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._queries = 0
+
+    def _count_query(self, statement):
+        with self._lock:
+            self._queries += 1
+
+    def _connect(self):
+        # Connections move between threads, but only one thread uses a
+        # connection at a time (it is checked out), so this is safe
+        busy_timeout = self.pragmas.get("busy_timeout", 5000) / 1000
+        conn = sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False)
+        # PRAGMAs are per connection, so they are paid once per pooled
+        # connection rather than once per query
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        # Used by the distance filter/sort of models/station.py
+        conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+        if self.count_queries:
+            conn.set_trace_callback(self._count_query)
+        return conn
+
+    def _reset_after_fork(self):
+        # Connections must never be shared with a forked worker process
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._pid = os.getpid()
+
+    def acquire(self, timeout=None):
+        """Check out a connection, opening one if the pool is not yet full"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+            conn = None
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self._created < self.size:
+                    self._created += 1
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        self._created -= 1
+                        raise
+
+            if conn is not None:
+                self._checked_out()
+                return conn
+            self._waits += 1
+
+        try:
+            conn = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(
+                f"No database connection available within {self.timeout if timeout is None else timeout}s "
+                f"(pool size {self.size})"
+            )
+
+        with self._lock:
+            self._checked_out()
+        return conn
+
+    def _checked_out(self):
+        self._checkouts += 1
+        self._in_use += 1
+        self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it so a fresh one is opened next time
+            with self._lock:
+                self._created -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+
+        self._idle.put(conn)
+
+    def stats(self):
+        """Snapshot of pool counters"""
+        with self._lock:
+            return {
+                "path": self.path,
+                "pragmas": dict(self.pragmas),
+                "size": self.size,
+                "timeout": self.timeout,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "queries": self._queries if self.count_queries else None,
+            }
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in scripts)"""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._created -= 1
+                conn.close()
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection. Existing code keeps
+    calling conn.close(); instead of closing the file handle this rolls back
+    anything uncommitted and hands the connection back to the pool.
+    Inside a Flask app context the connection is shared by every get_db()
+    call of the request and only returned to the pool on teardown.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._request_scoped:
+            # Same semantics as sqlite3 close(): uncommitted work is discarded
+            if self._conn.in_transaction:
+                self._conn.rollback()
+        else:
+            self._pool.release(self._conn)
+        self._conn = None
+
+
+_pool = ConnectionPool(
+    config.DB_PATH, config.DB_POOL_SIZE, config.DB_POOL_TIMEOUT, config.DB_PRAGMAS,
+    config.DB_COUNT_QUERIES
+)
+
 
 def get_db():
-    # One single DB path used everywhere
-    return sqlite3.connect("database/ev.db")
+    """
+    Get a database connection from the pool.
+    Within a request every call reuses the same connection.
+    """
+    if has_app_context():
+        if "db_conn" not in g:
+            g.db_conn = _pool.acquire()
+        return PooledConnection(_pool, g.db_conn, request_scoped=True)
+    return PooledConnection(_pool, _pool.acquire())
+
+
+def close_db(exception=None):
+    """Return the request's connection to the pool (app context teardown)"""
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        _pool.release(conn)
+
+
+def get_pool_stats():
+    stats = _pool.stats()
+    stats["profile"] = config.DB_PROFILE
+    return stats
+
+
+def is_busy_error(exc):
+    """True for SQLITE_BUSY / SQLITE_LOCKED surfaced by the sqlite3 module"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    message = str(exc).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(func=None, retries=None, backoff=None):
+    """
+    Retry a write path when SQLite reports the database as locked.
+    busy_timeout already makes SQLite wait for the write lock; this covers
+    the cases where it gives up immediately (a deferred read transaction
+    that later needs to write in WAL mode). Uncommitted work on the
+    request connection is rolled back before each retry, and waits grow
+    exponentially with jitter so competing writers spread out.
+    """
+    if func is None:
+        return lambda f: retry_on_busy(f, retries, backoff)
+
+    max_retries = config.DB_BUSY_RETRIES if retries is None else retries
+    base_delay = config.DB_BUSY_BACKOFF if backoff is None else backoff
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt >= max_retries:
+                    raise
+                if has_app_context() and "db_conn" in g and g.db_conn.in_transaction:
+                    g.db_conn.rollback()
+                time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+
+    return wrapper
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
 
 def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # ===============================
-    # ADMIN TABLE
-    # ===============================
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS admin (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT,
-        password TEXT
-    )
-    """)
-
-    # ===============================
-    # USERS TABLE (EV USERS + OWNERS)
-    # ===============================
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT UNIQUE,
-        password TEXT,
-        role TEXT,
-        blacklisted INTEGER DEFAULT 0
-    )
-    """)
-
-    # ===============================
-    # CHARGING STATIONS TABLE
-    # ===============================
-    cur.execute("""
-CREATE TABLE IF NOT EXISTS stations (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    location TEXT,
-    chargers INTEGER,
-    price REAL,
-    green_score INTEGER,
-    owner_id INTEGER,
-    approved INTEGER DEFAULT 0
-)
-""")
-
-
-    # ===============================
-    # CHARGING SESSIONS TABLE
-    # ===============================
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS charging_sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        station_name TEXT,
-        units REAL,
-        amount REAL,
-        tx_hash TEXT,
-        status TEXT,
-        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        completed_at TIMESTAMP,
-        duration_minutes INTEGER
-    )
-    """)
-
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS waiting_queue (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        station_name TEXT,
-        user_id INTEGER,
-        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    conn.commit()
-    # Insert some sample users for testing (non-destructive)
-    try:
-        cur.execute("INSERT OR IGNORE INTO users (name, email, password, role) VALUES (?, ?, ?, ?)",
-                    ("Jane Hopper", "jane.hopper@example.com", "jane123", "user"))
-        cur.execute("INSERT OR IGNORE INTO users (name, email, password, role) VALUES (?, ?, ?, ?)",
-                    ("Michael Wheeler", "michael.wheeler@example.com", "mike123", "user"))
-    except Exception:
-        pass
-
-    conn.commit()
-    conn.close()
-
-    # Ensure 'blacklisted' column exists for older DBs
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(users)")
-        cols = [c[1] for c in cur.fetchall()]
-        if 'blacklisted' not in cols:
-            cur.execute("ALTER TABLE users ADD COLUMN blacklisted INTEGER DEFAULT 0")
-            conn.commit()
-    except Exception:
-        pass
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+    """
+    Bring the schema up to date. A single version check when nothing is
+    pending; see models/migrations.py for the migration list.
+    """
+    from models.migrations import migrate
+    migrate()
@@ -0,0 +1,140 @@
+"""
+station_hourly_stats: sessions, units, revenue and charging time per
+station per hour, so analytics read at most one row per hour of their
+window instead of every session in it.
+
+Rows are keyed by the UTC hour the session started ("YYYY-MM-DD HH:00:00")
+and always equal the same GROUP BY over charging_sessions. SQLite triggers
+(migration 11) apply every session insert, completion, cancellation and
+delete in the writer's own transaction, so there is no write path to
+forget. backfill() rebuilds rows from charging_sessions: migration 12 runs
+it once for the existing history and `flask backfill-hourly-stats` reruns
+it (or only checks it) on demand.
+"""
+import logging
+import time
+from models.db import get_db
+
+logger = logging.getLogger(__name__)
+
+_ROLLUP_SQL = """
+    SELECT substr(started_at, 1, 13) || ':00:00' AS hour, COUNT(*),
+           COALESCE(SUM(units), 0), COALESCE(SUM(amount), 0),
+           COUNT(duration_minutes), COALESCE(SUM(duration_minutes), 0)
+    FROM charging_sessions
+    WHERE station_id = ? AND started_at IS NOT NULL
+    GROUP BY hour
+"""
+
+_REBUILD_SQL = """
+    INSERT INTO station_hourly_stats
+        (hour, sessions, units, revenue, duration_sessions, total_duration, station_id)
+    SELECT *, ? FROM (""" + _ROLLUP_SQL + ")"
+
+
+def _station_ids(cur):
+    """Stations with sessions or rollup rows (stale rows get cleared too)"""
+    cur.execute("""
+        SELECT DISTINCT station_id FROM charging_sessions WHERE station_id IS NOT NULL
+        UNION
+        SELECT DISTINCT station_id FROM station_hourly_stats
+    """)
+    return [r[0] for r in cur.fetchall()]
+
+
+def rebuild_station(conn, station_id):
+    """
+    Replace one station's rows with a fresh rollup. BEGIN IMMEDIATE holds
+    off session writes (and their triggers) until the rows are in place.
+    Returns the number of hours written.
+    """
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("DELETE FROM station_hourly_stats WHERE station_id=?", (station_id,))
+        cur.execute(_REBUILD_SQL, (station_id, station_id))
+        hours = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return hours
+
+
+def backfill(conn, station_ids=None, pause=0.01):
+    """
+    Rebuild the rollup for the given stations (default: all), one
+    committed station at a time so live requests can write in between.
+    Safe to rerun. Returns (stations, hours).
+    """
+    station_ids = _station_ids(conn.cursor()) if station_ids is None else station_ids
+    hours = 0
+    for station_id in station_ids:
+        hours += rebuild_station(conn, station_id)
+        time.sleep(pause)
+    logger.info(f"Hourly stats backfilled: {len(station_ids)} stations, {hours} hours")
+    return len(station_ids), hours
+
+
+def check(conn, station_ids=None):
+    """
+    Compare the rollup with charging_sessions without changing it. Returns
+    a list of {station_id, hour, rollup, sessions} for every hour that
+    differs (all-zero rows left by deletes count as absent).
+    """
+    cur = conn.cursor()
+    station_ids = _station_ids(cur) if station_ids is None else station_ids
+    drift = []
+    for station_id in station_ids:
+        cur.execute(_ROLLUP_SQL, (station_id,))
+        expected = {row[0]: row[1:] for row in cur.fetchall()}
+        cur.execute("""
+            SELECT hour, sessions, units, revenue, duration_sessions, total_duration
+            FROM station_hourly_stats
+            WHERE station_id = ? AND sessions != 0
+        """, (station_id,))
+        found = {row[0]: row[1:] for row in cur.fetchall()}
+        for hour in sorted(expected.keys() | found.keys()):
+            want, got = expected.get(hour), found.get(hour)
+            # units/revenue are float sums built up in a different order
+            if want is None or got is None or any(abs(a - b) > 1e-6 for a, b in zip(want, got)):
+                drift.append({"station_id": station_id, "hour": hour, "rollup": got, "sessions": want})
+    return drift
+
+
+def init_app(app):
+    """Register the `flask backfill-hourly-stats` command"""
+    import click
+
+    @app.cli.command("backfill-hourly-stats")
+    @click.option("--station", "station_name", default=None, help="Only this station (by name)")
+    @click.option("--check", "check_only", is_flag=True, help="Only compare; exit 1 on drift")
+    def backfill_hourly_stats(station_name, check_only):
+        """Rebuild station_hourly_stats from charging_sessions"""
+        import sys
+        conn = get_db()
+        try:
+            station_ids = None
+            if station_name:
+                cur = conn.cursor()
+                cur.execute("SELECT id FROM stations WHERE name = ? ORDER BY id", (station_name,))
+                station_ids = [r[0] for r in cur.fetchall()]
+                if not station_ids:
+                    print(f"✗ No station named {station_name!r}")
+                    sys.exit(1)
+
+            if check_only:
+                drift = check(conn, station_ids)
+                for d in drift[:50]:
+                    print(f"✗ station {d['station_id']} {d['hour']}: rollup={d['rollup']} sessions={d['sessions']}")
+                if drift:
+                    print(f"{len(drift)} hours differ; run `flask backfill-hourly-stats` to rebuild them")
+                    sys.exit(1)
+                print("✓ Hourly stats match charging_sessions")
+                return
+
+            start = time.perf_counter()
+            stations, hours = backfill(conn, station_ids)
+            print(f"✓ Rebuilt {hours} hours for {stations} stations in {time.perf_counter() - start:.1f} s")
+        finally:
+            conn.close()
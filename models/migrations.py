@@ -0,0 +1,545 @@
+"""
+Versioned, up-only schema migrations for ev.db.
+
+Each migration runs once, in order, and its version is recorded in the
+schema_version table in the same transaction as its DDL. When the schema
+is current, startup costs a single SELECT. When it is not, a file lock
+makes sure only one worker process applies the pending migrations while
+the others wait and then find nothing left to do.
+
+To change the schema, append a new entry to MIGRATIONS - never edit one
+that has already shipped.
+"""
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+import config
+from models.db import get_db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = config.DB_PATH + ".migrate.lock"
+
+
+# ===============================
+# HELPERS
+# ===============================
+def _columns(cur, table):
+    cur.execute(f"PRAGMA table_info({table})")
+    return [c[1] for c in cur.fetchall()]
+
+
+def _add_column_if_missing(cur, table, column, declaration):
+    # Databases created before schema_version existed may already have it
+    if column not in _columns(cur, table):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+# ===============================
+# MIGRATIONS
+# ===============================
+def _m001_base_tables(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS admin (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT,
+        password TEXT
+    )
+    """)
+
+    # EV users + owners
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        email TEXT UNIQUE,
+        password TEXT,
+        role TEXT,
+        blacklisted INTEGER DEFAULT 0
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        location TEXT,
+        chargers INTEGER,
+        price REAL,
+        green_score INTEGER,
+        owner_id INTEGER,
+        approved INTEGER DEFAULT 0
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS charging_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        station_id INTEGER REFERENCES stations(id),
+        station_name TEXT,
+        units REAL,
+        amount REAL,
+        tx_hash TEXT,
+        status TEXT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        duration_minutes INTEGER
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS waiting_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_id INTEGER REFERENCES stations(id),
+        station_name TEXT,
+        user_id INTEGER,
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _m002_users_blacklisted(cur):
+    _add_column_if_missing(cur, "users", "blacklisted", "INTEGER DEFAULT 0")
+
+
+def _m003_station_id_columns(cur):
+    for table in ("charging_sessions", "waiting_queue"):
+        _add_column_if_missing(cur, table, "station_id", "INTEGER REFERENCES stations(id)")
+
+
+def _m004_backfill_station_ids(conn, batch_size=500, pause=0.01):
+    """
+    Fill station_id on rows written before the column existed, matching on
+    the old free-text station_name. Runs in small committed batches so live
+    requests can take the write lock between batches; safe to resume.
+    Duplicate station names resolve to the oldest station; rows whose name
+    matches no station are left NULL.
+    """
+    cur = conn.cursor()
+    for table in ("charging_sessions", "waiting_queue"):
+        while True:
+            cur.execute(f"""
+                UPDATE {table}
+                SET station_id = (
+                    SELECT MIN(s.id) FROM stations s
+                    WHERE s.name = {table}.station_name
+                )
+                WHERE id IN (
+                    SELECT t.id FROM {table} t
+                    WHERE t.station_id IS NULL
+                      AND EXISTS (SELECT 1 FROM stations s WHERE s.name = t.station_name)
+                    LIMIT ?
+                )
+            """, (batch_size,))
+            count = cur.rowcount
+            conn.commit()
+            if count < batch_size:
+                break
+            time.sleep(pause)
+
+
+# Secondary indexes for the hot query paths:
+# active-charger counts per station, per-user history/insights,
+# time-windowed station analytics, FIFO queue order per station, the
+# station name lookup done once per request and owner dashboards.
+# scripts/check_query_plans.py fails if a hot query stops using them.
+INDEXES = [
+    ("idx_sessions_station_id_status", "charging_sessions", "station_id, status"),
+    ("idx_sessions_station_id_started", "charging_sessions", "station_id, started_at"),
+    ("idx_sessions_user_status_started", "charging_sessions", "user_id, status, started_at"),
+    ("idx_queue_station_id_joined", "waiting_queue", "station_id, joined_at"),
+    ("idx_stations_name", "stations", "name"),
+    ("idx_stations_owner", "stations", "owner_id"),
+]
+
+# Earlier station_name indexes superseded by the station_id versions
+RETIRED_INDEXES = [
+    "idx_sessions_station_status",
+    "idx_sessions_station_started",
+    "idx_queue_station_joined",
+]
+
+
+def _m005_secondary_indexes(cur):
+    for name in RETIRED_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, table, columns in INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _m006_seed_accounts(cur):
+    # Default admin (previously created by app.py on every import)
+    cur.execute("SELECT 1 FROM admin LIMIT 1")
+    if not cur.fetchone():
+        cur.execute(
+            "INSERT INTO admin (username, password) VALUES (?, ?)",
+            ("admin", "admin123")
+        )
+
+    # Sample users for testing (non-destructive)
+    cur.execute("INSERT OR IGNORE INTO users (name, email, password, role) VALUES (?, ?, ?, ?)",
+                ("Jane Hopper", "jane.hopper@example.com", "jane123", "user"))
+    cur.execute("INSERT OR IGNORE INTO users (name, email, password, role) VALUES (?, ?, ?, ?)",
+                ("Michael Wheeler", "michael.wheeler@example.com", "mike123", "user"))
+
+
+def _m007_queue_sequence(cur):
+    """
+    Per-station monotonic queue numbers: each entry gets seq from
+    queue_heads.next_seq, and queue_heads.head_seq records the last entry
+    served, so a position is seq - head_seq (an index lookup) instead of
+    counting everyone who joined earlier.
+    """
+    _add_column_if_missing(cur, "waiting_queue", "seq", "INTEGER")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS queue_heads (
+        station_id INTEGER PRIMARY KEY REFERENCES stations(id),
+        next_seq INTEGER NOT NULL DEFAULT 0,
+        head_seq INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # Number existing entries in their current FIFO order
+    cur.execute("""
+        SELECT id, station_id FROM waiting_queue
+        WHERE station_id IS NOT NULL
+        ORDER BY station_id, joined_at, id
+    """)
+    next_seq = {}
+    updates = []
+    for entry_id, station_id in cur.fetchall():
+        next_seq[station_id] = next_seq.get(station_id, 0) + 1
+        updates.append((next_seq[station_id], entry_id))
+    cur.executemany("UPDATE waiting_queue SET seq=? WHERE id=?", updates)
+    cur.executemany(
+        "INSERT OR REPLACE INTO queue_heads (station_id, next_seq, head_seq) VALUES (?, ?, 0)",
+        list(next_seq.items())
+    )
+
+    cur.execute("DROP INDEX IF EXISTS idx_queue_station_id_joined")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_queue_station_seq ON waiting_queue (station_id, seq)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_station_user ON waiting_queue (station_id, user_id)")
+
+
+# Coordinates for stations created before stations.lat/lng existed: the
+# eight formerly hardcoded in ai/map_utils.py plus the demo stations
+# from seed_demo_data.py. Stations not listed stay NULL until an owner
+# or admin sets them.
+KNOWN_COORDINATES = {
+    "Central Hub": (28.6139, 77.2090),
+    "Downtown Station": (19.0760, 72.8777),
+    "Tech Park Charger": (12.9716, 77.5946),
+    "Airport Plaza": (28.5921, 77.1385),
+    "Highway Rest Point": (28.4595, 77.0266),
+    "Shopping Mall Charging": (18.9220, 72.8347),
+    "Business District": (13.0827, 80.2707),
+    "Metro Station Hub": (28.7041, 77.1025),
+    "ChargeFast Delhi": (28.5921, 77.0460),
+    "EcoPower Station": (28.6315, 77.2167),
+    "GreenCharge Hub": (28.5562, 77.1180),
+    "PowerPoint Delhi": (28.5245, 77.0930),
+    "ChargeFast Mumbai": (19.0596, 72.8295),
+    "EcoPower Mumbai": (19.1176, 72.9060),
+    "GreenHub BKC": (19.0674, 72.8681),
+    "RapidCharge Mumbai": (19.0990, 72.8479),
+    "ChargeFast Bangalore": (12.9698, 77.7500),
+    "EcoPower Bangalore": (12.9352, 77.6245),
+    "GreenCharge Tech Park": (12.9857, 77.7366),
+    "ChargeFast Chennai": (13.0418, 80.2341),
+    "EcoPower Chennai": (13.0067, 80.2206),
+    "GreenHub OMR": (12.9121, 80.2275),
+}
+
+
+def _m008_station_coordinates(cur):
+    _add_column_if_missing(cur, "stations", "lat", "REAL")
+    _add_column_if_missing(cur, "stations", "lng", "REAL")
+    cur.executemany(
+        "UPDATE stations SET lat=?, lng=? WHERE name=? AND lat IS NULL",
+        [(lat, lng, name) for name, (lat, lng) in KNOWN_COORDINATES.items()]
+    )
+
+
+# Station search (models/station.py): range filters and sorts on
+# approved stations, and the latitude band of the distance prefilter.
+# The green/price indexes carry every filter column, so filters and
+# COUNT(*) are checked on the index before any table row is read.
+STATION_SEARCH_INDEXES = [
+    ("idx_stations_approved_green", "stations", "approved, green_score, price, chargers"),
+    ("idx_stations_approved_price", "stations", "approved, price, green_score, chargers"),
+    ("idx_stations_approved_lat", "stations", "approved, lat"),
+]
+
+
+def _m009_station_search_indexes(cur):
+    for name, table, columns in STATION_SEARCH_INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _m010_ai_cache(cur):
+    """Persistent entries of the ai/cache.py LRU caches, shared by workers"""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ai_cache (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )
+    """)
+
+
+# Rollup key: the UTC hour a session started, "YYYY-MM-DD HH:00:00"
+_HOUR_KEY = "substr({row}.started_at, 1, 13) || ':00:00'"
+
+_ROLLUP_ADD = """
+    INSERT INTO station_hourly_stats
+        (station_id, hour, sessions, units, revenue, duration_sessions, total_duration)
+    SELECT NEW.station_id, {hour}, 1, COALESCE(NEW.units, 0), COALESCE(NEW.amount, 0),
+           NEW.duration_minutes IS NOT NULL, COALESCE(NEW.duration_minutes, 0)
+    WHERE NEW.station_id IS NOT NULL AND NEW.started_at IS NOT NULL
+    ON CONFLICT (station_id, hour) DO UPDATE SET
+        sessions = sessions + excluded.sessions,
+        units = units + excluded.units,
+        revenue = revenue + excluded.revenue,
+        duration_sessions = duration_sessions + excluded.duration_sessions,
+        total_duration = total_duration + excluded.total_duration;
+""".format(hour=_HOUR_KEY.format(row="NEW"))
+
+_ROLLUP_SUBTRACT = """
+    UPDATE station_hourly_stats SET
+        sessions = sessions - 1,
+        units = units - COALESCE(OLD.units, 0),
+        revenue = revenue - COALESCE(OLD.amount, 0),
+        duration_sessions = duration_sessions - (OLD.duration_minutes IS NOT NULL),
+        total_duration = total_duration - COALESCE(OLD.duration_minutes, 0)
+    WHERE station_id = OLD.station_id AND hour = {hour};
+""".format(hour=_HOUR_KEY.format(row="OLD"))
+
+
+def _m011_station_hourly_stats(cur):
+    """
+    Per-station, per-hour session rollup read by ai/analytics.py. Triggers
+    keep it equal to the same GROUP BY over charging_sessions on every
+    insert, update of a counted column and delete, inside the writer's
+    own transaction. History is filled in by migration 12.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS station_hourly_stats (
+        station_id INTEGER NOT NULL,
+        hour TEXT NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        units REAL NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        duration_sessions INTEGER NOT NULL DEFAULT 0,
+        total_duration INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (station_id, hour)
+    ) WITHOUT ROWID
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_hourly_insert
+    AFTER INSERT ON charging_sessions
+    BEGIN {_ROLLUP_ADD} END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_hourly_update
+    AFTER UPDATE OF station_id, started_at, units, amount, duration_minutes ON charging_sessions
+    BEGIN {_ROLLUP_SUBTRACT} {_ROLLUP_ADD} END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_hourly_delete
+    AFTER DELETE ON charging_sessions
+    BEGIN {_ROLLUP_SUBTRACT} END
+    """)
+
+
+def _m012_backfill_hourly_stats(conn):
+    """Roll up the sessions written before migration 11, one station per batch"""
+    from models.hourly_stats import backfill
+    backfill(conn)
+
+
+def _m013_analytics_snapshot(cur):
+    """Per-station analytics summaries written by ai/batch_analytics.py"""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS station_analytics_snapshot (
+        station_id INTEGER PRIMARY KEY,
+        station_name TEXT,
+        computed_at REAL NOT NULL,
+        report TEXT NOT NULL
+    )
+    """)
+
+
+def _m014_demand_model(cur):
+    """Fitted demand forecast parameters stored by ai/forecast.py (one row)"""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS demand_model (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        fitted_at REAL NOT NULL,
+        last_day TEXT NOT NULL,
+        history_days INTEGER NOT NULL,
+        fit_ms REAL NOT NULL,
+        params BLOB NOT NULL
+    )
+    """)
+
+
+def _m015_stations_version(cur):
+    """
+    Change counters read by in-memory caches (ai/map_tiles.py) to notice
+    other workers' writes. Triggers bump "stations" whenever a station is
+    added, removed or changes a column the caches hold.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('stations', 0)")
+    bump = "UPDATE data_versions SET version = version + 1 WHERE name = 'stations';"
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stations_version_insert
+    AFTER INSERT ON stations
+    BEGIN {bump} END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stations_version_update
+    AFTER UPDATE OF name, location, chargers, price, green_score, approved, lat, lng ON stations
+    BEGIN {bump} END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stations_version_delete
+    AFTER DELETE ON stations
+    BEGIN {bump} END
+    """)
+
+
+# (version, name, function, transactional)
+# Transactional migrations get a cursor and run inside BEGIN IMMEDIATE
+# together with their schema_version row. Non-transactional ones (long
+# batched backfills) get the connection, must commit their own batches
+# and must be safe to re-run if interrupted.
+MIGRATIONS = [
+    (1, "base tables", _m001_base_tables, True),
+    (2, "users.blacklisted column", _m002_users_blacklisted, True),
+    (3, "station_id columns", _m003_station_id_columns, True),
+    (4, "backfill station_id", _m004_backfill_station_ids, False),
+    (5, "secondary indexes", _m005_secondary_indexes, True),
+    (6, "seed admin and sample users", _m006_seed_accounts, True),
+    (7, "queue sequence numbers", _m007_queue_sequence, True),
+    (8, "station coordinates", _m008_station_coordinates, True),
+    (9, "station search indexes", _m009_station_search_indexes, True),
+    (10, "ai cache table", _m010_ai_cache, True),
+    (11, "station hourly stats rollup", _m011_station_hourly_stats, True),
+    (12, "backfill station hourly stats", _m012_backfill_hourly_stats, False),
+    (13, "station analytics snapshot", _m013_analytics_snapshot, True),
+    (14, "demand model parameters", _m014_demand_model, True),
+    (15, "stations change counter", _m015_stations_version, True),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ===============================
+# RUNNER
+# ===============================
+@contextmanager
+def _migration_lock():
+    """Cross-process exclusive lock so only one worker migrates at a time"""
+    with open(LOCK_PATH, "a+") as fh:
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def current_version(cur):
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+    except sqlite3.OperationalError:
+        return 0
+    return cur.fetchone()[0] or 0
+
+
+def migrate():
+    """
+    Apply pending migrations. Returns the list of versions applied by this
+    process (empty when the schema was already current).
+    """
+    conn = get_db()
+    try:
+        if current_version(conn.cursor()) >= LATEST_VERSION:
+            return []
+    finally:
+        conn.close()
+
+    applied = []
+    with _migration_lock():
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            conn.commit()
+
+            # Re-check under the lock: another worker may have just finished
+            version = current_version(cur)
+            for number, name, func, transactional in MIGRATIONS:
+                if number <= version:
+                    continue
+
+                logger.info(f"Applying migration {number}: {name}")
+                if transactional:
+                    cur.execute("BEGIN IMMEDIATE")
+                    try:
+                        func(cur)
+                        cur.execute(
+                            "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                            (number, name)
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        logger.error(f"Migration {number} ({name}) failed, rolled back")
+                        raise
+                else:
+                    func(conn)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                        (number, name)
+                    )
+                    conn.commit()
+                applied.append(number)
+        finally:
+            conn.close()
+
+    return applied
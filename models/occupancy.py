@@ -0,0 +1,273 @@
+"""
+In-memory station occupancy: chargers, active sessions and queue length
+per station, kept per worker process.
+
+Reads are dictionary lookups: the charge page's "is the station full?"
+check and the counts /api/queue-status returns. Writes go to SQLite first
+and the same change is applied here after the commit (write-through).
+SQLite stays the source of truth: the registry is rebuilt at startup, a
+station it has not seen yet is loaded on first use, and every
+OCCUPANCY_RECONCILE_SECONDS it is reconciled against SQL, which also
+picks up changes made by other worker processes.
+
+Counts written by another worker can therefore lag by up to one
+reconcile interval, so the registry only answers read-only questions.
+Every write is guarded in SQL inside models/charging.py's IMMEDIATE
+transactions: admit_or_enqueue's guarded INSERT never over-admits a
+station, and join_queue re-checks for a free charger, so a stale "full"
+count shows the charge form instead of queueing the user, and a stale
+can_charge only sends a waiting user to a charge form that re-checks.
+"""
+import logging
+import threading
+import time
+import config
+from models.db import get_db
+
+logger = logging.getLogger(__name__)
+
+_OCCUPANCY_SQL = """
+    SELECT s.id, s.name, s.chargers,
+           (SELECT COUNT(*) FROM charging_sessions cs
+            WHERE cs.station_id = s.id AND cs.status = 'Active'),
+           (SELECT COUNT(*) FROM waiting_queue w
+            WHERE w.station_id = s.id)
+    FROM stations s
+"""
+
+FIELDS = ("chargers", "active", "queued")
+
+
+class OccupancyRegistry:
+    """Thread-safe per-station counters with write-through updates"""
+
+    def __init__(self, reconcile_interval=60.0):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._stations = {}     # station_id -> [chargers, active, queued]
+        self._names = {}        # name -> oldest station_id with that name
+        self._generation = {}   # station_id -> write-through counter
+        self._last_reconcile = 0.0
+        self._hits = 0
+        self._misses = 0
+        self._corrections = 0
+
+    # ===============================
+    # LOADING / RECONCILIATION
+    # ===============================
+    def _load_all(self, conn):
+        cur = conn.cursor()
+        cur.execute(_OCCUPANCY_SQL + " ORDER BY s.id")
+        return cur.fetchall()
+
+    def _load_by_name(self, conn, station_name):
+        cur = conn.cursor()
+        cur.execute(_OCCUPANCY_SQL + " WHERE s.name = ? ORDER BY s.id LIMIT 1", (station_name,))
+        return cur.fetchone()
+
+    def _install(self, row):
+        station_id, name, chargers, active, queued = row
+        self._stations[station_id] = [chargers or 0, active, queued]
+        self._names.setdefault(name, station_id)
+
+    def rebuild(self, conn=None):
+        """Replace the registry with a fresh read of every station"""
+        own = conn is None
+        conn = conn or get_db()
+        try:
+            rows = self._load_all(conn)
+        finally:
+            if own:
+                conn.close()
+
+        with self._lock:
+            self._stations = {}
+            self._names = {}
+            for row in rows:
+                self._install(row)
+            self._last_reconcile = time.monotonic()
+        logger.info(f"Occupancy registry loaded {len(rows)} stations")
+
+    def check(self, conn=None):
+        """
+        Compare the registry with SQL without changing it. Returns a list
+        of {station_id, field, registry, database} for every mismatch.
+        """
+        own = conn is None
+        conn = conn or get_db()
+        try:
+            rows = self._load_all(conn)
+        finally:
+            if own:
+                conn.close()
+
+        drift = []
+        with self._lock:
+            for station_id, _name, chargers, active, queued in rows:
+                entry = self._stations.get(station_id)
+                if entry is None:
+                    continue
+                for field, cached, actual in zip(FIELDS, entry, (chargers or 0, active, queued)):
+                    if cached != actual:
+                        drift.append({
+                            "station_id": station_id,
+                            "field": field,
+                            "registry": cached,
+                            "database": actual,
+                        })
+        return drift
+
+    def reconcile(self, conn=None):
+        """
+        Overwrite the registry with SQL counts and return what drifted.
+        Stations written through while the SQL was being read are skipped
+        (their counts already include the newer change) and are picked up
+        on the next pass.
+        """
+        with self._lock:
+            generations = dict(self._generation)
+
+        own = conn is None
+        conn = conn or get_db()
+        try:
+            rows = self._load_all(conn)
+        finally:
+            if own:
+                conn.close()
+
+        drift = []
+        with self._lock:
+            for row in rows:
+                station_id = row[0]
+                if self._generation.get(station_id) != generations.get(station_id):
+                    continue
+                entry = self._stations.get(station_id)
+                actual = [row[2] or 0, row[3], row[4]]
+                if entry is not None and entry != actual:
+                    drift.append({"station_id": station_id, "registry": entry, "database": actual})
+                self._install(row)
+            self._corrections += len(drift)
+            self._last_reconcile = time.monotonic()
+
+        if drift:
+            logger.warning(f"Occupancy registry corrected {len(drift)} stations: {drift[:5]}")
+        return drift
+
+    def _maybe_reconcile(self, conn):
+        if time.monotonic() - self._last_reconcile < self.reconcile_interval:
+            return
+        # One request per process pays for the periodic reconcile
+        if not self._reconcile_lock.acquire(blocking=False):
+            return
+        try:
+            self.reconcile(conn)
+        except Exception as e:
+            logger.error(f"Occupancy reconcile failed: {e}")
+        finally:
+            self._reconcile_lock.release()
+
+    # ===============================
+    # READS
+    # ===============================
+    def lookup(self, conn, station_name):
+        """
+        (station_id, chargers, active_sessions) for a station name, or
+        None if it does not exist. Loads the station from SQL on a miss.
+        """
+        self._maybe_reconcile(conn)
+
+        with self._lock:
+            station_id = self._names.get(station_name)
+            entry = self._stations.get(station_id)
+            if entry is not None:
+                self._hits += 1
+                return station_id, entry[0], entry[1]
+            self._misses += 1
+
+        row = self._load_by_name(conn, station_name)
+        if not row:
+            return None
+        with self._lock:
+            self._install(row)
+        return row[0], row[2] or 0, row[3]
+
+    def get(self, station_id):
+        """{chargers, active, queued} for a loaded station, or None"""
+        with self._lock:
+            entry = self._stations.get(station_id)
+            return dict(zip(FIELDS, entry)) if entry else None
+
+    # ===============================
+    # WRITE-THROUGH (call after commit)
+    # ===============================
+    def _adjust(self, station_id, active=0, queued=0):
+        with self._lock:
+            entry = self._stations.get(station_id)
+            if entry is None:
+                # Not loaded yet: the next lookup reads it from SQL
+                return
+            entry[1] = max(entry[1] + active, 0)
+            entry[2] = max(entry[2] + queued, 0)
+            self._generation[station_id] = self._generation.get(station_id, 0) + 1
+
+    def session_started(self, station_id):
+        self._adjust(station_id, active=1)
+
+    def session_ended(self, station_id, dequeued=False):
+        """An Active session completed/stopped/cancelled"""
+        self._adjust(station_id, active=-1, queued=-1 if dequeued else 0)
+
+    def queue_joined(self, station_id):
+        self._adjust(station_id, queued=1)
+
+    def queue_left(self, station_id):
+        self._adjust(station_id, queued=-1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stations": len(self._stations),
+                "hits": self._hits,
+                "misses": self._misses,
+                "corrections": self._corrections,
+                "reconcile_interval": self.reconcile_interval,
+                "seconds_since_reconcile": round(time.monotonic() - self._last_reconcile, 1),
+            }
+
+
+registry = OccupancyRegistry(config.OCCUPANCY_RECONCILE_SECONDS)
+
+
+def init_app(app):
+    """Load the registry and register the `flask check-occupancy` command"""
+    registry.rebuild()
+
+    @app.cli.command("check-occupancy")
+    def check_occupancy():
+        """Check in-memory occupancy and its SQL invariants; exit 1 on drift"""
+        import sys
+        conn = get_db()
+        try:
+            drift = registry.check(conn)
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT s.id, s.name, s.chargers, COUNT(cs.id)
+                FROM stations s
+                JOIN charging_sessions cs ON cs.station_id = s.id AND cs.status = 'Active'
+                GROUP BY s.id
+                HAVING COUNT(cs.id) > s.chargers
+            """)
+            over_capacity = cur.fetchall()
+        finally:
+            conn.close()
+
+        for d in drift:
+            print(f"✗ station {d['station_id']} {d['field']}: registry={d['registry']} database={d['database']}")
+        for station_id, name, chargers, active in over_capacity:
+            print(f"✗ station {station_id} ({name}) has {active} active sessions for {chargers} chargers")
+
+        print(f"Registry: {registry.stats()}")
+        if drift or over_capacity:
+            sys.exit(1)
+        print("✓ Occupancy registry matches the database")
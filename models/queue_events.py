@@ -0,0 +1,198 @@
+"""
+Push updates for waiting-queue status over Server-Sent Events.
+
+Routes that change a station's queue state (dequeue, completion,
+cancellation, admission) call notify_queue_change() after committing.
+That reads one snapshot of the station and fans it out to every open
+stream for the station through an in-process hub, so each waiting
+client derives its own position without touching the database.
+
+The hub is per worker process. Every heartbeat a stream re-reads its
+state from SQLite, which picks up changes made by other workers.
+
+An open stream occupies a worker thread (or greenlet) until the page is
+closed, so the number of streams is capped by what the serving worker
+can actually run concurrently; see stream_capacity().
+"""
+import json
+import queue
+import sys
+import threading
+import config
+from models.db import get_db
+from models.charging import queue_snapshot
+
+
+class StreamLimitReached(Exception):
+    """Raised when the per-process cap on open streams is reached"""
+
+
+class QueueEventHub:
+    """Per-station publish/subscribe with a cap on open subscriptions"""
+
+    def __init__(self, max_streams=500):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._open = 0
+        self._published = 0
+        self._delivered = 0
+
+    def subscribe(self, station_id, limit=None):
+        with self._lock:
+            if limit is not None:
+                self.max_streams = limit
+            if self._open >= self.max_streams:
+                raise StreamLimitReached(f"{self._open} queue streams already open")
+            # Snapshots carry the full state, so only the latest matters
+            subscription = queue.Queue(maxsize=1)
+            self._subscribers.setdefault(station_id, set()).add(subscription)
+            self._open += 1
+            return subscription
+
+    def unsubscribe(self, station_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(station_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._open -= 1
+                if not subscribers:
+                    del self._subscribers[station_id]
+
+    def has_subscribers(self, station_id):
+        return station_id in self._subscribers
+
+    def publish(self, station_id, snapshot):
+        with self._lock:
+            subscribers = list(self._subscribers.get(station_id, ()))
+            self._published += 1
+            self._delivered += len(subscribers)
+
+        for subscription in subscribers:
+            # Replace an undelivered older snapshot instead of blocking
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscription.put_nowait(snapshot)
+            except queue.Full:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open_streams": self._open,
+                "max_streams": self.max_streams,
+                "stations": len(self._subscribers),
+                "published": self._published,
+                "delivered": self._delivered,
+            }
+
+
+hub = QueueEventHub(config.QUEUE_STREAM_MAX)
+
+
+def _cooperative():
+    # gunicorn's gevent worker monkey-patches sockets before loading the app
+    monkey = sys.modules.get("gevent.monkey")
+    return bool(monkey and monkey.is_module_patched("socket"))
+
+
+def stream_capacity(environ):
+    """
+    Streams this worker process can hold open for the server described
+    by the WSGI environ. Zero means serve polling only:
+
+    - gevent workers: QUEUE_STREAM_MAX, a waiting stream costs a greenlet
+    - gunicorn gthread workers: WORKER_THREADS less the threads kept free
+      for ordinary requests (QUEUE_STREAM_FREE_THREADS)
+    - other threaded servers (flask run): QUEUE_STREAM_MAX
+    - sync workers: 0, a stream would hold the worker's only thread
+    """
+    if _cooperative():
+        return config.QUEUE_STREAM_MAX
+    if not environ.get("wsgi.multithread"):
+        return 0
+    if "gunicorn.socket" in environ:
+        threads = config.WORKER_THREADS - config.QUEUE_STREAM_FREE_THREADS
+        return max(0, min(config.QUEUE_STREAM_MAX, threads))
+    return config.QUEUE_STREAM_MAX
+
+
+def queue_status(seq, snapshot):
+    """
+    Same payload as /api/queue-status, derived from a snapshot and the
+    user's sequence number. None once the user has left the queue.
+    """
+    if seq is None or seq - snapshot["head_seq"] < 1:
+        return None
+
+    position = seq - snapshot["head_seq"]
+    return {
+        "position": position,
+        "active_sessions": snapshot["active_sessions"],
+        "total_chargers": snapshot["total_chargers"],
+        "can_charge": position <= 1 and snapshot["active_sessions"] < snapshot["total_chargers"]
+    }
+
+
+def notify_queue_change(station_id):
+    """Publish the station's current queue state (call after commit)"""
+    if station_id is None or not hub.has_subscribers(station_id):
+        return
+
+    conn = get_db()
+    try:
+        snapshot = queue_snapshot(conn.cursor(), station_id)
+    finally:
+        conn.close()
+
+    if snapshot:
+        hub.publish(station_id, snapshot)
+
+
+def _load(station_id, user_id):
+    # Runs outside the request context, so this is a short pool checkout
+    # rather than a connection held for the lifetime of the stream
+    conn = get_db()
+    try:
+        return queue_snapshot(conn.cursor(), station_id, user_id)
+    finally:
+        conn.close()
+
+
+def _event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def stream_queue_status(subscription, station_id, user_id, heartbeat=None):
+    """
+    SSE generator for one waiting user. Sends the current status, then a
+    new event only when position/can_charge/availability actually change.
+    The subscription must already be registered so nothing published
+    between the initial read and the first wait is lost.
+    """
+    heartbeat = config.QUEUE_STREAM_HEARTBEAT if heartbeat is None else heartbeat
+    try:
+        snapshot = _load(station_id, user_id)
+        seq = snapshot["seq"] if snapshot else None
+        last = None
+
+        while True:
+            status = queue_status(seq, snapshot) if snapshot else None
+            if status is None:
+                yield _event({"error": "Not in queue"})
+                return
+            if status != last:
+                yield _event(status)
+                last = status
+
+            try:
+                snapshot = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+                snapshot = _load(station_id, user_id)
+                seq = snapshot["seq"] if snapshot else None
+    finally:
+        hub.unsubscribe(station_id, subscription)
@@ -0,0 +1,178 @@
+"""
+Station search queries shared by map search and natural language search.
+
+A filter spec (green score and price ranges, minimum chargers, maximum
+distance from an origin) becomes one parameterized SELECT over approved
+stations. Filtering, sorting and LIMIT/OFFSET all happen in SQLite on the
+idx_stations_approved_* indexes, so a page of results never loads the
+whole stations table into Python.
+
+Distances use the haversine_km() SQL function registered on every pooled
+connection (models/db.py), behind a lat/lng bounding-box prefilter.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371
+
+# Columns callers may select, in the order the routes expect them
+STATION_COLUMNS = ("name", "location", "chargers", "price", "green_score", "id", "lat", "lng")
+
+# sort key -> ORDER BY; ties keep table order like the old stable sorts
+SORT_ORDERS = {
+    "green_score": "green_score DESC, id",
+    "price": "price, id",
+    "chargers": "chargers DESC, id",
+    "distance": "distance IS NULL, distance, id",
+}
+
+# Columns a "rank" sort may weight (distance only with an origin)
+RANK_COLUMNS = ("green_score", "price", "chargers", "distance")
+
+# filter key -> SQL condition on one bound value
+RANGE_FILTERS = {
+    "green_score_min": "green_score >= ?",
+    "green_score_max": "green_score <= ?",
+    "price_min": "price >= ?",
+    "price_max": "price <= ?",
+    "min_chargers": "chargers >= ?",
+}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; None if either point is missing"""
+    if lat1 is None or lng1 is None or lat2 is None or lng2 is None:
+        return None
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) containing the circle. The
+    longitude span is widest away from the center latitude:
+    asin(sin(d) / cos(lat)). Longitudes may fall outside -180..180 when
+    the circle crosses the antimeridian.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    cos_lat = math.cos(math.radians(lat))
+    # A pole inside the circle means every longitude is in range
+    if abs(lat) + dlat >= 90 or math.sin(angle) >= cos_lat:
+        return lat - dlat, lat + dlat, -180.0, 180.0
+    dlng = math.degrees(math.asin(math.sin(angle) / cos_lat))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _where(filters, origin):
+    clauses = ["approved = 1"]
+    params = []
+    for key, condition in RANGE_FILTERS.items():
+        if filters.get(key) is not None:
+            clauses.append(condition)
+            params.append(filters[key])
+
+    max_distance = filters.get("max_distance")
+    if origin is not None and max_distance is not None:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(origin[0], origin[1], max_distance)
+        clauses.append("lat BETWEEN ? AND ?")
+        params += [min_lat, max_lat]
+        # Across the antimeridian the box wraps: rely on the exact check
+        if -180 <= min_lng and max_lng <= 180:
+            clauses.append("lng BETWEEN ? AND ?")
+            params += [min_lng, max_lng]
+        clauses.append("haversine_km(?, ?, lat, lng) <= ?")
+        params += [origin[0], origin[1], max_distance]
+
+    return " AND ".join(clauses), params
+
+
+def _rank_order(weights, origin):
+    """ORDER BY for a weighted sum of columns, best first"""
+    terms, params = [], []
+    for name, weight in weights.items():
+        if name not in RANK_COLUMNS:
+            raise ValueError(f"Cannot rank by {name!r}")
+        if name == "distance" and origin is None:
+            continue
+        terms.append(f"? * {name}")
+        params.append(weight)
+    order = f"({' + '.join(terms) or '0'}) DESC, id"
+    if origin is not None:
+        # Stations without coordinates have no distance: rank them last
+        order = "distance IS NULL, " + order
+    return order, params
+
+
+def build_station_query(filters, columns=STATION_COLUMNS, origin=None, sort_by=None,
+                        limit=None, offset=0, weights=None):
+    """
+    (sql, params) selecting approved stations that match filters:
+    green_score_min/max, price_min/max, min_chargers and max_distance
+    (km from origin; stations without coordinates never match). None
+    values are ignored.
+
+    With an origin a trailing "distance" column is selected (km, None
+    without coordinates). sort_by is a SORT_ORDERS key, or "rank" to
+    order by the weighted sum of RANK_COLUMNS in weights (e.g.
+    {"green_score": 2, "price": -1}); anything else keeps table order.
+    """
+    unknown = set(columns) - set(STATION_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown station columns: {sorted(unknown)}")
+
+    select = list(columns)
+    params = []
+    if origin is not None:
+        select.append("haversine_km(?, ?, lat, lng) AS distance")
+        params += [origin[0], origin[1]]
+
+    where, where_params = _where(filters, origin)
+    params += where_params
+
+    if sort_by == "rank" and weights:
+        order, order_params = _rank_order(weights, origin)
+        params += order_params
+    elif sort_by == "distance" and origin is None:
+        order = "id"
+    else:
+        order = SORT_ORDERS.get(sort_by, "id")
+
+    sql = f"SELECT {', '.join(select)} FROM stations WHERE {where} ORDER BY {order}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    return sql, params
+
+
+def count_stations(cur, filters, origin=None):
+    """Number of approved stations matching filters"""
+    where, params = _where(filters, origin)
+    cur.execute(f"SELECT COUNT(*) FROM stations WHERE {where}", params)
+    return cur.fetchone()[0]
+
+
+def search_stations(cur, filters, columns=STATION_COLUMNS, origin=None, sort_by=None,
+                    page=1, per_page=50, weights=None):
+    """
+    One page of matching stations: {rows, total, page, per_page, pages}.
+    The COUNT(*) is skipped when the page itself shows the total.
+    """
+    page = max(int(page), 1)
+    offset = (page - 1) * per_page
+    sql, params = build_station_query(filters, columns, origin, sort_by, per_page, offset, weights)
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+
+    if len(rows) < per_page and (rows or page == 1):
+        total = offset + len(rows)
+    else:
+        total = count_stations(cur, filters, origin)
+
+    return {
+        "rows": rows,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": max(math.ceil(total / per_page), 1),
+    }
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, session
-from models.db import get_db
+from models.db import get_db, get_pool_stats
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -188,11 +188,21 @@ def approve_station(station_id):
     conn = get_db()
     cur = conn.cursor()
     cur.execute("""
-        UPDATE stations SET approved=1 WHERE id=?
+        UPDATE stations SET approved=1 WHERE id=? AND approved=0
     """, (station_id,))
+    newly_approved = cur.rowcount > 0
     conn.commit()
     conn.close()
 
+    from ai.scoring import invalidate_station_scorer
+    from ai.geo_index import invalidate_geo_index
+    invalidate_station_scorer()
+    invalidate_geo_index()
+    if newly_approved:
+        # Only the tiles the station falls in change
+        from ai.map_tiles import station_approved
+        station_approved(station_id)
+
     return redirect("/admin/stations")
 
 @admin_bp.route("/admin/queue")
@@ -215,4 +225,45 @@ def admin_queue():
     return render_template("admin_queue.html", queue=queue)
 
 
+@admin_bp.route("/admin/db-stats")
+def admin_db_stats():
+    if not session.get("admin_logged_in"):
+        return {"error": "Unauthorized"}, 403
+
+    from models.queue_events import hub
+    from models.occupancy import registry
+    from ai.nl_query import parse_cache_stats
+    from ai.recommender import explanation_cache_stats
+    from ai.client import ai_client
+    from ai.forecast import forecast_stats
+    from ai.batch_analytics import snapshot_stats
+    return {
+        "pool": get_pool_stats(),
+        "queue_streams": hub.stats(),
+        "occupancy": registry.stats(),
+        "nl_query_cache": parse_cache_stats(),
+        "explanation_cache": explanation_cache_stats(),
+        "gemini": ai_client.stats(),
+        "demand_forecast": forecast_stats(),
+        "analytics_snapshot": snapshot_stats()
+    }
+
+
+@admin_bp.route("/admin/occupancy-check")
+def admin_occupancy_check():
+    """
+    Compare this worker's in-memory occupancy with SQL.
+    ?fix=1 reconciles immediately instead of waiting for the next cycle.
+    """
+    if not session.get("admin_logged_in"):
+        return {"error": "Unauthorized"}, 403
+
+    from models.occupancy import registry
+    conn = get_db()
+    if request.args.get("fix"):
+        drift = registry.reconcile(conn)
+    else:
+        drift = registry.check(conn)
+    conn.close()
 
+    return {"consistent": not drift, "drift": drift, "stats": registry.stats()}
@@ -1,6 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, session
-from models.db import get_db
+import config
+from flask import Blueprint, render_template, request, redirect, session, Response, jsonify
+from models.db import get_db, retry_on_busy
+from models.charging import (
+    get_station_occupancy, join_queue, admit_or_enqueue, attach_payment, queue_position,
+    dequeue_next
+)
+from models.occupancy import registry as occupancy
+from models.queue_events import (
+    hub as queue_hub, notify_queue_change, stream_queue_status, stream_capacity, StreamLimitReached
+)
 from ai.recommender import recommend_station
+from ai.scoring import get_station_scorer, invalidate_station_scorer
+from ai.geo_index import invalidate_geo_index
 from blockchain.payment import process_payment
 
 station_bp = Blueprint("station", __name__)
@@ -21,14 +32,26 @@ def add_station():
         green_score = int(request.form["green_score"])
         owner_id = session.get("user_id")
 
+        # Optional map position; stations without one are left out of
+        # nearby search until coordinates are added
+        try:
+            lat = float(request.form.get("lat") or "")
+            lng = float(request.form.get("lng") or "")
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                raise ValueError
+        except ValueError:
+            lat = lng = None
+
         conn = get_db()
         cur = conn.cursor()
         cur.execute("""
-            INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved)
-            VALUES (?, ?, ?, ?, ?, ?, 0)
-        """, (name, location, chargers, price, green_score, owner_id))
+            INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved, lat, lng)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+        """, (name, location, chargers, price, green_score, owner_id, lat, lng))
         conn.commit()
         conn.close()
+        invalidate_station_scorer()
+        invalidate_geo_index()
 
         return redirect("/owner/stations")
 
@@ -91,14 +114,8 @@ def recommend():
         battery = int(request.form["battery"])
         distance = int(request.form["distance"])
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT name, location, chargers, price, green_score
-            FROM stations
-        """)
-        stations = cur.fetchall()
-        conn.close()
+        # Cached column store of stations; only approved ones are eligible
+        stations = get_station_scorer()
 
         best_station, explanation = recommend_station(battery, distance, stations)
 
@@ -115,111 +132,94 @@ def charge_station(station_name):
     if session.get("role") != "user":
         return redirect("/login")
 
+    units = amount = None
+    if request.method == "POST":
+        units = float(request.form["units"])
+        price = float(request.form["price"])
+        amount = units * price
+
+    outcome, value, station_id = _charge_or_queue(station_name, session.get("user_id"), units, amount)
+
+    if outcome == "blacklisted":
+        return "Account is blacklisted"
+    if outcome == "missing":
+        return "Station not found"
+
+    if outcome == "queued":
+        return render_template(
+            "queue_status.html",
+            station_name=station_name,
+            position=value,
+            use_stream=stream_capacity(request.environ) > 0
+        )
+
+    if outcome == "charging":
+        # Pay only once the charger is ours, outside the retried block so a
+        # busy database can never charge twice
+        payment = process_payment(amount)
+        attach_payment(get_db(), value, payment["tx_hash"])
+
+        # A charger was taken: waiting users may no longer be able to charge
+        notify_queue_change(station_id)
+        return redirect("/user/history")
+
+    return render_template("charge_form.html", station_name=station_name)
+
+
+@retry_on_busy
+def _charge_or_queue(station_name, user_id, units=None, amount=None):
+    """
+    The database part of charge_station, retried as a whole on
+    SQLITE_BUSY. Returns (outcome, value, station_id) where outcome is
+    "charging" (value = session id), "queued" (value = position), "form"
+    (a charger is free, show the charge form), "blacklisted" or "missing".
+    """
     conn = get_db()
     cur = conn.cursor()
 
     # Prevent blacklisted users from starting charging
-    cur.execute("SELECT blacklisted FROM users WHERE id=?", (session.get('user_id'),))
+    cur.execute("SELECT blacklisted FROM users WHERE id=?", (user_id,))
     b = cur.fetchone()
     if b and b[0]:
         conn.close()
-        return "Account is blacklisted"
+        return "blacklisted", None, None
 
-    # Get total chargers
-    cur.execute(
-        "SELECT chargers FROM stations WHERE name=?",
-        (station_name,)
-    )
-    row = cur.fetchone()
+    # Get station id, total chargers and active sessions (one round trip)
+    row = get_station_occupancy(conn, station_name)
     if not row:
         conn.close()
-        return "Station not found"
+        return "missing", None, None
 
-    total_chargers = row[0]
-
-    # Count active sessions
-    cur.execute(
-        "SELECT COUNT(*) FROM charging_sessions WHERE station_name=? AND status='Active'",
-        (station_name,)
-    )
-    active_sessions = cur.fetchone()[0]
+    station_id, total_chargers, active_sessions = row
 
     # ===============================
-    # IF STATION FULL → ADD TO QUEUE
+    # START CHARGING (OR QUEUE IF THE LAST CHARGER WAS JUST TAKEN)
     # ===============================
-    if active_sessions >= total_chargers:
-        # Prevent duplicate queue entry
-        cur.execute("""
-            SELECT COUNT(*) FROM waiting_queue
-            WHERE station_name=? AND user_id=?
-        """, (station_name, session.get("user_id")))
-        already_queued = cur.fetchone()[0]
-
-        if already_queued == 0:
-            cur.execute("""
-                INSERT INTO waiting_queue (station_name, user_id)
-                VALUES (?, ?)
-            """, (station_name, session.get("user_id")))
-            conn.commit()
-
-        # Get queue position
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM waiting_queue
-            WHERE station_name=?
-              AND joined_at <= (
-                SELECT joined_at FROM waiting_queue
-                WHERE station_name=? AND user_id=?
-                ORDER BY joined_at ASC
-                LIMIT 1
-              )
-        """, (station_name, station_name, session.get("user_id")))
-
-        position = cur.fetchone()[0]
+    if units is not None:
+        outcome, value = admit_or_enqueue(conn, station_id, station_name, user_id, units, amount)
         conn.close()
-
-        return render_template(
-            "queue_status.html",
-            station_name=station_name,
-            position=position
-        )
+        return outcome, value, station_id
 
     # ===============================
-    # START CHARGING
+    # IF STATION FULL → ADD TO QUEUE
     # ===============================
-    if request.method == "POST":
-        units = float(request.form["units"])
-        price = float(request.form["price"])
-        amount = units * price
-
-        payment = process_payment(amount)
-
-        cur.execute("""
-            INSERT INTO charging_sessions
-            (user_id, station_name, units, amount, tx_hash, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            session.get("user_id"),
-            station_name,
-            units,
-            amount,
-            payment["tx_hash"],
-            "Active"
-        ))
-
-        conn.commit()
+    if active_sessions >= total_chargers:
+        # None: the registry was stale and a charger is free after all
+        position = join_queue(conn, station_id, station_name, user_id)
         conn.close()
-
-        return redirect("/user/history")
+        if position is not None:
+            return "queued", position, station_id
+        return "form", None, station_id
 
     conn.close()
-    return render_template("charge_form.html", station_name=station_name)
+    return "form", None, station_id
 
 
 # ===============================
 # USER: COMPLETE CHARGING
 # ===============================
 @station_bp.route("/user/complete/<int:session_id>")
+@retry_on_busy
 def complete_charging(session_id):
     if session.get("role") != "user":
         return redirect("/login")
@@ -227,9 +227,9 @@ def complete_charging(session_id):
     conn = get_db()
     cur = conn.cursor()
 
-    # Get station name
+    # Get station id
     cur.execute(
-        "SELECT station_name FROM charging_sessions WHERE id=?",
+        "SELECT station_id, status FROM charging_sessions WHERE id=?",
         (session_id,)
     )
     row = cur.fetchone()
@@ -237,7 +237,7 @@ def complete_charging(session_id):
         conn.close()
         return redirect("/user/history")
 
-    station_name = row[0]
+    station_id, status = row
 
     # Mark session completed
     cur.execute(
@@ -246,19 +246,17 @@ def complete_charging(session_id):
     )
 
     # Remove first user from queue (FIFO)
-    cur.execute("""
-        DELETE FROM waiting_queue
-        WHERE id = (
-            SELECT id FROM waiting_queue
-            WHERE station_name=?
-            ORDER BY joined_at ASC
-            LIMIT 1
-        )
-    """, (station_name,))
+    dequeued = dequeue_next(cur, station_id)
 
     conn.commit()
     conn.close()
 
+    if status == "Active":
+        occupancy.session_ended(station_id, dequeued=dequeued is not None)
+    elif dequeued is not None:
+        occupancy.queue_left(station_id)
+    notify_queue_change(station_id)
+
     return redirect("/user/history")
 
 
@@ -275,58 +273,26 @@ def check_queue_status(station_name):
         return {"error": "Unauthorized"}, 403
 
     conn = get_db()
-    cur = conn.cursor()
 
-    # Get total chargers
-    cur.execute(
-        "SELECT chargers FROM stations WHERE name=?",
-        (station_name,)
-    )
-    row = cur.fetchone()
+    # Get station id, total chargers and active sessions (registry lookup)
+    row = get_station_occupancy(conn, station_name)
     if not row:
         conn.close()
         return {"error": "Station not found"}, 404
 
-    total_chargers = row[0]
+    station_id, total_chargers, active_sessions = row
 
-    # Count active sessions
-    cur.execute(
-        "SELECT COUNT(*) FROM charging_sessions WHERE station_name=? AND status='Active'",
-        (station_name,)
-    )
-    active_sessions = cur.fetchone()[0]
-
-    # Check if user is still in queue
-    cur.execute("""
-        SELECT COUNT(*) FROM waiting_queue
-        WHERE station_name=? AND user_id=?
-    """, (station_name, session.get("user_id")))
-    in_queue = cur.fetchone()[0]
+    # Get queue position (None if user is no longer in queue); the only
+    # per-user figure, so the only SQL read here
+    position = queue_position(conn.cursor(), station_id, session.get("user_id"))
+    conn.close()
 
-    if not in_queue:
-        conn.close()
+    if position is None or position < 1:
         return {"error": "Not in queue"}, 400
 
-    # Get queue position
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM waiting_queue
-        WHERE station_name=?
-          AND joined_at <= (
-            SELECT joined_at FROM waiting_queue
-            WHERE station_name=? AND user_id=?
-            ORDER BY joined_at ASC
-            LIMIT 1
-          )
-    """, (station_name, station_name, session.get("user_id")))
-
-    position = cur.fetchone()[0]
-
-    # Check if slot is available (position is 1 or less and not all chargers are in use)
+    # A hint only: the charge POST re-checks for a free charger in SQL
     can_charge = position <= 1 and active_sessions < total_chargers
 
-    conn.close()
-
     return {
         "position": position,
         "active_sessions": active_sessions,
@@ -335,6 +301,42 @@ def check_queue_status(station_name):
     }
 
 
+# ===============================
+# USER: QUEUE STATUS PUSH STREAM (SSE)
+# ===============================
+@station_bp.route("/api/queue-stream/<station_name>")
+def queue_status_stream(station_name):
+    """
+    Server-Sent Events stream of the same payload as /api/queue-status,
+    pushed only when the user's position or availability changes.
+    Clients fall back to polling if the stream is refused or drops;
+    it is refused once this worker's stream capacity is in use.
+    """
+    if session.get("role") != "user":
+        return {"error": "Unauthorized"}, 403
+
+    conn = get_db()
+    row = get_station_occupancy(conn, station_name)
+    conn.close()
+    if not row:
+        return {"error": "Station not found"}, 404
+
+    station_id = row[0]
+
+    try:
+        subscription = queue_hub.subscribe(station_id, stream_capacity(request.environ))
+    except StreamLimitReached:
+        return {"error": "Too many open streams"}, 503, {"Retry-After": "30"}
+
+    # The generator runs after this request's context (and its pooled
+    # connection) has been released; it checks out connections briefly
+    return Response(
+        stream_queue_status(subscription, station_id, session.get("user_id")),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ===============================# USER: CHARGING HISTORY
 # ===============================
 @station_bp.route("/user/history")
@@ -360,6 +362,7 @@ def charging_history():
 # USER: STOP/COMPLETE CHARGING
 # ===============================
 @station_bp.route("/user/stop-charging/<int:session_id>", methods=["POST"])
+@retry_on_busy
 def stop_charging(session_id):
     if session.get("role") != "user":
         return {"error": "Unauthorized"}, 403
@@ -369,7 +372,7 @@ def stop_charging(session_id):
 
     # Verify this is the user's session
     cur.execute("""
-        SELECT id, station_name, status FROM charging_sessions
+        SELECT id, station_id, status FROM charging_sessions
         WHERE id=? AND user_id=?
     """, (session_id, session.get("user_id")))
     
@@ -378,7 +381,7 @@ def stop_charging(session_id):
         conn.close()
         return {"error": "Session not found"}, 404
 
-    session_id_check, station_name, current_status = session_data
+    session_id_check, station_id, current_status = session_data
 
     if current_status != "Active":
         conn.close()
@@ -387,9 +390,9 @@ def stop_charging(session_id):
     # Compute duration and ensure amount is recorded, then mark as completed
     from datetime import datetime
     # Fetch start time, units and existing amount
-    cur.execute("SELECT started_at, units, amount, station_name FROM charging_sessions WHERE id=?", (session_id,))
+    cur.execute("SELECT started_at, units, amount FROM charging_sessions WHERE id=?", (session_id,))
     info = cur.fetchone()
-    started_at, units, existing_amount, station = info
+    started_at, units, existing_amount = info
 
     # Parse started_at (SQLite default format: YYYY-MM-DD HH:MM:SS)
     def parse_ts(ts):
@@ -413,7 +416,7 @@ def stop_charging(session_id):
     # If amount missing or zero, compute from station price
     amount_to_set = existing_amount
     if not existing_amount:
-        cur.execute("SELECT price FROM stations WHERE name=?", (station,))
+        cur.execute("SELECT price FROM stations WHERE id=?", (station_id,))
         r = cur.fetchone()
         price = r[0] if r else 0
         amount_to_set = units * price if units else 0
@@ -425,19 +428,14 @@ def stop_charging(session_id):
     """, (now, duration_minutes, amount_to_set, session_id))
 
     # Remove first user from queue (for next user)
-    cur.execute("""
-        DELETE FROM waiting_queue
-        WHERE id = (
-            SELECT id FROM waiting_queue
-            WHERE station_name=?
-            ORDER BY joined_at ASC
-            LIMIT 1
-        )
-    """, (station_name,))
+    dequeued = dequeue_next(cur, station_id)
 
     conn.commit()
     conn.close()
 
+    occupancy.session_ended(station_id, dequeued=dequeued is not None)
+    notify_queue_change(station_id)
+
     return {"status": "success", "message": "Charging stopped"}, 200
 
 
@@ -465,18 +463,17 @@ def owner_active_sessions():
         return render_template("owner_active_sessions.html", sessions=[])
 
     # Get active charging sessions for these stations
-    placeholders = ','.join('?' * len(owner_stations))
-    station_names = [s[1] for s in owner_stations]
+    placeholders = ','.join('?' * len(station_ids))
     
     cur.execute(f"""
         SELECT cs.id, cs.user_id, cs.station_name, cs.units, cs.amount, 
                cs.status, cs.started_at, u.name, u.email
         FROM charging_sessions cs
         JOIN users u ON cs.user_id = u.id
-        WHERE cs.station_name IN ({placeholders})
+        WHERE cs.station_id IN ({placeholders})
         AND cs.status = 'Active'
         ORDER BY cs.started_at DESC
-    """, station_names)
+    """, station_ids)
     
     sessions = cur.fetchall()
     conn.close()
@@ -488,6 +485,7 @@ def owner_active_sessions():
 # OWNER: COMPLETE USER'S CHARGING
 # ===============================
 @station_bp.route("/owner/complete-charging/<int:session_id>", methods=["POST"])
+@retry_on_busy
 def owner_complete_charging(session_id):
     if session.get("role") != "owner":
         return {"error": "Unauthorized"}, 403
@@ -497,9 +495,9 @@ def owner_complete_charging(session_id):
 
     # Get session and verify ownership
     cur.execute("""
-        SELECT cs.id, cs.station_name, cs.status, s.owner_id
+        SELECT cs.id, cs.station_id, cs.status, s.owner_id
         FROM charging_sessions cs
-        JOIN stations s ON cs.station_name = s.name
+        JOIN stations s ON cs.station_id = s.id
         WHERE cs.id=?
     """, (session_id,))
     
@@ -508,7 +506,7 @@ def owner_complete_charging(session_id):
         conn.close()
         return {"error": "Session not found"}, 404
 
-    session_id_check, station_name, status, owner_id = session_data
+    session_id_check, station_id, status, owner_id = session_data
 
     if owner_id != session.get("user_id"):
         conn.close()
@@ -544,7 +542,7 @@ def owner_complete_charging(session_id):
 
     amount_to_set = existing_amount
     if not existing_amount:
-        cur.execute("SELECT price FROM stations WHERE name=?", (station_name,))
+        cur.execute("SELECT price FROM stations WHERE id=?", (station_id,))
         r = cur.fetchone()
         price = r[0] if r else 0
         amount_to_set = units * price if units else 0
@@ -556,19 +554,14 @@ def owner_complete_charging(session_id):
     """, (now, duration_minutes, amount_to_set, session_id))
 
     # Remove first user from queue
-    cur.execute("""
-        DELETE FROM waiting_queue
-        WHERE id = (
-            SELECT id FROM waiting_queue
-            WHERE station_name=?
-            ORDER BY joined_at ASC
-            LIMIT 1
-        )
-    """, (station_name,))
+    dequeued = dequeue_next(cur, station_id)
 
     conn.commit()
     conn.close()
 
+    occupancy.session_ended(station_id, dequeued=dequeued is not None)
+    notify_queue_change(station_id)
+
     return {"status": "success", "message": "Charging completed"}, 200
 
 
@@ -576,6 +569,7 @@ def owner_complete_charging(session_id):
 # OWNER: CANCEL USER'S CHARGING
 # ===============================
 @station_bp.route("/owner/cancel-charging/<int:session_id>", methods=["POST"])
+@retry_on_busy
 def owner_cancel_charging(session_id):
     if session.get("role") != "owner":
         return {"error": "Unauthorized"}, 403
@@ -585,9 +579,9 @@ def owner_cancel_charging(session_id):
 
     # Get session and verify ownership
     cur.execute("""
-        SELECT cs.id, cs.station_name, cs.status, s.owner_id
+        SELECT cs.id, cs.station_id, cs.status, s.owner_id
         FROM charging_sessions cs
-        JOIN stations s ON cs.station_name = s.name
+        JOIN stations s ON cs.station_id = s.id
         WHERE cs.id=?
     """, (session_id,))
     
@@ -596,7 +590,7 @@ def owner_cancel_charging(session_id):
         conn.close()
         return {"error": "Session not found"}, 404
 
-    session_id_check, station_name, status, owner_id = session_data
+    session_id_check, station_id, status, owner_id = session_data
 
     if owner_id != session.get("user_id"):
         conn.close()
@@ -634,6 +628,11 @@ def owner_cancel_charging(session_id):
     conn.commit()
     conn.close()
 
+    # Freed charger: the head of the queue may now charge
+    if status == "Active":
+        occupancy.session_ended(station_id)
+    notify_queue_change(station_id)
+
     return {"status": "success", "message": "Charging cancelled"}, 200
 
 
@@ -692,6 +691,8 @@ def nl_search():
     results = None
     explanation = None
     query = None
+    pagination = None
+    sort_by = None
     
     if request.method == "POST":
         query = request.form.get("query", "").strip()
@@ -699,25 +700,42 @@ def nl_search():
         if not query:
             return render_template("nl_search.html", error="Please enter a search query")
         
-        # Get all stations
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT name, location, chargers, price, green_score
-            FROM stations WHERE approved = 1
-        """)
-        all_stations = cur.fetchall()
-        conn.close()
+        # Optional user position (enables the distance filter, distance
+        # sorting and distance in the combined ranking)
+        try:
+            origin = (float(request.form["latitude"]), float(request.form["longitude"]))
+        except (KeyError, ValueError):
+            origin = None
         
-        # Perform search
-        search_result = search_with_natural_language(query, all_stations)
+        try:
+            page = max(int(request.form.get("page", 1)), 1)
+        except ValueError:
+            page = 1
+        
+        # Filters, sorting and paging run in SQL (models/station.py)
+        search_result = search_with_natural_language(
+            query, origin=origin, page=page, per_page=config.SEARCH_PAGE_SIZE
+        )
         results = search_result["results"]
         explanation = search_result["explanation"]
+        sort_by = search_result["sort_by"]
+        pagination = {
+            "page": search_result["page"],
+            "pages": search_result["pages"],
+            "total": search_result["result_count"],
+            "form": {
+                "query": query,
+                "latitude": origin[0] if origin else "",
+                "longitude": origin[1] if origin else "",
+            },
+        }
     
     return render_template("nl_search.html", 
                          results=results,
                          explanation=explanation,
-                         query=query)
+                         query=query,
+                         pagination=pagination,
+                         sort_by=sort_by)
 
 
 # ===============================
@@ -745,11 +763,16 @@ def map_search():
     if session.get("role") != "user":
         return redirect("/login")
     
-    from ai.map_utils import get_all_stations_with_location, search_stations_by_location, get_map_config
+    from ai.map_utils import (
+        get_all_stations_with_location, search_stations_by_location, get_map_config,
+        filter_stations
+    )
     
     stations = []
     search_performed = False
     search_type = None
+    map_stats = None
+    pagination = None
     
     if request.method == "POST":
         search_type = request.form.get("search_type", "all")
@@ -768,21 +791,39 @@ def map_search():
             stations = search_stations_by_location(lat, lng, radius)
         
         elif search_type == "filter":
-            # Filter by criteria
-            all_stations = get_all_stations_with_location()
-            green_min = int(request.form.get("green_min", 0))
-            price_max = float(request.form.get("price_max", 1000))
-            chargers_min = int(request.form.get("chargers_min", 0))
+            # Filter, sort and page in SQL (one indexed query per page)
+            filters = {
+                "green_score_min": int(request.form.get("green_min", 0)),
+                "price_max": float(request.form.get("price_max", 1000)),
+                "min_chargers": int(request.form.get("chargers_min", 0)),
+            }
+            page = max(int(request.form.get("page", 1)), 1)
+            
+            # With the user's position, show distances and nearest first
+            origin = None
+            if request.form.get("latitude") and request.form.get("longitude"):
+                origin = (float(request.form["latitude"]), float(request.form["longitude"]))
             
-            stations = [
-                s for s in all_stations
-                if s["green_score"] >= green_min
-                and s["price"] <= price_max
-                and s["chargers"] >= chargers_min
-            ]
+            found = filter_stations(filters, origin, page, config.SEARCH_PAGE_SIZE)
+            stations = found["stations"]
+            pagination = {
+                "page": found["page"],
+                "pages": found["pages"],
+                "total": found["total"],
+                "form": {
+                    "search_type": "filter",
+                    "green_min": filters["green_score_min"],
+                    "price_max": filters["price_max"],
+                    "chargers_min": filters["min_chargers"],
+                    "latitude": origin[0] if origin else "",
+                    "longitude": origin[1] if origin else "",
+                },
+            }
     else:
-        # Default: show all stations
-        stations = get_all_stations_with_location()
+        # Default: the map loads clustered viewport tiles from
+        # /api/map/tiles instead of embedding every station in the page
+        from ai.map_tiles import get_cluster_grid
+        map_stats = get_cluster_grid().summary()
     
     map_config = get_map_config()
     
@@ -790,7 +831,77 @@ def map_search():
                          stations=stations,
                          map_config=map_config,
                          search_performed=search_performed,
-                         search_type=search_type)
+                         search_type=search_type,
+                         viewport_mode=not search_performed,
+                         map_stats=map_stats,
+                         pagination=pagination)
+
+
+# ===============================
+# MAP CLUSTERS / VIEWPORT TILES (API)
+# ===============================
+def _etag_response(payload, etag):
+    """JSON payload with an ETag; 304 if the client already has it"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    # Cached by the browser but revalidated on every use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@station_bp.route("/api/map/tiles/<int:zoom>/<int:x>/<int:y>")
+def map_tile(zoom, x, y):
+    """Clusters (low zoom) or stations (high zoom) in one map tile"""
+    if session.get("role") != "user":
+        return {"error": "Unauthorized"}, 403
+
+    from ai.map_tiles import get_cluster_grid, tile_etag, MAX_ZOOM
+
+    if not 0 <= zoom <= MAX_ZOOM or not 0 <= x < 2 ** zoom or not 0 <= y < 2 ** zoom:
+        return {"error": "Tile out of range"}, 404
+
+    content = get_cluster_grid().tile(zoom, x, y)
+    return _etag_response(content, tile_etag(content))
+
+
+@station_bp.route("/api/map/clusters")
+def map_clusters():
+    """
+    Clusters and stations for a viewport:
+    ?south=&west=&north=&east=&zoom=  (west > east crosses the antimeridian)
+    """
+    if session.get("role") != "user":
+        return {"error": "Unauthorized"}, 403
+
+    from ai.map_tiles import get_cluster_grid, tile_etag, viewport_tiles, MAX_TILES_PER_VIEWPORT
+
+    try:
+        south, west, north, east = (float(request.args[k]) for k in ("south", "west", "north", "east"))
+        zoom = int(request.args.get("zoom", 5))
+    except (KeyError, ValueError):
+        return {"error": "south, west, north, east and zoom are required"}, 400
+
+    tiles = viewport_tiles(south, west, north, east, zoom)
+    if len(tiles) > MAX_TILES_PER_VIEWPORT:
+        return {"error": "Viewport too large for this zoom"}, 400
+
+    grid = get_cluster_grid()
+    clusters, stations = [], []
+    for tile in tiles:
+        content = grid.tile(*tile)
+        clusters.extend(content["clusters"])
+        stations.extend(content["stations"])
+
+    payload = {
+        "zoom": tiles[0][0] if tiles else zoom,
+        "tiles": [list(t) for t in tiles],
+        "clusters": clusters,
+        "stations": stations,
+    }
+    return _etag_response(payload, tile_etag(payload))
 
 
 @station_bp.route("/user/map-booking/<int:station_id>", methods=["GET", "POST"])
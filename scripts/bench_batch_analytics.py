@@ -0,0 +1,137 @@
+"""
+Benchmark: network-wide analytics snapshot vs per-station reports.
+
+Seeds a scratch database with STATIONS stations and 60 days of hourly
+rollup rows, then builds every station's analytics summary:
+
+- per station: get_all_analytics_summary for each station name, the way
+  a fleet report would have to (two queries and a Python pass per
+  station)
+- batch: ai.batch_analytics.run_batch_analytics - the demand model once
+  and two grouped rollup range reads per chunk of stations (statement
+  counts include one per snapshot row written)
+
+Checks that every snapshot equals the per-station summary, that the
+batch job is faster than the per-station loop and that the page then
+serves the snapshot, and prints runtimes and query counts.
+
+Usage:
+    python scripts/bench_batch_analytics.py [stations]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Never touch the real database; count statements per connection
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "batch.db"))
+os.environ.setdefault("EV_DB_COUNT_QUERIES", "1")
+sys.path.insert(0, ".")
+
+import numpy as np  # noqa: E402
+from models.db import get_db, get_pool_stats, init_db  # noqa: E402
+from ai.analytics import get_all_analytics_summary  # noqa: E402
+from ai.batch_analytics import run_batch_analytics  # noqa: E402
+from ai.forecast import fit_demand_model  # noqa: E402
+
+STATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+DAYS = 60
+
+
+def seed(rng):
+    """Stations plus sparse hourly rollup rows for the last DAYS days"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO stations (name, location, chargers, price, green_score, approved) "
+                    "VALUES (?, 'Area', ?, ?, ?, 1)",
+                    [(f"Station {i}", 1 + i % 8, round(8 + i % 7 * 0.75, 2), 1 + i % 10)
+                     for i in range(STATIONS)])
+    today = datetime.now(timezone.utc).date()
+    rate = rng.lognormal(np.log(0.4), 1.0, STATIONS)
+    rows = []
+    for day in range(DAYS + 1):
+        hour_key = (today - timedelta(days=day)).isoformat()
+        counts = rng.poisson(rate[:, None], (STATIONS, 24))
+        for s, h in zip(*np.nonzero(counts)):
+            s, n = int(s), int(counts[s, h])
+            rows.append((s + 1, f"{hour_key} {h:02d}:00:00", n, n * 12.5,
+                         round(n * 12.5 * (9 + s % 5), 2), n - (s % 2), (n - (s % 2)) * 50))
+        if len(rows) > 200000:
+            cur.executemany("""
+                INSERT INTO station_hourly_stats
+                (station_id, hour, sessions, units, revenue, duration_sessions, total_duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            rows = []
+    cur.executemany("""
+        INSERT INTO station_hourly_stats
+        (station_id, hour, sessions, units, revenue, duration_sessions, total_duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    cur.execute("SELECT COUNT(*) FROM station_hourly_stats")
+    total = cur.fetchone()[0]
+    conn.close()
+    return total
+
+
+def queries():
+    return get_pool_stats()["queries"]
+
+
+def main():
+    init_db()
+    rng = np.random.default_rng(24)
+    rows = seed(rng)
+    names = [f"Station {i}" for i in range(STATIONS)]
+    print(f"{STATIONS} stations, {rows} hourly rollup rows\n")
+    failures = 0
+
+    # Per station (no snapshots yet), with the stored demand model
+    fit_demand_model()
+    get_all_analytics_summary(names[0])
+    before = queries()
+    start = time.perf_counter()
+    expected = {name: get_all_analytics_summary(name) for name in names}
+    per_station = time.perf_counter() - start
+    per_station_queries = queries() - before
+    print(f"per station     {per_station:6.2f} s   {per_station_queries} statements")
+
+    before = queries()
+    result = run_batch_analytics()
+    print(f"batch           {result['seconds']:6.2f} s   {queries() - before} statements   "
+          f"(model {result['model_ms']:.0f} ms, scans and reports {result['build_ms']:.0f} ms, "
+          f"writes {result['write_ms']:.0f} ms)")
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT station_name, report FROM station_analytics_snapshot")
+    snapshots = {name: json.loads(report) for name, report in cur.fetchall()}
+    conn.close()
+    differ = [name for name in names if snapshots.get(name) != expected[name]]
+    failures += bool(differ)
+    print(f"\n{'✓' if not differ else '✗'} {len(names) - len(differ)}/{len(names)} snapshots "
+          f"match the per-station summaries" + (f" (first mismatch: {differ[0]})" if differ else ""))
+
+    before = queries()
+    start = time.perf_counter()
+    served = {name: get_all_analytics_summary(name) for name in names}
+    page_time = time.perf_counter() - start
+    ok = served == expected and queries() - before == len(names)
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} page from snapshot: {page_time / len(names) * 1000:.2f} ms and "
+          f"{(queries() - before) / len(names):.0f} query per station "
+          f"(was {per_station / len(names) * 1000:.2f} ms, {per_station_queries / len(names):.0f} queries)")
+
+    faster = result["seconds"] < per_station
+    failures += not faster
+    print(f"{'✓' if faster else '✗'} batch snapshot {per_station / result['seconds']:.1f}x "
+          f"faster than per-station reports")
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
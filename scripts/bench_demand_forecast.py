@@ -0,0 +1,165 @@
+"""
+Benchmark: batch demand model fitting (ai/forecast.py).
+
+1. Generates synthetic hourly sessions for STATIONS stations (own level,
+   trend, weekday and hour-of-day shape, Poisson noise), fits the first
+   FORECAST_HISTORY_DAYS days of all of them in one batch, and times the
+   fit.
+2. Scores the next 7 days against the held-out data, next to the same
+   weekday's mean (the best the old weekday-count report could do; the
+   report itself returned the weekday's 60-day total).
+3. Loads and fits a smaller fleet (at most DB_STATIONS) end to end from
+   station_hourly_stats in a scratch database, checks a station forecast,
+   stores the fit and checks that get_demand_model() serves the stored
+   parameters.
+
+Fails if the model does not beat the weekday mean on the holdout week.
+
+Usage:
+    python scripts/bench_demand_forecast.py [stations] [repeats]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "forecast.db"))
+sys.path.insert(0, ".")
+
+import numpy as np  # noqa: E402
+import config  # noqa: E402
+from models.db import get_db, init_db  # noqa: E402
+from ai import forecast  # noqa: E402
+
+STATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+DAYS = config.FORECAST_HISTORY_DAYS
+HOLDOUT = 7
+DB_STATIONS = 1000
+
+
+def synthetic_counts(rng, stations, days, first_weekday):
+    """(stations, days, 24) Poisson sessions with trend and weekly/daily seasonality"""
+    level = rng.lognormal(np.log(12), 0.8, stations)
+    growth = rng.normal(0, 0.01, stations)           # per day, about +-30% over two months
+    weekday_shape = np.clip(1 + rng.normal(0, 0.25, (stations, 7)) + [0, 0, 0, 0, 0.2, 0.4, -0.3], 0.1, None)
+    weekday_shape /= weekday_shape.mean(axis=1, keepdims=True)
+    hours = np.arange(24)
+    evening = np.exp(-((hours - rng.uniform(16, 20, (stations, 1))) ** 2) / 8)
+    morning = np.exp(-((hours - rng.uniform(7, 10, (stations, 1))) ** 2) / 4)
+    hour_shape = 0.05 + evening + rng.uniform(0.2, 1, (stations, 1)) * morning
+    hour_shape /= hour_shape.sum(axis=1, keepdims=True)
+
+    day = np.arange(days)
+    weekdays = (first_weekday + day) % 7
+    daily = level[:, None] * np.maximum(1 + growth[:, None] * day, 0.1) * weekday_shape[:, weekdays]
+    return rng.poisson(daily[:, :, None] * hour_shape[:, None, :]).astype(np.float32)
+
+
+def model_daily(params, first_weekday, days, ahead_days):
+    """(stations, ahead_days) expected daily sessions after the fitted window"""
+    out = []
+    for ahead in range(1, ahead_days + 1):
+        damped = forecast.PHI * (1 - forecast.PHI ** ahead) / (1 - forecast.PHI)
+        weekday = (first_weekday + days - 1 + ahead) % 7
+        out.append(np.maximum(params["level"] + damped * params["trend"], 0) * params["weekday_index"][:, weekday])
+    return np.stack(out, axis=1)
+
+
+def weekday_mean_daily(history, first_weekday, ahead_days):
+    daily = history.sum(axis=2, dtype=np.float64)
+    weekdays = (first_weekday + np.arange(daily.shape[1])) % 7
+    out = []
+    for ahead in range(1, ahead_days + 1):
+        weekday = (first_weekday + daily.shape[1] - 1 + ahead) % 7
+        out.append(daily[:, weekdays == weekday].mean(axis=1))
+    return np.stack(out, axis=1)
+
+
+def seed_rollup(counts, today):
+    """Insert counts straight into station_hourly_stats for DB_STATIONS stations"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO stations (name, location, chargers, price, green_score, approved) "
+                    "VALUES (?, 'Area', ?, 10, 5, 1)",
+                    [(f"Station {i}", 1 + i % 8) for i in range(len(counts))])
+    first_day = today - timedelta(days=counts.shape[1])
+    rows = []
+    for s, d, h in zip(*np.nonzero(counts)):
+        n = int(counts[s, d, h])
+        hour = f"{(first_day + timedelta(days=int(d))).isoformat()} {h:02d}:00:00"
+        rows.append((int(s) + 1, hour, n, n * 10.0, n * 100.0, n, n * 45))
+    cur.executemany("""
+        INSERT INTO station_hourly_stats
+        (station_id, hour, sessions, units, revenue, duration_sessions, total_duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def main():
+    rng = np.random.default_rng(23)
+    failures = 0
+    first_weekday = 2
+
+    counts = synthetic_counts(rng, STATIONS, DAYS + HOLDOUT, first_weekday)
+    history, holdout = counts[:, :DAYS], counts[:, DAYS:]
+    print(f"{STATIONS} stations x {DAYS} days x 24 hours ({history.nbytes / 1e6:.0f} MB of counts)")
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        params = forecast.fit_demand(history, first_weekday)
+        best = min(best, time.perf_counter() - start)
+    print(f"fit: {best * 1000:.0f} ms for {STATIONS} stations "
+          f"({best * 1e6 / STATIONS:.1f} µs per station)\n")
+
+    actual = holdout.sum(axis=2, dtype=np.float64)
+    model_mae = np.abs(model_daily(params, first_weekday, DAYS, HOLDOUT) - actual).mean()
+    naive_mae = np.abs(weekday_mean_daily(history, first_weekday, HOLDOUT) - actual).mean()
+    ok = model_mae < naive_mae
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} holdout week, mean abs error per station-day: "
+          f"model {model_mae:.2f} sessions, same-weekday mean {naive_mae:.2f} "
+          f"(mean day {actual.mean():.1f} sessions)")
+
+    labels = [forecast.confidence(e) for e in params["rel_error"]]
+    print(f"  confidence: {labels.count('high')} high, {labels.count('medium')} medium, "
+          f"{labels.count('low')} low")
+
+    # End to end from SQLite
+    init_db()
+    today = datetime.now(timezone.utc).date()
+    db_stations = min(STATIONS, DB_STATIONS)
+    rows = seed_rollup(history[:db_stations], today)
+    model = forecast.load_demand_model(today=today)
+    days = model.forecast(1, today, 7)
+    ok = len(model) == db_stations and len(days) == 7 and days[0]["peak_occupancy"] is not None
+    failures += not ok
+    print(f"\n{'✓' if ok else '✗'} {db_stations} stations from {rows} rollup rows: "
+          f"load {model.load_ms:.0f} ms, fit {model.fit_ms:.0f} ms")
+    print(f"  Station 0, {days[0]['day']}: {days[0]['expected_sessions']} sessions, "
+          f"{days[0]['confidence']} confidence, {days[0]['peak_occupancy']:.0%} busy at {days[0]['peak_hour']}")
+
+    # Requests read the stored parameters instead of fitting
+    forecast.save_demand_model(model)
+    start = time.perf_counter()
+    served = forecast.get_demand_model()
+    request_ms = (time.perf_counter() - start) * 1000
+    ok = (served is not None and served.fitted_at == model.fitted_at
+          and served.forecast(1, today, 7) == days)
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} first request reads the stored fit in {request_ms:.0f} ms "
+          f"(fitting took {model.load_ms + model.fit_ms:.0f} ms)")
+
+    if failures:
+        sys.exit(1)
+    print("\n✓ Batch demand model fitted and beats the weekday mean")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: cached, single-flight recommendation explanations.
+
+Injects ai.client.FakeClient, which answers after LATENCY seconds, in
+place of Gemini, then sends a burst of recommendation requests from
+THREADS concurrent threads (users with similar battery/distance inputs)
+and checks that:
+
+- concurrent identical requests share one in-flight call
+- bucketed inputs (62% / 64% battery) reuse the same explanation
+- a failed call is not cached, so the next request tries again
+
+and reports the hit rate and latency saved from the cache stats.
+
+Usage:
+    python scripts/bench_explanation_cache.py [requests] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+LATENCY = 0.2
+
+# Never touch the real database; measure the cache, not the call limiter
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "explain.db"))
+os.environ.setdefault("EV_AI_MAX_CONCURRENT", str(THREADS))
+sys.path.insert(0, ".")
+
+from models.db import init_db  # noqa: E402
+from ai import recommender  # noqa: E402
+from ai.client import ai_client, FakeClient  # noqa: E402
+from ai.scoring import StationScorer  # noqa: E402
+
+REPLY = '{"why": "Go to the best station", "benefits": ["Cheap"], "tip": "Charge off-peak"}'
+
+
+def main():
+    init_db()
+    fake = FakeClient(REPLY, delay=LATENCY)
+    ai_client.set_client(fake)
+    calls = fake.calls
+    failures = 0
+
+    rnd = random.Random(19)
+    rows = [(f"Station {i}", f"Area {i}", rnd.randint(1, 12), round(rnd.uniform(7, 15), 2),
+             rnd.randint(1, 10)) for i in range(200)]
+    scorer = StationScorer(rows)
+
+    # Concurrent identical requests: one call
+    with ThreadPoolExecutor(THREADS) as pool:
+        answers = list(pool.map(lambda _: recommender.recommend_station(60, 30, scorer)[1], range(THREADS)))
+    if len(calls) != 1 or len(set(answers)) != 1:
+        print(f"✗ {THREADS} concurrent identical requests made {len(calls)} calls")
+        failures += 1
+    else:
+        print(f"✓ {THREADS} concurrent identical requests shared 1 call")
+
+    # Same bucket
+    before = len(calls)
+    recommender.recommend_station(62, 27, scorer)
+    recommender.recommend_station(64, 30, scorer)
+    if len(calls) != before:
+        print("✗ Inputs in the same bucket were not served from the cache")
+        failures += 1
+    else:
+        print("✓ 62%/27 km and 64%/30 km reuse the 60%/30 km explanation")
+
+    # Failures are not cached
+    fake.error = RuntimeError("quota exceeded")
+    recommender.recommend_station(90, 12, scorer)
+    fake.error = None
+    before = len(calls)
+    answer = recommender.recommend_station(90, 12, scorer)[1]
+    if len(calls) != before + 1 or not answer.startswith("Go to"):
+        print("✗ A failed call was cached")
+        failures += 1
+    else:
+        print("✓ A failed call falls back and is retried on the next request")
+
+    # Realistic burst
+    inputs = [(rnd.randint(20, 100), rnd.randint(5, 60)) for _ in range(REQUESTS)]
+    before = len(calls)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(lambda bd: recommender.recommend_station(bd[0], bd[1], scorer), inputs))
+    elapsed = time.perf_counter() - start
+    uncached = REQUESTS * LATENCY / THREADS
+
+    stats = recommender.explanation_cache_stats()
+    print(f"\n{REQUESTS} requests from {THREADS} threads: {len(calls) - before} Gemini calls, "
+          f"{elapsed:.2f} s (about {uncached:.1f} s uncached)")
+    print(f"hit rate {stats['hit_rate']:.0%}, {stats['shared']} requests shared an in-flight call, "
+          f"avg call {stats['avg_compute_ms']:.0f} ms, ~{stats['saved_seconds']:.0f} s of calls saved")
+
+    if failures:
+        sys.exit(1)
+    print("\n✓ Explanations are cached and deduplicated")
+
+
+if __name__ == "__main__":
+    main()
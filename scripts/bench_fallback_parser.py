@@ -0,0 +1,173 @@
+"""
+Benchmark: rule-table fallback parser vs the original keyword scans.
+
+Runs a corpus of hand-written queries (edge cases included: keywords
+inside other words, overlapping keywords, miles vs km, Unicode digits)
+plus randomly generated ones through both parsers:
+
+- original: the previous _parse_fallback_query, kept verbatim below
+- rules: ai.nl_query._parse_fallback_query (FALLBACK_RULES and one
+  precompiled number scan)
+
+Fails if any query parses differently, then reports queries/second.
+
+Usage:
+    python scripts/bench_fallback_parser.py [generated queries] [repeats]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "parser.db"))
+sys.path.insert(0, ".")
+
+from ai.nl_query import _parse_fallback_query, _generate_explanation  # noqa: E402
+
+GENERATED = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+CORPUS = [
+    "Cheapest station near me",
+    "Find me a green station with fast charging within 10km",
+    "Eco-friendly chargers under 200",
+    "eco friendly chargers under 200 rupees",
+    "cheap charging under ₹15 within 5 km",
+    "budget station 12 rs",
+    "affordable 9rs 3 miles",
+    "fast charger 20 kilometers away",
+    "quick charge within 4 mile",
+    "renewable energy station, price below 300 rupee",
+    "clean energy 7 km cost 11 rs",
+    "rapid speed charging",
+    "inexpensive fast green charging 2 km 8 rupees",
+    "economy parking",
+    "ecost station",
+    "cheaprice",
+    "green 5 miles but km",
+    "10 km 20 km",
+    "50 rupees 40 rupees cheap",
+    "price ₹ 25",
+    "station within ५ km",
+    "cheap ٣ rs",
+    "",
+    "   ",
+    "charging station",
+    "12345678901234567890 km",
+    "mile 3",
+    "3milestone",
+    "environment",
+    "speedy budget 7rs 2kilometer",
+    "GREEN FAST CHEAP 9 RS 4 KM",
+    "I need to charge my car near Connaught Place",
+    "where can I find a charger?",
+    "cost-effective, eco-conscious & rapid!",
+]
+
+WORDS = ["green", "eco", "cheap", "budget", "fast", "quick", "station", "near", "me",
+         "charging", "under", "within", "price", "clean", "rapid", "cost", "find",
+         "km", "kilometer", "kilometers", "mile", "miles", "rs", "rupees", "₹", "economy",
+         "speed", "renewable", "affordable", "inexpensive", "environment", "the", "a"]
+
+
+def original_parse(query):
+    """Fallback parser when Gemini API is unavailable"""
+
+    query_lower = query.lower()
+    filters = {
+        "green_score_min": None,
+        "green_score_max": None,
+        "price_min": None,
+        "price_max": None,
+        "max_distance": None,
+        "min_chargers": None,
+        "fast_charging": False,
+        "sort_by": "distance",
+        "intent": "balanced",
+        "query_method": "fallback"
+    }
+
+    # Green/Eco check
+    if any(word in query_lower for word in ["green", "eco", "environment", "renewable", "clean"]):
+        filters["green_score_min"] = 7
+        filters["sort_by"] = "green_score"
+        filters["intent"] = "greenest"
+
+    # Cheap/Budget check
+    if any(word in query_lower for word in ["cheap", "budget", "affordable", "inexpensive", "cost", "price"]):
+        filters["sort_by"] = "price"
+        filters["intent"] = "cheapest"
+        # Try to extract price
+        import re
+        price_match = re.search(r'(\d+)\s*(rupees?|rs|₹)', query_lower)
+        if price_match:
+            filters["price_max"] = int(price_match.group(1))
+
+    # Fast/Quick check
+    if any(word in query_lower for word in ["fast", "quick", "quick", "rapid", "speed"]):
+        filters["fast_charging"] = True
+        filters["sort_by"] = "availability"
+
+    # Distance check
+    import re
+    distance_match = re.search(r'(\d+)\s*(km|kilometer|mile)', query_lower)
+    if distance_match:
+        distance = int(distance_match.group(1))
+        filters["max_distance"] = distance if "km" in query_lower else distance * 1.6
+    else:
+        filters["max_distance"] = 10  # Default to 10km if not specified
+
+    filters["natural_explanation"] = _generate_explanation(query, filters)
+    return filters
+
+
+def generate(rnd):
+    """Random word soup with numbers, glued words and punctuation"""
+    parts = []
+    for _ in range(rnd.randint(1, 9)):
+        roll = rnd.random()
+        if roll < 0.2:
+            parts.append(str(rnd.randint(0, 500)))
+        elif roll < 0.3:
+            parts.append(rnd.choice(WORDS) + rnd.choice(WORDS))
+        else:
+            parts.append(rnd.choice(WORDS))
+    separators = [" ", " ", " ", "", ", ", "-", "  "]
+    query = parts[0]
+    for part in parts[1:]:
+        query += rnd.choice(separators) + part
+    return query.upper() if rnd.random() < 0.1 else query
+
+
+def throughput(parse, queries):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for query in queries:
+            parse(query)
+    return REPEATS * len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    rnd = random.Random(18)
+    queries = CORPUS + [generate(rnd) for _ in range(GENERATED)]
+
+    mismatches = [q for q in queries if _parse_fallback_query(q) != original_parse(q)]
+    for query in mismatches[:10]:
+        print(f"✗ {query!r}\n    original: {original_parse(query)}\n    rules:    {_parse_fallback_query(query)}")
+
+    original_qps = throughput(original_parse, queries)
+    rules_qps = throughput(_parse_fallback_query, queries)
+    print(f"{len(queries)} queries ({len(CORPUS)} hand-written), {REPEATS} runs each\n")
+    print(f"original: {original_qps:10,.0f} queries/s")
+    print(f"rules:    {rules_qps:10,.0f} queries/s  ({rules_qps / original_qps:.1f}x)")
+
+    if mismatches:
+        print(f"\n✗ {len(mismatches)} queries parse differently")
+        sys.exit(1)
+    print("\n✓ Rule table parses every query exactly like the original parser")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark: grid spatial index vs the linear nearby-station scan.
+
+Seeds a scratch database with N approved stations spread over India
+(clustered around cities, like a real network), then for random query
+points compares:
+
+- linear: fetch every approved station and run the scalar haversine on
+  each row, as search_stations_by_location used to
+- indexed: ai.geo_index radius query (cell lookup, bounding-box
+  prefilter, exact haversine on candidates) and k-nearest query
+
+and fails if the indexed results differ from the linear ones.
+
+Usage:
+    python scripts/bench_geo_index.py [stations] [queries]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "geo.db"))
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db  # noqa: E402
+from ai.map_utils import calculate_distance  # noqa: E402
+from ai.geo_index import get_geo_index  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+RADII = [5, 10, 25, 100]
+K = 10
+CITIES = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (13.08, 80.27),
+          (22.57, 88.36), (17.39, 78.49), (18.52, 73.86), (23.02, 72.57)]
+
+
+def seed(rnd):
+    rows = []
+    for i in range(N):
+        if rnd.random() < 0.7:
+            lat, lng = rnd.choice(CITIES)
+            lat, lng = lat + rnd.gauss(0, 0.3), lng + rnd.gauss(0, 0.3)
+        else:
+            lat, lng = rnd.uniform(8, 35), rnd.uniform(68, 97)
+        rows.append((f"Station {i}", "Area", rnd.randint(1, 12), 10.0, rnd.randint(1, 10), lat, lng))
+    conn = get_db()
+    conn.executemany("""
+        INSERT INTO stations (name, location, chargers, price, green_score, approved, lat, lng)
+        VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def linear_all(lat, lng):
+    """(distance, id) for every station, the old way"""
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT id, lat, lng FROM stations
+        WHERE approved = 1 AND lat IS NOT NULL AND lng IS NOT NULL
+    """).fetchall()
+    conn.close()
+    return [(calculate_distance(lat, lng, s_lat, s_lng), station_id)
+            for station_id, s_lat, s_lng in rows]
+
+
+def linear_within(lat, lng, radius):
+    found = [(d, i) for d, i in linear_all(lat, lng) if d <= radius]
+    found.sort()
+    return found
+
+
+def main():
+    rnd = random.Random(3)
+    init_db()
+    seed(rnd)
+
+    start = time.perf_counter()
+    index = get_geo_index()
+    print(f"{N} stations, index built in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({len(index.cells)} cells)\n")
+
+    points = []
+    for _ in range(QUERIES):
+        lat, lng = rnd.choice(CITIES)
+        points.append((lat + rnd.gauss(0, 0.2), lng + rnd.gauss(0, 0.2)))
+
+    mismatches = 0
+    for radius in RADII:
+        linear_time = indexed_time = 0.0
+        results = 0
+        for lat, lng in points:
+            start = time.perf_counter()
+            expected = linear_within(lat, lng, radius)
+            linear_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = index.within(lat, lng, radius)
+            indexed_time += time.perf_counter() - start
+
+            results += len(found)
+            if [i for _, i in expected] != [s["id"] for _, s in found]:
+                mismatches += 1
+        print(f"radius {radius:3d} km: linear {linear_time / QUERIES * 1000:7.2f} ms   "
+              f"indexed {indexed_time / QUERIES * 1000:6.3f} ms   "
+              f"({results / QUERIES:.0f} stations/query, {linear_time / indexed_time:.0f}x)")
+
+    linear_time = indexed_time = 0.0
+    for lat, lng in points:
+        start = time.perf_counter()
+        expected = sorted(linear_all(lat, lng))[:K]
+        linear_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = index.nearest(lat, lng, K)
+        indexed_time += time.perf_counter() - start
+
+        if [i for _, i in expected] != [s["id"] for _, s in found]:
+            mismatches += 1
+    print(f"{K}-nearest:     linear {linear_time / QUERIES * 1000:7.2f} ms   "
+          f"indexed {indexed_time / QUERIES * 1000:6.3f} ms   ({linear_time / indexed_time:.0f}x)")
+
+    if mismatches:
+        print(f"\n✗ {mismatches} queries returned different stations than the linear scan")
+        sys.exit(1)
+    print("\n✓ Indexed queries match the linear scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Accuracy and throughput check for the batched distance API in
+ai/map_utils (haversine_distances, distance_matrix).
+
+Compares every vectorized result with the scalar calculate_distance on
+random points (including antipodal and identical pairs) and fails if
+any differs by more than TOLERANCE_KM; then times the scalar loop, the
+one-origin batch and the origins x stations matrix.
+
+Usage:
+    python scripts/bench_haversine.py [stations] [origins]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, ".")
+
+from ai.map_utils import calculate_distance, distance_matrix, haversine_distances  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+ORIGINS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+TOLERANCE_KM = 1e-6
+
+
+def main():
+    rnd = random.Random(11)
+    lats = [rnd.uniform(-90, 90) for _ in range(N)]
+    lngs = [rnd.uniform(-180, 180) for _ in range(N)]
+    # Edge cases: same point, antipode, poles, antimeridian
+    lats[:4] = [10.0, -10.0, 90.0, 0.0]
+    lngs[:4] = [20.0, -160.0, 0.0, 179.9999]
+    origin = (10.0, 20.0)
+    origins = [(rnd.uniform(-90, 90), rnd.uniform(-180, 180)) for _ in range(ORIGINS)]
+
+    # ===============================
+    # ACCURACY
+    # ===============================
+    start = time.perf_counter()
+    scalar = [calculate_distance(origin[0], origin[1], la, ln) for la, ln in zip(lats, lngs)]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = haversine_distances(origin[0], origin[1], lats, lngs)
+    batch_time = time.perf_counter() - start
+
+    batch_error = float(np.max(np.abs(batch - np.array(scalar))))
+
+    sample = rnd.sample(range(N), 2000)
+    matrix = distance_matrix([o[0] for o in origins], [o[1] for o in origins],
+                             [lats[j] for j in sample], [lngs[j] for j in sample])
+    matrix_error = max(
+        abs(matrix[i, c] - calculate_distance(o[0], o[1], lats[j], lngs[j]))
+        for i, o in enumerate(origins[:20]) for c, j in enumerate(sample)
+    )
+    print(f"Max error vs calculate_distance: batch {batch_error:.2e} km, matrix {matrix_error:.2e} km")
+
+    # ===============================
+    # THROUGHPUT
+    # ===============================
+    start = time.perf_counter()
+    full = distance_matrix([o[0] for o in origins], [o[1] for o in origins], lats, lngs)
+    matrix_time = time.perf_counter() - start
+
+    print(f"\n1 origin x {N} stations:")
+    print(f"  scalar loop  {scalar_time * 1000:8.1f} ms  ({N / scalar_time / 1e6:6.2f} M distances/s)")
+    print(f"  batch        {batch_time * 1000:8.1f} ms  ({N / batch_time / 1e6:6.2f} M distances/s, "
+          f"{scalar_time / batch_time:.0f}x)")
+    print(f"{ORIGINS} origins x {N} stations matrix {full.shape}:")
+    print(f"  matrix       {matrix_time * 1000:8.1f} ms  ({full.size / matrix_time / 1e6:6.2f} M distances/s)")
+
+    if batch_error > TOLERANCE_KM or matrix_error > TOLERANCE_KM:
+        print(f"\n✗ Vectorized distances differ from the scalar function by more than {TOLERANCE_KM} km")
+        sys.exit(1)
+    print("\n✓ Vectorized distances match calculate_distance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark: clustered viewport tiles vs embedding every station in the map page.
+
+Seeds a scratch database with N approved stations spread over India
+(clustered around cities), then compares:
+
+- full: every station serialized as JSON, as the default map_search page
+  used to embed them
+- tiles: the clusters/stations for typical viewports from ai.map_tiles,
+  per zoom level
+
+and checks that:
+
+- every station is counted exactly once per zoom level
+- high-zoom tiles list exactly the stations inside them
+- a grid grown incrementally (station approvals) matches a fresh build,
+  and a rebuild keeps every tile's ETag unless its content changed
+- the app's grid is rebuilt only when the stations counter moves, in the
+  background while the current grid keeps serving
+
+Usage:
+    python scripts/bench_map_tiles.py [stations]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "tiles.db"))
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db  # noqa: E402
+from ai.map_utils import get_all_stations_with_location  # noqa: E402
+from ai.map_tiles import (  # noqa: E402
+    ClusterGrid, get_cluster_grid, viewport_tiles, tile_degrees, tile_etag,
+    CLUSTER_MAX_ZOOM, VERSION_CHECK_SECONDS
+)
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+CITIES = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (13.08, 80.27),
+          (22.57, 88.36), (17.39, 78.49), (18.52, 73.86), (23.02, 72.57)]
+# Roughly what a 1000x500 px map shows at each zoom
+VIEWPORT_DEGREES = {zoom: (1000 / 256 * 360 / 2 ** zoom, 500 / 256 * 360 / 2 ** zoom)
+                    for zoom in (5, 8, 11, 14, 17)}
+
+
+def seed(rnd):
+    rows = []
+    for i in range(N):
+        if rnd.random() < 0.7:
+            lat, lng = rnd.choice(CITIES)
+            lat, lng = lat + rnd.gauss(0, 0.3), lng + rnd.gauss(0, 0.3)
+        else:
+            lat, lng = rnd.uniform(8, 35), rnd.uniform(68, 97)
+        rows.append((f"Station {i}", "Area", rnd.randint(1, 12),
+                     round(rnd.uniform(6, 20), 1), rnd.randint(1, 10), lat, lng))
+    conn = get_db()
+    conn.executemany("""
+        INSERT INTO stations (name, location, chargers, price, green_score, approved, lat, lng)
+        VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def tile_counts(grid, zoom):
+    """Stations counted across every non-empty tile of a zoom level"""
+    tiles = {key[1:] for key in grid.versions if key[0] == zoom}
+    return sum(sum(c["count"] for c in grid.tile(zoom, x, y)["clusters"])
+               + len(grid.tile(zoom, x, y)["stations"]) for x, y in tiles)
+
+
+def main():
+    rnd = random.Random(5)
+    init_db()
+    seed(rnd)
+    failures = 0
+
+    start = time.perf_counter()
+    full = json.dumps(get_all_stations_with_location())
+    full_time = time.perf_counter() - start
+    print(f"{N} stations, full page payload {len(full) / 1024:.0f} KiB "
+          f"in {full_time * 1000:.0f} ms\n")
+
+    start = time.perf_counter()
+    grid = get_cluster_grid()
+    print(f"Cluster grid built in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({CLUSTER_MAX_ZOOM + 1} levels, {len(grid.versions)} tiles)\n")
+
+    for zoom, (width, height) in VIEWPORT_DEGREES.items():
+        payload = 0
+        markers = 0
+        elapsed = 0.0
+        for _ in range(20):
+            lat, lng = rnd.choice(CITIES)
+            start = time.perf_counter()
+            tiles = viewport_tiles(lat - height / 2, lng - width / 2, lat + height / 2, lng + width / 2, zoom)
+            contents = [grid.tile(*t) for t in tiles]
+            elapsed += time.perf_counter() - start
+            payload += sum(len(json.dumps(c)) for c in contents)
+            markers += sum(len(c["clusters"]) + len(c["stations"]) for c in contents)
+        print(f"zoom {zoom:2d}: {payload / 20 / 1024:7.1f} KiB/viewport  "
+              f"{markers / 20:6.0f} markers  {elapsed / 20 * 1000:6.2f} ms")
+
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        counted = tile_counts(grid, zoom)
+        if counted != N:
+            print(f"✗ zoom {zoom} counts {counted} stations, expected {N}")
+            failures += 1
+
+    # High-zoom tiles: exactly the stations inside each tile
+    by_id = {s["id"]: s for cell in grid.cell_stations.values() for s in cell}
+    for zoom in (CLUSTER_MAX_ZOOM + 1, 15, 18):
+        size = tile_degrees(zoom)
+        for station in rnd.sample(list(by_id.values()), 200):
+            x, y = int((station["lng"] + 180) // size), int((station["lat"] + 90) // size)
+            listed = {s["id"] for s in grid.tile(zoom, x, y)["stations"]}
+            west, south = x * size - 180, y * size - 90
+            inside = {s["id"] for s in by_id.values()
+                      if south <= s["lat"] < south + size and west <= s["lng"] < west + size}
+            if listed != inside:
+                print(f"✗ zoom {zoom} tile {x}/{y} lists {len(listed)} stations, expected {len(inside)}")
+                failures += 1
+                break
+
+    # Incremental approvals vs a fresh build
+    stations = sorted(by_id.values(), key=lambda s: s["id"])
+    grown = ClusterGrid(stations[:-100])
+    before = dict(grown.versions)
+    start = time.perf_counter()
+    for station in stations[-100:]:
+        grown.add(station)
+    add_time = (time.perf_counter() - start) / 100
+    fresh = ClusterGrid(stations)
+    touched = {key for key in grown.versions if grown.versions[key] != before.get(key)}
+    print(f"\nIncremental add: {add_time * 1000:.3f} ms/station, "
+          f"{len(touched)} of {len(grown.versions)} tiles changed for 100 stations")
+    if any(grown.tile(*key) != fresh.tile(*key) for key in fresh.versions):
+        print("✗ Incrementally grown grid differs from a fresh build")
+        failures += 1
+
+    # A rebuild from the same stations must not change any ETag
+    rebuilt = ClusterGrid(stations)
+    changed = sum(tile_etag(fresh.tile(*key)) != tile_etag(rebuilt.tile(*key)) for key in fresh.versions)
+    ok = changed == 0
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} rebuild kept {len(fresh.versions) - changed}/{len(fresh.versions)} tile ETags")
+
+    # The app's grid: no rebuild while the stations counter stands still,
+    # a background rebuild (callers not blocked) once it moves
+    time.sleep(VERSION_CHECK_SECONDS * 1.5)
+    unchanged = get_cluster_grid() is grid
+    conn = get_db()
+    conn.execute("""
+        INSERT INTO stations (name, location, chargers, price, green_score, approved, lat, lng)
+        VALUES ('Station new', 'Area', 4, 10, 9, 1, 20.0, 80.0)
+    """)
+    conn.commit()
+    conn.close()
+    time.sleep(VERSION_CHECK_SECONDS * 1.5)
+    start = time.perf_counter()
+    served = get_cluster_grid()
+    call_ms = (time.perf_counter() - start) * 1000
+    deadline = time.monotonic() + 30
+    while get_cluster_grid() is grid and time.monotonic() < deadline:
+        time.sleep(0.05)
+    rebuilt = get_cluster_grid()
+    ok = unchanged and served is grid and rebuilt is not grid and rebuilt.total == N + 1
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} grid kept while unchanged, rebuilt in the background after a new "
+          f"station (call took {call_ms:.1f} ms, {rebuilt.total} stations)")
+
+    if failures:
+        sys.exit(1)
+    print("\n✓ Tiles count every station once, incremental updates match a rebuild and ETags survive it")
+
+
+if __name__ == "__main__":
+    main()
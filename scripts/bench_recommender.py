@@ -0,0 +1,77 @@
+"""
+Benchmark: vectorized station scoring vs the original per-station loop.
+
+Builds N synthetic stations, runs the original recommend_station loop
+(score every tuple in Python, full sort) and ai.scoring.StationScorer
+(one vectorized pass, argpartition top-k) for several battery/distance
+inputs, checks both pick the same stations and reports timings.
+
+Usage:
+    python scripts/bench_recommender.py [stations] [repeats]
+"""
+import random
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from ai.scoring import StationScorer  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+CASES = [(80, 40), (50, 50), (30, 60), (100, 10)]
+
+
+def legacy_top(battery, distance, stations, k=5):
+    """The original recommend_station selection loop"""
+    reachable_stations = []
+    max_distance = battery * 1
+    for s in stations:
+        name, location, chargers, price, green_score = s
+        if max_distance >= distance:
+            score = (green_score * 2) - price
+            reachable_stations.append((score, s))
+    reachable_stations.sort(reverse=True, key=lambda x: x[0])
+    return reachable_stations[:k]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(*args)
+    return (time.perf_counter() - start) / REPEATS, result
+
+
+def main():
+    rnd = random.Random(7)
+    rows = [(f"Station {i}", f"Area {i % 500}", rnd.randint(1, 12),
+             round(rnd.uniform(7, 15), 2), rnd.randint(1, 10))
+            for i in range(N)]
+
+    start = time.perf_counter()
+    scorer = StationScorer(rows)
+    build = time.perf_counter() - start
+    print(f"{N} stations, column store built in {build * 1000:.1f} ms\n")
+
+    mismatches = 0
+    total_legacy = total_vector = 0.0
+    for battery, distance in CASES:
+        legacy_time, legacy = timed(legacy_top, battery, distance, rows)
+        vector_time, vector = timed(scorer.top_k, battery, distance)
+        total_legacy += legacy_time
+        total_vector += vector_time
+        same = [r for _, r in legacy] == [r for _, r in vector]
+        mismatches += not same
+        print(f"battery={battery:3d} distance={distance:3d}  "
+              f"loop {legacy_time * 1000:8.2f} ms   vectorized {vector_time * 1000:7.2f} ms   "
+              f"{'same' if same else 'DIFFERENT'} top-5")
+
+    print(f"\nSpeed-up: {total_legacy / total_vector:.1f}x")
+    if mismatches:
+        print(f"✗ {mismatches} cases picked different stations")
+        sys.exit(1)
+    print("✓ Vectorized scorer matches the original ranking")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Benchmark: station analytics from the hourly rollup vs the four separate reports.
+
+Seeds a scratch database with one busy station holding N charging
+sessions spread over the last 120 days (plus a few quieter stations),
+then builds the station analytics page both ways:
+
+- legacy: get_peak_hours, get_station_demand_forecast, get_price_trend
+  and get_station_efficiency_metrics as they were (kept below) - four connections, two scans of the window, a Python
+  datetime.fromisoformat per session
+- rollup: ai.analytics.get_all_analytics_summary - one station lookup
+  and one read of at most 1440 station_hourly_stats rows
+
+and fails if the two summaries differ. Two reports were redefined since
+and the legacy reference below follows them: efficiency covers the last
+30 days (as its total_sessions_30d key always said) instead of all
+history, and the historical price is revenue / units, which the hourly
+rollup can give, instead of the mean of each session's price. The demand
+forecast now comes from the fitted model in ai/forecast.py (see
+scripts/bench_demand_forecast.py), so only its length is checked here.
+
+Usage:
+    python scripts/bench_station_analytics.py [sessions] [repeats]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "analytics.db"))
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db  # noqa: E402
+from ai.analytics import get_all_analytics_summary  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+STATION = "Bench Hub"
+COMPARED = ("peak_hours", "price_trend", "efficiency")
+
+
+# ===============================
+# LEGACY REPORTS (as redefined, see above)
+# ===============================
+def legacy_peak_hours(station_name):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        cur.execute("""
+            SELECT started_at FROM charging_sessions
+            WHERE station_id = (SELECT id FROM stations WHERE name = ? ORDER BY id LIMIT 1)
+              AND started_at > ?
+        """, (station_name, thirty_days_ago))
+        sessions = cur.fetchall()
+        hour_counts = [0] * 24
+        for session in sessions:
+            if session[0]:
+                try:
+                    hour = datetime.fromisoformat(session[0]).hour
+                    hour_counts[hour] += 1
+                except Exception:
+                    pass
+        total = sum(hour_counts)
+        if total == 0:
+            return None
+        hours_data = []
+        for hour, count in enumerate(hour_counts):
+            intensity = min(10, int((count / max(hour_counts)) * 10)) if max(hour_counts) > 0 else 0
+            hours_data.append({
+                "hour": f"{hour:02d}:00",
+                "count": count,
+                "intensity": intensity,
+                "is_peak": count > (total / 12)
+            })
+        return hours_data
+    finally:
+        conn.close()
+
+
+def legacy_demand_forecast(station_name, days_ahead=7):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        sixty_days_ago = (datetime.now() - timedelta(days=60)).isoformat()
+        cur.execute("""
+            SELECT started_at FROM charging_sessions
+            WHERE station_id = (SELECT id FROM stations WHERE name = ? ORDER BY id LIMIT 1)
+              AND started_at > ?
+        """, (station_name, sixty_days_ago))
+        sessions = cur.fetchall()
+        weekday_counts = [0] * 7
+        for session in sessions:
+            if session[0]:
+                try:
+                    dt = datetime.fromisoformat(session[0])
+                    weekday_counts[dt.weekday()] += 1
+                except Exception:
+                    pass
+        forecast = []
+        today = datetime.now()
+        for i in range(days_ahead):
+            future_date = today + timedelta(days=i)
+            demand = weekday_counts[future_date.weekday()]
+            forecast.append({
+                "date": future_date.strftime("%Y-%m-%d"),
+                "day": future_date.strftime("%A"),
+                "expected_sessions": demand,
+                "confidence": "high" if demand > 5 else "medium" if demand > 0 else "low"
+            })
+        return forecast
+    finally:
+        conn.close()
+
+
+def legacy_price_trend(station_name):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, price FROM stations WHERE name = ? ORDER BY id LIMIT 1", (station_name,))
+        result = cur.fetchone()
+        if not result:
+            return None
+        station_id, current_price = result
+        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        cur.execute("""
+            SELECT SUM(amount)/SUM(units) as avg_price
+            FROM charging_sessions
+            WHERE station_id = ? AND started_at > ? AND units > 0
+        """, (station_id, thirty_days_ago))
+        hist_result = cur.fetchone()
+        historical_avg = hist_result[0] if hist_result and hist_result[0] else current_price
+        trend = "stable"
+        if current_price > historical_avg * 1.1:
+            trend = "increasing"
+        elif current_price < historical_avg * 0.9:
+            trend = "decreasing"
+        return {
+            "current_price": round(current_price, 2),
+            "historical_avg": round(historical_avg, 2),
+            "trend": trend,
+            "recommendation": "Consider charging soon - prices are low!" if trend == "decreasing" else "Prices may increase soon" if trend == "increasing" else "Prices are stable"
+        }
+    finally:
+        conn.close()
+
+
+def legacy_efficiency(station_name):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, chargers, green_score FROM stations WHERE name = ? ORDER BY id LIMIT 1",
+                    (station_name,))
+        station_info = cur.fetchone()
+        if not station_info:
+            return None
+        station_id, chargers, green_score = station_info
+        thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
+        cur.execute("""
+            SELECT AVG(duration_minutes) as avg_duration, COUNT(*) as total_sessions
+            FROM charging_sessions
+            WHERE station_id = ? AND duration_minutes IS NOT NULL AND started_at > ?
+        """, (station_id, thirty_days_ago))
+        result = cur.fetchone()
+        avg_duration = result[0] if result and result[0] else 0
+        total_sessions = result[1] if result and result[1] else 0
+        return {
+            "avg_charging_time_minutes": round(avg_duration, 1) if avg_duration > 0 else "N/A",
+            "total_sessions_30d": total_sessions,
+            "available_chargers": chargers,
+            "green_score": green_score,
+            "efficiency_rating": "Excellent" if avg_duration < 60 and green_score >= 8 else "Good" if avg_duration < 90 and green_score >= 6 else "Standard",
+            "recommendation": "Fast and eco-friendly!" if avg_duration < 60 and green_score >= 8 else "Reliable option" if total_sessions > 50 else "Growing station"
+        }
+    finally:
+        conn.close()
+
+
+def legacy_summary(station_name):
+    return {
+        "peak_hours": legacy_peak_hours(station_name),
+        "demand_forecast": legacy_demand_forecast(station_name),
+        "price_trend": legacy_price_trend(station_name),
+        "efficiency": legacy_efficiency(station_name)
+    }
+
+
+# ===============================
+# BENCHMARK
+# ===============================
+def seed(rnd):
+    conn = get_db()
+    cur = conn.cursor()
+    stations = [(STATION, 6, 11.5, 8)] + [(f"Quiet {i}", 2, 9.0, 5) for i in range(5)]
+    cur.executemany("INSERT INTO stations (name, location, chargers, price, green_score, approved) "
+                    "VALUES (?, 'Area', ?, ?, ?, 1)", stations)
+    cur.execute("SELECT id FROM stations WHERE name IN (?, ?) ORDER BY id", (STATION, "Quiet 0"))
+    busy_id, quiet_id = [r[0] for r in cur.fetchall()]
+    conn.commit()
+
+    now = datetime.utcnow()
+    batch = []
+    for i in range(N + N // 10):
+        station_id = busy_id if i < N else quiet_id
+        # Busier in the evening, spread over 120 days
+        started = now - timedelta(days=rnd.random() * 120,
+                                  hours=rnd.choice((0, 0, 2, 5, 9)) * rnd.random())
+        units = rnd.choice((0, 5, 10.5, 20, 32.25))
+        amount = round(units * rnd.uniform(8, 14), 2) if rnd.random() < 0.9 else int(units) * 11
+        duration = rnd.randint(15, 150) if rnd.random() < 0.8 else None
+        batch.append((station_id, STATION, units, amount, "Completed",
+                      started.strftime("%Y-%m-%d %H:%M:%S"), duration))
+        if len(batch) == 100000:
+            cur.executemany("""
+                INSERT INTO charging_sessions
+                (station_id, station_name, units, amount, status, started_at, duration_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        cur.executemany("""
+            INSERT INTO charging_sessions
+            (station_id, station_name, units, amount, status, started_at, duration_minutes)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, batch)
+    conn.commit()
+    cur.execute("ANALYZE")
+    conn.close()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(*args)
+    return (time.perf_counter() - start) / REPEATS, result
+
+
+def main():
+    rnd = random.Random(21)
+    init_db()
+    start = time.perf_counter()
+    seed(rnd)
+    print(f"Seeded {N} sessions for {STATION!r} in {time.perf_counter() - start:.0f} s\n")
+
+    failures = 0
+    for station in (STATION, "Quiet 0", "Quiet 3", "No Such Station"):
+        legacy_time, expected = timed(legacy_summary, station)
+        rollup_time, found = timed(get_all_analytics_summary, station)
+        same = (all(expected[key] == found[key] for key in COMPARED)
+                and len(found["demand_forecast"]) == len(expected["demand_forecast"]))
+        failures += not same
+        print(f"{'✓' if same else '✗'} {station:16s} legacy {legacy_time * 1000:8.1f} ms   "
+              f"rollup {rollup_time * 1000:7.1f} ms   ({legacy_time / rollup_time:.1f}x)")
+        if not same:
+            for key in COMPARED:
+                if expected[key] != found[key]:
+                    print(f"    {key}: legacy {expected[key]}\n    {' ' * len(key)}  single {found[key]}")
+
+    if failures:
+        print(f"\n✗ {failures} summaries differ from the legacy reports")
+        sys.exit(1)
+    print("\n✓ Rollup summaries match the legacy reports")
+
+
+if __name__ == "__main__":
+    main()
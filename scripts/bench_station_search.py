@@ -0,0 +1,161 @@
+"""
+Benchmark: station filters in SQL vs loading every station into Python.
+
+Seeds a scratch database with N stations (90% approved, most with
+coordinates) and runs the map_search filter form and parsed natural
+language filters both ways:
+
+- python: fetch every approved station, filter with list comprehensions
+  and sort in Python, as map_search and nl_search used to
+- sql: models.station.search_stations, one indexed query per page
+  (including distance sorting and the combined "rank" ordering)
+
+and fails if the first page or the total differ.
+
+Usage:
+    python scripts/bench_station_search.py [stations] [repeats]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "search.db"))
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db  # noqa: E402
+from models.station import search_stations  # noqa: E402
+from ai.map_utils import haversine_distances  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+PER_PAGE = 50
+CITIES = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (13.08, 80.27)]
+
+NEAREST = {"green_score": 0.5, "price": -0.5, "distance": -1.0}
+
+# (label, filters, origin, sort_by[, rank weights])
+CASES = [
+    ("map filter: green 6+, <= ₹15, 2+ chargers",
+     {"green_score_min": 6, "price_max": 15.0, "min_chargers": 2}, None, None),
+    ("map filter + position (nearest first)",
+     {"green_score_min": 6, "price_max": 15.0, "min_chargers": 0}, (28.61, 77.21), "distance"),
+    ("nl: greenest",
+     {"green_score_min": 7}, None, "green_score"),
+    ("nl: cheapest under ₹9",
+     {"price_max": 9}, None, "price"),
+    ("nl: green within 10 km",
+     {"green_score_min": 7, "max_distance": 10}, (19.08, 72.88), "green_score"),
+    ("nl: near me, combined ranking",
+     {"max_distance": 10}, (12.97, 77.59), "rank", NEAREST),
+    ("nl: nearest within 25 km",
+     {"max_distance": 25}, (13.08, 80.27), "distance"),
+]
+
+
+def seed(rnd):
+    rows = []
+    for i in range(N):
+        if rnd.random() < 0.9:
+            lat, lng = rnd.choice(CITIES)
+            lat, lng = lat + rnd.gauss(0, 0.3), lng + rnd.gauss(0, 0.3)
+        else:
+            lat = lng = None
+        rows.append((f"Station {i}", "Area", rnd.randint(1, 12), round(rnd.uniform(6, 20), 1),
+                     rnd.randint(1, 10), 1 if rnd.random() < 0.9 else 0, lat, lng))
+    conn = get_db()
+    conn.executemany("""
+        INSERT INTO stations (name, location, chargers, price, green_score, approved, lat, lng)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def python_search(filters, origin, sort_by, weights=None):
+    """The old way: everything into Python, filter, then sort"""
+    conn = get_db()
+    stations = conn.execute("""
+        SELECT name, location, chargers, price, green_score, id, lat, lng
+        FROM stations WHERE approved = 1 ORDER BY id
+    """).fetchall()
+    conn.close()
+
+    if origin and filters.get("max_distance"):
+        distances = haversine_distances(
+            origin[0], origin[1],
+            [s[6] if s[6] is not None else float("nan") for s in stations],
+            [s[7] if s[7] is not None else float("nan") for s in stations]
+        )
+        stations = [s for s, d in zip(stations, distances) if d <= filters["max_distance"]]
+    if filters.get("green_score_min") is not None:
+        stations = [s for s in stations if s[4] >= filters["green_score_min"]]
+    if filters.get("price_max") is not None:
+        stations = [s for s in stations if s[3] <= filters["price_max"]]
+    if filters.get("min_chargers") is not None:
+        stations = [s for s in stations if s[2] >= filters["min_chargers"]]
+
+    if sort_by == "green_score":
+        stations.sort(key=lambda s: s[4], reverse=True)
+    elif sort_by == "price":
+        stations.sort(key=lambda s: s[3])
+    elif sort_by in ("distance", "rank") and origin:
+        located = [s for s in stations if s[6] is not None]
+        distances = haversine_distances(origin[0], origin[1], [s[6] for s in located], [s[7] for s in located])
+        distance = {s[5]: float(d) for s, d in zip(located, distances)}
+        if sort_by == "distance":
+            stations.sort(key=lambda s: distance.get(s[5], float("inf")))
+        else:
+            stations.sort(key=lambda s: (
+                s[5] not in distance,
+                -(weights["green_score"] * s[4] + weights["price"] * s[3]
+                  + weights["distance"] * distance.get(s[5], 0.0))
+            ))
+    return stations
+
+
+def sql_search(filters, origin, sort_by, weights=None):
+    conn = get_db()
+    try:
+        return search_stations(conn.cursor(), filters, origin=origin, sort_by=sort_by,
+                               per_page=PER_PAGE, weights=weights)
+    finally:
+        conn.close()
+
+
+def main():
+    rnd = random.Random(11)
+    init_db()
+    seed(rnd)
+    print(f"{N} stations, first page of {PER_PAGE}, {REPEATS} runs each\n")
+
+    mismatches = 0
+    for label, filters, origin, sort_by, *weights in CASES:
+        weights = weights[0] if weights else None
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            expected = python_search(filters, origin, sort_by, weights)
+        python_time = (time.perf_counter() - start) / REPEATS
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            found = sql_search(filters, origin, sort_by, weights)
+        sql_time = (time.perf_counter() - start) / REPEATS
+
+        same = ([s[5] for s in expected[:PER_PAGE]] == [r[5] for r in found["rows"]]
+                and len(expected) == found["total"])
+        mismatches += not same
+        print(f"{'✓' if same else '✗'} {label:45s} python {python_time * 1000:7.1f} ms   "
+              f"sql {sql_time * 1000:6.1f} ms   ({found['total']} matches, "
+              f"{python_time / sql_time:.0f}x)")
+
+    if mismatches:
+        print(f"\n✗ {mismatches} searches differ from the Python filters")
+        sys.exit(1)
+    print("\n✓ SQL pages match the Python filters")
+
+
+if __name__ == "__main__":
+    main()
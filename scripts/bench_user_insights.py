@@ -0,0 +1,364 @@
+"""
+Benchmark: user insights page from one scan vs the four separate reports.
+
+Seeds a scratch database with USERS users holding SESSIONS charging
+sessions over the last 60 days, then builds get_user_insights_dashboard
+for every user both ways:
+
+- legacy: get_user_charging_statistics, get_user_eco_impact and
+  get_user_spending_insights as they were (kept below), each on its own
+  connection, and get_personalized_recommendations calling all three
+  again - 18 statements per page
+- consolidated: ai.insights - one grouped statement with conditional
+  sums for the spending windows plus the latest session, memoized on
+  flask.g for the rest of the request
+
+and fails if any dashboard differs or the new page runs more than two
+statements (also when the recommendations are asked for again in the
+same request). total_green_charges is now rounded to 2 decimals like the
+other totals, so the legacy reference below rounds it too, and a tie for
+the favourite station goes to the first name, which the legacy query
+left to the sort order.
+
+Usage:
+    python scripts/bench_user_insights.py [users] [sessions]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Never touch the real database; count statements per connection
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "insights.db"))
+os.environ.setdefault("EV_DB_COUNT_QUERIES", "1")
+sys.path.insert(0, ".")
+
+from app import app  # noqa: E402
+from models.db import get_db, get_pool_stats, init_db  # noqa: E402
+from ai.insights import (  # noqa: E402
+    _recommendations, get_personalized_recommendations, get_user_insights_dashboard
+)
+
+logger = logging.getLogger(__name__)
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+SESSIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+STATIONS = 40
+
+
+def seed(rng):
+    """Users, stations and completed/cancelled sessions spread over 60 days"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO users (name, email, password, role) VALUES (?, ?, 'x', 'user')",
+                    [(f"User {i}", f"user{i}@example.com") for i in range(USERS)])
+    cur.execute("SELECT id FROM users ORDER BY id")
+    users = [row[0] for row in cur.fetchall()]
+    cur.executemany("INSERT INTO stations (name, location, chargers, price, green_score, approved) "
+                    "VALUES (?, 'Area', 4, ?, ?, 1)",
+                    [(f"Station {i}", 8 + i % 9, 1 + i % 10) for i in range(STATIONS)])
+    cur.execute("SELECT id, name, price FROM stations ORDER BY id")
+    stations = cur.fetchall()
+    now = datetime.now()
+    rows = []
+    for _ in range(SESSIONS):
+        # Each user favours a few stations, so favourites and top lists are not ties
+        user = rng.choice(users)
+        station_id, name, price = stations[(user * 7 + int(rng.expovariate(0.4))) % STATIONS]
+        started = now - timedelta(seconds=rng.randrange(60 * 86400))
+        units = round(rng.uniform(5, 60), 2)
+        status = "Completed" if rng.random() < 0.85 else "Cancelled"
+        rows.append((user, station_id, name, units, round(units * price, 2),
+                     started.strftime("%Y-%m-%d %H:%M:%S"), status))
+    cur.executemany("""
+        INSERT INTO charging_sessions (user_id, station_id, station_name, units, amount, started_at, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return users
+
+
+# ===============================
+# LEGACY REPORTS (before the consolidated scan)
+# ===============================
+def legacy_statistics(user_id):
+    """Get comprehensive charging statistics for a user"""
+    conn = get_db()
+    cur = conn.cursor()
+    
+    try:
+        # Total sessions and kWh
+        cur.execute("""
+            SELECT COUNT(*) as total_sessions, SUM(units) as total_units, 
+                   SUM(amount) as total_spent
+            FROM charging_sessions 
+            WHERE user_id = ? AND status = 'Completed'
+        """, (user_id,))
+        
+        stats = cur.fetchone()
+        total_sessions = stats[0] if stats and stats[0] else 0
+        total_units = stats[1] if stats and stats[1] else 0
+        total_spent = stats[2] if stats and stats[2] else 0
+        
+        # Average per session
+        avg_per_session = (total_spent / total_sessions) if total_sessions > 0 else 0
+        avg_units_per_session = (total_units / total_sessions) if total_sessions > 0 else 0
+        
+        # Most used station
+        cur.execute("""
+            SELECT station_name, COUNT(*) as count
+            FROM charging_sessions 
+            WHERE user_id = ? AND status = 'Completed'
+            GROUP BY station_name
+            ORDER BY count DESC, station_name
+            LIMIT 1
+        """, (user_id,))
+        
+        fav_station = cur.fetchone()
+        
+        # Last charging session
+        cur.execute("""
+            SELECT started_at, units, amount, station_name, status
+            FROM charging_sessions 
+            WHERE user_id = ?
+            ORDER BY started_at DESC
+            LIMIT 1
+        """, (user_id,))
+        
+        last_session = cur.fetchone()
+        
+        return {
+            "total_sessions": total_sessions,
+            "total_units_charged": round(total_units, 2),
+            "total_spent": round(total_spent, 2),
+            "avg_per_session": round(avg_per_session, 2),
+            "avg_units_per_session": round(avg_units_per_session, 2),
+            "favorite_station": fav_station[0] if fav_station else "N/A",
+            "favorite_count": fav_station[1] if fav_station else 0,
+            "last_session": {
+                "date": last_session[0] if last_session and last_session[0] else "N/A",
+                "units": last_session[1] if last_session and last_session[1] else 0,
+                "amount": last_session[2] if last_session and last_session[2] else 0,
+                "station": last_session[3] if last_session and last_session[3] else "N/A",
+                "status": last_session[4] if last_session and last_session[4] else "N/A"
+            } if last_session else None
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting user stats: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def legacy_eco_impact(user_id):
+    """Calculate environmental impact of user's charging habits"""
+    conn = get_db()
+    cur = conn.cursor()
+    
+    try:
+        # Get total units and average green score
+        cur.execute("""
+            SELECT SUM(cs.units), AVG(s.green_score)
+            FROM charging_sessions cs
+            JOIN stations s ON cs.station_id = s.id
+            WHERE cs.user_id = ? AND cs.status = 'Completed'
+        """, (user_id,))
+        
+        result = cur.fetchone()
+        total_units = result[0] if result and result[0] else 0
+        avg_green_score = result[1] if result and result[1] else 0
+        
+        # Carbon footprint calculation
+        # Average EV charging: 0.4-0.6 kg CO2 per kWh (depends on grid source)
+        # High green score: 0.2 kg CO2 per kWh
+        # Low green score: 0.6 kg CO2 per kWh
+        
+        co2_factor = 0.2 + (10 - avg_green_score) * 0.04 if avg_green_score else 0.4
+        carbon_saved = total_units * co2_factor
+        
+        # Trees equivalent (1 tree absorbs ~20kg CO2/year)
+        trees_equivalent = carbon_saved / 20
+        
+        # Green charging percentage
+        green_percentage = avg_green_score * 10 if avg_green_score else 0
+        
+        return {
+            "total_green_charges": round(total_units, 2),
+            "avg_green_score": round(avg_green_score, 1),
+            "estimated_co2_emissions_kg": round(carbon_saved, 2),
+            "trees_equivalent": round(trees_equivalent, 1),
+            "eco_percentage": round(green_percentage, 1),
+            "eco_rating": "Excellent Eco-Warrior!" if avg_green_score >= 8 else "Good Green Citizen" if avg_green_score >= 6 else "Moderate" if avg_green_score >= 4 else "Standard",
+            "recommendation": "Amazing! Keep using green stations!" if avg_green_score >= 8 else "Try to choose higher-rated green stations when possible"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error calculating eco impact: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def legacy_spending(user_id):
+    """Analyze user spending patterns and savings opportunities"""
+    conn = get_db()
+    cur = conn.cursor()
+    
+    try:
+        # Spending by station
+        cur.execute("""
+            SELECT station_name, SUM(amount) as total, COUNT(*) as count, 
+                   AVG(amount) as avg_session
+            FROM charging_sessions 
+            WHERE user_id = ? AND status = 'Completed'
+            GROUP BY station_name
+            ORDER BY total DESC
+            LIMIT 5
+        """, (user_id,))
+        
+        spending_by_station = cur.fetchall()
+        
+        # Spending trends (last 7, 14, 30 days)
+        def get_spending_period(days):
+            date_threshold = (datetime.now() - timedelta(days=days)).isoformat()
+            cur.execute("""
+                SELECT SUM(amount), COUNT(*)
+                FROM charging_sessions 
+                WHERE user_id = ? AND status = 'Completed' AND started_at > ?
+            """, (user_id, date_threshold))
+            result = cur.fetchone()
+            return (result[0] if result and result[0] else 0, result[1] if result and result[1] else 0)
+        
+        spending_7d = get_spending_period(7)
+        spending_14d = get_spending_period(14)
+        spending_30d = get_spending_period(30)
+        
+        # Find cheapest station used
+        cur.execute("""
+            SELECT station_name, AVG(amount/units) as avg_price_per_unit
+            FROM charging_sessions 
+            WHERE user_id = ? AND status = 'Completed' AND units > 0
+            GROUP BY station_name
+            ORDER BY avg_price_per_unit ASC
+            LIMIT 1
+        """, (user_id,))
+        
+        cheapest = cur.fetchone()
+        
+        return {
+            "spending_last_7_days": {
+                "total": round(spending_7d[0], 2),
+                "sessions": spending_7d[1]
+            },
+            "spending_last_14_days": {
+                "total": round(spending_14d[0], 2),
+                "sessions": spending_14d[1]
+            },
+            "spending_last_30_days": {
+                "total": round(spending_30d[0], 2),
+                "sessions": spending_30d[1]
+            },
+            "top_stations": [
+                {
+                    "name": s[0],
+                    "total": round(s[1], 2),
+                    "sessions": s[2],
+                    "avg_per_session": round(s[3], 2)
+                }
+                for s in spending_by_station
+            ],
+            "cheapest_station": cheapest[0] if cheapest else "N/A",
+            "recommendation": f"Save money by charging at {cheapest[0]} more often!" if cheapest else "No spending data available yet"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error analyzing spending: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def legacy_dashboard(user_id):
+    """The dashboard as it was: recommendations recomputed all three reports"""
+    stats = legacy_statistics(user_id)
+    eco = legacy_eco_impact(user_id)
+    spending = legacy_spending(user_id)
+    recommendations = _recommendations(legacy_statistics(user_id), legacy_eco_impact(user_id),
+                                       legacy_spending(user_id))
+    return {
+        "statistics": stats,
+        "eco_impact": eco,
+        "spending": spending,
+        "recommendations": recommendations
+    }
+
+
+def counted(fn, user_ids):
+    """(results, seconds, statements per call) for fn over user_ids, one request each"""
+    # Warm up first: opening pooled connections runs PRAGMAs that are counted too
+    with app.app_context():
+        fn(user_ids[0])
+    results, counts = [], []
+    seconds = 0.0
+    for user_id in user_ids:
+        before = get_pool_stats()["queries"]
+        start = time.perf_counter()
+        with app.app_context():
+            results.append(fn(user_id))
+        seconds += time.perf_counter() - start
+        counts.append(get_pool_stats()["queries"] - before)
+    return results, seconds, counts
+
+
+def same(old, new):
+    """Equal, floats to within a cent (per-station sums are added in another order)"""
+    if isinstance(old, float) or isinstance(new, float):
+        return isinstance(new, (int, float)) and abs(old - new) <= 0.011
+    if isinstance(old, dict):
+        return isinstance(new, dict) and old.keys() == new.keys() and all(same(old[k], new[k]) for k in old)
+    if isinstance(old, list):
+        return isinstance(new, list) and len(old) == len(new) and all(map(same, old, new))
+    return old == new
+
+
+def page(user_id):
+    """The insights page plus a second recommendations call in the same request"""
+    dashboard = get_user_insights_dashboard(user_id)
+    assert get_personalized_recommendations(user_id) == dashboard["recommendations"]
+    return dashboard
+
+
+def main():
+    init_db()
+    users = seed(random.Random(25))
+    print(f"{len(users)} users, {SESSIONS} sessions\n")
+    failures = 0
+
+    expected, legacy_time, legacy_counts = counted(legacy_dashboard, users)
+    actual, new_time, new_counts = counted(page, users)
+
+    for name, seconds, counts in (("legacy", legacy_time, legacy_counts),
+                                  ("consolidated", new_time, new_counts)):
+        print(f"{name:13} {seconds / len(users) * 1000:6.2f} ms   {sum(counts) / len(users):4.1f} statements per page "
+              f"(max {max(counts)})")
+
+    differ = [user for user, old, new in zip(users, expected, actual) if not same(old, new)]
+    failures += bool(differ)
+    print(f"\n{'✓' if not differ else '✗'} {len(users) - len(differ)}/{len(users)} dashboards match the legacy reports"
+          + (f" (first mismatch: user {differ[0]})" if differ else ""))
+    ok = max(new_counts) <= 2
+    failures += not ok
+    print(f"{'✓' if ok else '✗'} at most two statements per request "
+          f"({sum(legacy_counts) / sum(new_counts):.0f}x fewer than before)")
+
+    if failures:
+        sys.exit(1)
+    print(f"\n✓ Insights page {legacy_time / new_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
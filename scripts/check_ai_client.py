@@ -0,0 +1,122 @@
+"""
+Check the shared Gemini client (ai/client.py) against a local fake.
+
+- the chatbot, the recommender and natural language search all go
+  through the one shared client
+- a call slower than its deadline returns the fallback answer within
+  the deadline
+- with a hanging LLM, at most AI_MAX_CONCURRENT calls are in flight; the
+  other requests get their fallback after AI_QUEUE_TIMEOUT instead of
+  tying up their threads
+- latency histograms count every call
+
+Usage:
+    python scripts/check_ai_client.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Never touch the real database; small limits keep the run short
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "client.db"))
+os.environ.setdefault("EV_AI_TIMEOUT", "0.5")
+os.environ.setdefault("EV_AI_MAX_CONCURRENT", "3")
+os.environ.setdefault("EV_AI_QUEUE_TIMEOUT", "0.2")
+os.environ.setdefault("EV_NL_CACHE_PERSIST", "0")
+sys.path.insert(0, ".")
+
+import config  # noqa: E402
+from models.db import init_db  # noqa: E402
+from ai.client import ai_client, FakeClient  # noqa: E402
+from ai.chatbot import chat_with_bot  # noqa: E402
+from ai.nl_query import parse_natural_language_query  # noqa: E402
+from ai.recommender import recommend_station  # noqa: E402
+
+STATIONS = [("Central Hub", "Delhi", 4, 12.0, 8), ("Tech Park", "Bangalore", 2, 9.5, 6)]
+
+
+class TrackingClient(FakeClient):
+    """FakeClient that records the peak number of concurrent calls"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0
+        self.peak = 0
+        self._track = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self._track:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return super().generate_content(model, contents, config)
+        finally:
+            with self._track:
+                self.active -= 1
+
+
+def check(ok, message):
+    print(f"{'✓' if ok else '✗'} {message}")
+    return 0 if ok else 1
+
+
+def main():
+    init_db()
+    failures = 0
+
+    # One client behind all three features
+    fake = FakeClient(lambda contents: '{"sort_by": "price", "intent": "cheapest"}'
+                      if isinstance(contents, str) and "Parse this" in contents
+                      else '{"why": "Good", "benefits": [], "tip": "Go"}')
+    ai_client.set_client(fake)
+    chat_with_bot("Where is the cheapest station?")
+    recommend_station(80, 20, STATIONS)
+    filters = parse_natural_language_query("cheapest station near me")
+    callers = set(ai_client.stats()["callers"])
+    failures += check(len(fake.calls) == 3 and callers == {"chatbot", "recommender", "nl_query"},
+                      f"chatbot, recommender and NL search share one client ({len(fake.calls)} calls)")
+    failures += check(filters["query_method"] == "ai", "NL search parses through the shared client")
+
+    # Deadline: a 2 s call is abandoned after AI_TIMEOUT
+    ai_client.set_client(FakeClient("never used", delay=2.0))
+    start = time.perf_counter()
+    reply, _ = chat_with_bot("hello")
+    elapsed = time.perf_counter() - start
+    failures += check(elapsed < config.AI_TIMEOUT + 0.2 and reply != "never used",
+                      f"slow call answered by fallback after {elapsed:.2f} s (deadline {config.AI_TIMEOUT} s)")
+    time.sleep(2.0)  # let the abandoned call finish and free its slot
+
+    # Concurrency bound with a hanging LLM
+    hanging = TrackingClient("late", delay=1.0)
+    ai_client.set_client(hanging)
+    requests = 12
+    start = time.perf_counter()
+    with ThreadPoolExecutor(requests) as pool:
+        replies = list(pool.map(lambda i: chat_with_bot(f"question {i}")[0], range(requests)))
+    elapsed = time.perf_counter() - start
+    outcomes = ai_client.stats()["callers"]["chatbot"]
+    failures += check(hanging.peak <= config.AI_MAX_CONCURRENT,
+                      f"{hanging.peak} calls in flight at most (limit {config.AI_MAX_CONCURRENT})")
+    failures += check(outcomes["busy"] >= requests - config.AI_MAX_CONCURRENT,
+                      f"{outcomes['busy']} of {requests} requests fell back after waiting "
+                      f"at most {config.AI_QUEUE_TIMEOUT} s for a slot")
+    failures += check(all(replies) and elapsed < config.AI_TIMEOUT + 0.5,
+                      f"all {requests} requests answered in {elapsed:.2f} s")
+    time.sleep(1.2)
+
+    stats = ai_client.stats()["callers"]["chatbot"]
+    failures += check(sum(stats["histogram"].values()) == stats["calls"] and stats["timeout"] >= 1,
+                      f"histogram counts {stats['calls']} chatbot calls "
+                      f"({stats['ok']} ok, {stats['timeout']} timed out, {stats['busy']} busy)")
+    print(f"\nchatbot latency: {stats['histogram']}")
+
+    if failures:
+        sys.exit(1)
+    print("\n✓ Shared client enforces deadlines and the concurrency limit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Query-plan regression check for the hot SQL paths.
+
+Collects every SQL statement passed to .execute() in app.py, routes/,
+ai/, models/charging.py, models/occupancy.py and models/hourly_stats.py
+(literals and module or local string constants, also when concatenated
+or interpolated into f-strings), seeds a scratch database with a realistic
+volume of stations, sessions and queue entries, runs EXPLAIN QUERY PLAN
+on each statement and fails if any of them falls back to a full scan of
+charging_sessions, stations, waiting_queue or station_hourly_stats.
+
+Pages that intentionally list whole tables (admin screens, "all
+stations" views) are whitelisted in ALLOWED_SCANS. Statements in
+EXPECTED_PLANS must also use the given plan step (the hourly rollup
+reads seek its (station_id, hour) key).
+
+Usage:
+    python scripts/check_query_plans.py
+"""
+import ast
+import os
+import random
+import re
+import sys
+import tempfile
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "plans.db"))
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db  # noqa: E402
+from models.station import build_station_query  # noqa: E402
+
+SOURCES = ["app.py", "models/charging.py", "models/occupancy.py", "models/hourly_stats.py", "routes", "ai"]
+HOT_TABLES = {"charging_sessions", "stations", "waiting_queue", "station_hourly_stats"}
+
+# (file, function) pairs whose queries are expected to read whole tables
+ALLOWED_SCANS = {
+    ("routes/admin_routes.py", "admin_dashboard"),
+    ("routes/admin_routes.py", "admin_stations"),
+    ("routes/admin_routes.py", "admin_queue"),
+    ("routes/station_routes.py", "user_stations"),
+    ("ai/scoring.py", "_load_scorer"),
+    ("ai/map_utils.py", "get_all_stations_with_location"),
+    ("ai/geo_index.py", "_load_index"),
+    ("ai/forecast.py", "load_demand_model"),
+    ("ai/batch_analytics.py", "run_batch_analytics"),
+    ("models/occupancy.py", "_load_all"),
+    ("models/occupancy.py", "check_occupancy"),
+    ("models/hourly_stats.py", "_station_ids"),
+}
+
+# (file, SQL constant) -> plan step it must use. The rollup reads must
+# seek the (station_id, hour) primary key, not just avoid a full scan.
+EXPECTED_PLANS = {
+    ("ai/analytics.py", "_WINDOW_SQL"):
+        "SEARCH station_hourly_stats USING PRIMARY KEY (station_id=? AND hour>?)",
+    ("ai/batch_analytics.py", "_CHUNK_HOURS_SQL"):
+        "SEARCH station_hourly_stats USING PRIMARY KEY (station_id>? AND station_id<?)",
+}
+
+# (file, function) pairs that execute SQL assembled at run time; the
+# station searches are covered by built_statements() below
+ALLOWED_DYNAMIC = {
+}
+
+STATIONS = 2000
+USERS = 5000
+SESSIONS = 200000
+QUEUE = 20000
+
+
+def iter_source_files():
+    for source in SOURCES:
+        if source.endswith(".py"):
+            yield source
+            continue
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    yield os.path.join(root, name).replace(os.sep, "/")
+
+
+def _sql_text(node, constants):
+    """
+    SQL text of an execute() argument, or None if it cannot be resolved:
+    string literals, names of string constants (module level or assigned
+    earlier in the function), + concatenations and f-strings of those.
+    f-string holes that are not constants become '?'.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _sql_text(node.left, constants), _sql_text(node.right, constants)
+        return left + right if left is not None and right is not None else None
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for part in node.values:
+            if isinstance(part, ast.Constant):
+                parts.append(part.value)
+            else:
+                text = _sql_text(part.value, constants)
+                parts.append(text if text is not None else "?")
+        return "".join(parts)
+    return None
+
+
+def _string_constants(body, constants):
+    """constants plus the NAME = <string> assignments of a statement list"""
+    constants = dict(constants)
+    for stmt in body:
+        if (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)):
+            text = _sql_text(stmt.value, constants)
+            if text is not None:
+                constants[stmt.targets[0].id] = text
+    return constants
+
+
+def collect_statements():
+    """
+    (path, function, line, sql, name) for every SQL statement passed to
+    .execute(); name is the constant the SQL came from, if any. Exits
+    if an argument cannot be resolved and is not in ALLOWED_DYNAMIC.
+    """
+    statements = []
+    unresolved = []
+    for path in iter_source_files():
+        tree = ast.parse(open(path, encoding="utf-8").read(), filename=path)
+        module_constants = _string_constants(tree.body, {})
+        for func in ast.walk(tree):
+            if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            constants = _string_constants(func.body, module_constants)
+            for node in ast.walk(func):
+                if not (isinstance(node, ast.Call)
+                        and isinstance(node.func, ast.Attribute)
+                        and node.func.attr == "execute"
+                        and node.args):
+                    continue
+                arg = node.args[0]
+                sql = _sql_text(arg, constants)
+                if sql is None:
+                    if (path, func.name) not in ALLOWED_DYNAMIC:
+                        unresolved.append((path, node.lineno, func.name))
+                    continue
+                verb = sql.strip().split(None, 1)[0].upper()
+                if verb not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+                    continue
+                name = arg.id if isinstance(arg, ast.Name) else None
+                statements.append((path, func.name, node.lineno, sql, name))
+    # Nested helper functions are walked twice (as themselves and as part
+    # of their parent); keep the innermost owner of each statement
+    unique = {}
+    for path, name, line, sql, constant in statements:
+        unique[(path, line)] = (path, name, line, sql, constant)
+    unresolved = sorted({entry for entry in unresolved if (entry[0], entry[1]) not in unique})
+    if unresolved:
+        for path, line, name in unresolved:
+            print(f"✗ {path}:{line} {name}: execute() argument is not a literal or string constant")
+        print("Resolve the SQL to a constant or add the function to ALLOWED_DYNAMIC")
+        sys.exit(1)
+    return sorted(unique.values())
+
+
+def built_statements():
+    """Representative station searches assembled by models/station.py"""
+    specs = [
+        ({}, None, None),
+        ({"green_score_min": 7}, None, "green_score"),
+        ({"price_max": 12.0}, None, "price"),
+        ({"green_score_min": 4, "price_max": 15.0, "min_chargers": 2}, None, None),
+        ({"max_distance": 10}, (28.61, 77.21), "distance"),
+        ({"green_score_min": 7, "max_distance": 25}, (19.08, 72.88), "green_score"),
+        ({"max_distance": 10}, (12.97, 77.59), "rank"),
+    ]
+    weights = {"green_score": 0.5, "price": -0.5, "distance": -1.0}
+    statements = []
+    for filters, origin, sort_by in specs:
+        sql, _ = build_station_query(filters, origin=origin, sort_by=sort_by, limit=50, weights=weights)
+        label = f"build_station_query({filters}, sort_by={sort_by})"
+        statements.append(("models/station.py", label, 0, sql, None))
+    return statements
+
+
+def seed(conn):
+    rnd = random.Random(42)
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO users (name, email, password, role) VALUES (?, ?, 'x', ?)",
+        [(f"User {i}", f"user{i}@example.com", "owner" if i % 20 == 0 else "user")
+         for i in range(USERS)]
+    )
+    cur.executemany("""
+        INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(f"Station {i}", f"Area {i % 97}", rnd.randint(1, 12),
+           round(rnd.uniform(7, 15), 2), rnd.randint(1, 10), rnd.randrange(0, USERS, 20),
+           1 if i % 10 else 0)
+          for i in range(STATIONS)])
+    sessions = []
+    for _ in range(SESSIONS):
+        station = rnd.randrange(STATIONS)
+        sessions.append((
+            rnd.randrange(USERS), station + 1, f"Station {station}", 20.0, 200.0,
+            rnd.choice(["Completed"] * 8 + ["Active", "Cancelled"]),
+            f"-{rnd.randrange(90 * 24 * 60)} minutes", rnd.randint(10, 180)
+        ))
+    cur.executemany("""
+        INSERT INTO charging_sessions
+        (user_id, station_id, station_name, units, amount, status, started_at, duration_minutes)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now', ?), ?)
+    """, sessions)
+    queue = []
+    for _ in range(QUEUE):
+        station = rnd.randrange(STATIONS)
+        queue.append((station + 1, f"Station {station}", rnd.randrange(USERS)))
+    cur.executemany(
+        "INSERT INTO waiting_queue (station_id, station_name, user_id) VALUES (?, ?, ?)",
+        queue
+    )
+    conn.commit()
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in re.findall(r"(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        aliases[table] = table
+        if alias and alias.upper() not in ("WHERE", "ON", "JOIN", "SET", "VALUES",
+                                           "ORDER", "GROUP", "LIMIT", "INNER", "LEFT"):
+            aliases[alias] = table
+    return aliases
+
+
+def query_plan(conn, sql):
+    named = set(re.findall(r"(?<![\w:']):([A-Za-z_]\w*)", sql))
+    params = {name: 1 for name in named} if named else [1] * sql.count("?")
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def full_scans(conn, sql):
+    plan = query_plan(conn, sql)
+    aliases = table_aliases(sql)
+    scans = []
+    for detail in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match and aliases.get(match.group(1)) in HOT_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def main():
+    init_db()
+    conn = get_db()
+    seed(conn)
+
+    failures = []
+    expected = dict(EXPECTED_PLANS)
+    statements = collect_statements() + built_statements()
+    for path, func, line, sql, constant in statements:
+        scans = full_scans(conn, sql)
+        allowed = (path, func) in ALLOWED_SCANS
+        status = "✓" if not scans else ("~" if allowed else "✗")
+        print(f"{status} {path}:{line} {func}" + (f"  [{'; '.join(scans)}]" if scans else ""))
+        if scans and not allowed:
+            failures.append((path, line, func, scans))
+
+        step = expected.pop((path, constant), None)
+        if step is not None:
+            plan = query_plan(conn, sql)
+            ok = step in plan
+            print(f"  {'✓' if ok else '✗'} {constant}: {step}" + ("" if ok else f"  [{'; '.join(plan)}]"))
+            if not ok:
+                failures.append((path, line, func, plan))
+    conn.close()
+
+    for path, constant in expected:
+        print(f"✗ {path}: {constant} is no longer executed")
+        failures.append((path, 0, constant, []))
+
+    print(f"\nChecked {len(statements)} statements")
+    if failures:
+        print(f"✗ {len(failures)} hot queries fall back to a full table scan or miss their expected plan")
+        sys.exit(1)
+    print("✓ All hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Load test: database queries per minute for queue-status updates,
+client polling vs Server-Sent Events push.
+
+Queues N users at a full station and runs one simulated minute of each
+mode against a scratch database, with the same driver stopping and
+restarting a charging session at a fixed rate in both:
+
+- polling: every client GETs /api/queue-status every 5 seconds
+- push:    every client holds /api/queue-stream open; the server sends
+           an event only when the queue changes, and re-reads state
+           once per heartbeat (15 seconds)
+
+Time is compressed by SCALE so a simulated minute takes a few seconds.
+Queries are counted with the pool's statement trace (EV_DB_COUNT_QUERIES).
+
+Usage:
+    python scripts/load_queue_updates.py [clients] [changes_per_minute]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+SCALE = 20
+POLL_INTERVAL = 5.0
+HEARTBEAT = 15.0
+
+# Never load-test the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "load.db"))
+os.environ["EV_DB_COUNT_QUERIES"] = "1"
+os.environ["EV_QUEUE_STREAM_HEARTBEAT"] = str(HEARTBEAT / SCALE)
+sys.path.insert(0, ".")
+
+from app import app  # noqa: E402
+from models.db import get_db, get_pool_stats  # noqa: E402
+from models.charging import join_queue  # noqa: E402
+from models.queue_events import hub  # noqa: E402
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+CHANGES_PER_MINUTE = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+STATION = "Load Test Station"
+DRIVER_ID = 1
+
+
+def setup():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO users (name, email, password, role) VALUES (?, ?, 'x', 'user')",
+        [(f"Load User {i}", f"load{i}@example.com") for i in range(CLIENTS + 1)]
+    )
+    cur.execute("""
+        INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved)
+        VALUES (?, 'Load Area', 1, 10, 5, 0, 1)
+    """, (STATION,))
+    station_id = cur.lastrowid
+    cur.execute("SELECT id FROM users WHERE email LIKE 'load%' ORDER BY id")
+    user_ids = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return station_id, user_ids[0], user_ids[1:]
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["role"] = "user"
+        sess["user_id"] = user_id
+    return client
+
+
+def fill_queue(station_id, user_ids):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM waiting_queue WHERE station_id=?", (station_id,))
+    conn.commit()
+    for user_id in user_ids:
+        join_queue(conn, station_id, STATION, user_id)
+    conn.close()
+
+
+def driver(client, stop):
+    """Stop the running session and start a new one (two queue changes)"""
+    interval = 60.0 / CHANGES_PER_MINUTE / SCALE
+    while not stop.wait(interval):
+        conn = get_db()
+        row = conn.execute(
+            "SELECT id FROM charging_sessions WHERE user_id=? AND status='Active'",
+            (DRIVER_ID,)
+        ).fetchone()
+        conn.close()
+        if row:
+            client.post(f"/user/stop-charging/{row[0]}")
+        client.post(f"/user/charge/{STATION}", data={"units": "10", "price": "10"})
+
+
+def poller(client, stop, counts):
+    while not stop.is_set():
+        client.get(f"/api/queue-status/{STATION}")
+        counts["requests"] += 1
+        stop.wait(POLL_INTERVAL / SCALE)
+
+
+def listener(client, stop, counts):
+    # Each listener runs on its own thread, as under a threaded server
+    response = client.get(f"/api/queue-stream/{STATION}", buffered=False,
+                          environ_overrides={"wsgi.multithread": True})
+    counts["requests"] += 1
+    try:
+        for chunk in response.response:
+            if chunk.startswith(b"data:"):
+                counts["events"] += 1
+            if stop.is_set():
+                break
+    finally:
+        response.close()
+
+
+def run(mode, station_id, driver_client, waiting):
+    fill_queue(station_id, waiting)
+    counts = {"requests": 0, "events": 0}
+    stop = threading.Event()
+    target = poller if mode == "polling" else listener
+    threads = [threading.Thread(target=target, args=(client_for(u), stop, counts))
+               for u in waiting]
+    threads.append(threading.Thread(target=driver, args=(driver_client, stop)))
+
+    before = get_pool_stats()["queries"]
+    for t in threads:
+        t.start()
+    time.sleep(60.0 / SCALE)
+    stop.set()
+    for t in threads:
+        t.join()
+    counts["queries"] = get_pool_stats()["queries"] - before
+    return counts
+
+
+def main():
+    global DRIVER_ID
+    station_id, DRIVER_ID, waiting = setup()
+    driver_client = client_for(DRIVER_ID)
+    # Occupy the only charger so everyone else has to wait
+    driver_client.post(f"/user/charge/{STATION}", data={"units": "10", "price": "10"})
+
+    print(f"{CLIENTS} waiting clients, {CHANGES_PER_MINUTE} queue changes/min, "
+          f"1 simulated minute per mode (x{SCALE} time compression)\n")
+    results = {}
+    for mode in ("polling", "push"):
+        results[mode] = run(mode, station_id, driver_client, waiting)
+        r = results[mode]
+        print(f"{mode:8s} queries/min: {r['queries']:6d}   "
+              f"HTTP requests: {r['requests']:5d}   pushed events: {r['events']}")
+
+    print(f"\nStreams: {hub.stats()}")
+    ratio = results["polling"]["queries"] / max(results["push"]["queries"], 1)
+    print(f"Push uses {ratio:.1f}x fewer queries per minute than polling")
+    if not results["push"]["events"]:
+        print("✗ No pushed events; streams were refused")
+        sys.exit(1)
+    if results["push"]["queries"] >= results["polling"]["queries"]:
+        print("✗ Push path did not reduce database load")
+        sys.exit(1)
+    print("✓ Push path reduces database load")
+
+
+if __name__ == "__main__":
+    main()
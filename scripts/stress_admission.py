@@ -0,0 +1,129 @@
+"""
+Concurrency check for charger admission.
+
+Many threads race for the chargers of one small station through
+models.charging.admit_or_enqueue, completing each session they get. A
+monitor samples the number of Active sessions throughout and the script
+fails if it ever exceeds stations.chargers, if anyone was neither
+admitted nor queued, or if the in-memory occupancy registry (updated
+write-through by every thread) disagrees with SQL at the end.
+
+Usage:
+    python scripts/stress_admission.py [threads] [chargers]
+"""
+import os
+import sys
+import tempfile
+import threading
+
+# Never touch the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "admission.db"))
+os.environ.setdefault("EV_DB_POOL_SIZE", "32")
+sys.path.insert(0, ".")
+
+from models.db import get_db, init_db, retry_on_busy  # noqa: E402
+from models.charging import admit_or_enqueue, get_station_occupancy  # noqa: E402
+from models.occupancy import registry  # noqa: E402
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+CHARGERS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+ROUNDS = 20
+STATION = "Race Station"
+
+
+@retry_on_busy
+def attempt(station_id, user_id):
+    conn = get_db()
+    try:
+        return admit_or_enqueue(conn, station_id, STATION, user_id, 10, 100)
+    finally:
+        conn.close()
+
+
+@retry_on_busy
+def complete(station_id, session_id):
+    conn = get_db()
+    try:
+        conn.execute("UPDATE charging_sessions SET status='Completed' WHERE id=?", (session_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    registry.session_ended(station_id)
+
+
+def active_count(station_id):
+    conn = get_db()
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM charging_sessions WHERE station_id=? AND status='Active'",
+            (station_id,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    init_db()
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO stations (name, location, chargers, price, green_score, approved) VALUES (?, 'Test', ?, 10, 5, 1)",
+        (STATION, CHARGERS)
+    )
+    station_id = cur.lastrowid
+    conn.commit()
+    registry.rebuild(conn)
+    conn.close()
+
+    outcomes = {"charging": 0, "queued": 0}
+    errors = []
+    peak = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def monitor():
+        while not stop.is_set():
+            peak[0] = max(peak[0], active_count(station_id))
+
+    def worker(user_id):
+        for _ in range(ROUNDS):
+            try:
+                conn = get_db()
+                get_station_occupancy(conn, STATION)
+                conn.close()
+                outcome, value = attempt(station_id, user_id)
+                with lock:
+                    outcomes[outcome] += 1
+                if outcome == "charging":
+                    complete(station_id, value)
+            except Exception as e:
+                errors.append(repr(e))
+
+    watcher = threading.Thread(target=monitor)
+    watcher.start()
+    threads = [threading.Thread(target=worker, args=(n + 1,)) for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    watcher.join()
+    peak[0] = max(peak[0], active_count(station_id))
+
+    print(f"Attempts: {THREADS * ROUNDS}, admitted: {outcomes['charging']}, queued: {outcomes['queued']}")
+    print(f"Peak active sessions: {peak[0]} (chargers: {CHARGERS})")
+    drift = registry.check()
+    print(f"Registry: {registry.get(station_id)} {registry.stats()}")
+
+    if errors or peak[0] > CHARGERS or sum(outcomes.values()) != THREADS * ROUNDS:
+        print(f"✗ Admission is not atomic ({len(errors)} errors, e.g. {errors[:3]})")
+        sys.exit(1)
+    if drift:
+        print(f"✗ Occupancy registry drifted from SQL: {drift}")
+        sys.exit(1)
+    print("✓ Active sessions never exceeded the number of chargers")
+    print("✓ Occupancy registry matches SQL")
+
+
+if __name__ == "__main__":
+    main()
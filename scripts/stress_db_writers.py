@@ -0,0 +1,106 @@
+"""
+Concurrent-writer stress test for the pooled SQLite layer.
+
+Runs many threads that hammer the charging write path (insert session,
+join queue, complete session, dequeue) against a scratch copy of the
+schema and fails if any "database is locked" error escapes the
+busy_timeout + retry_on_busy handling.
+
+Usage:
+    python scripts/stress_db_writers.py [threads] [ops_per_thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Never stress the real database
+os.environ.setdefault("EV_DB_PATH", os.path.join(tempfile.mkdtemp(), "stress.db"))
+os.environ.setdefault("EV_DB_POOL_SIZE", "16")
+sys.path.insert(0, ".")
+
+from models.db import get_db, get_pool_stats, init_db, retry_on_busy  # noqa: E402
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+OPS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+@retry_on_busy
+def charge_cycle(user_id, station_id):
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT COUNT(*) FROM charging_sessions WHERE station_id=? AND status='Active'",
+            (station_id,)
+        )
+        cur.fetchone()
+        cur.execute("""
+            INSERT INTO charging_sessions (user_id, station_id, units, amount, status)
+            VALUES (?, ?, 10, 100, 'Active')
+        """, (user_id, station_id))
+        session_id = cur.lastrowid
+        cur.execute(
+            "INSERT INTO waiting_queue (station_id, user_id) VALUES (?, ?)",
+            (station_id, user_id)
+        )
+        conn.commit()
+
+        cur.execute(
+            "UPDATE charging_sessions SET status='Completed' WHERE id=?",
+            (session_id,)
+        )
+        cur.execute("""
+            DELETE FROM waiting_queue
+            WHERE id = (
+                SELECT id FROM waiting_queue
+                WHERE station_id=?
+                ORDER BY joined_at ASC
+                LIMIT 1
+            )
+        """, (station_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def worker(user_id, errors):
+    for i in range(OPS):
+        try:
+            charge_cycle(user_id, i % 4 + 1)
+        except Exception as e:
+            errors.append(repr(e))
+
+
+def main():
+    init_db()
+    errors = []
+    threads = [threading.Thread(target=worker, args=(n, errors)) for n in range(THREADS)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    conn = get_db()
+    completed = conn.execute(
+        "SELECT COUNT(*) FROM charging_sessions WHERE status='Completed'"
+    ).fetchone()[0]
+    conn.close()
+
+    total = THREADS * OPS
+    print(f"{THREADS} threads x {OPS} cycles in {elapsed:.2f}s ({total / elapsed:.0f} cycles/s)")
+    print(f"Completed sessions: {completed}/{total}")
+    print(f"Pool: {get_pool_stats()}")
+
+    if errors or completed != total:
+        print(f"✗ {len(errors)} errors, e.g. {errors[:3]}")
+        sys.exit(1)
+    print("✓ No lock errors under concurrent writers")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@ import sqlite3
 import datetime
 import random
 from hashlib import md5
+from models.migrations import KNOWN_COORDINATES
 
 # Database path
 DB_PATH = 'database/ev.db'
@@ -103,11 +104,12 @@ def seed_stations(conn):
     ]
     
     for name, location, chargers, price, green_score, owner_id, approved in stations:
+        lat, lng = KNOWN_COORDINATES.get(name, (None, None))
         try:
             cursor.execute('''
-                INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (name, location, chargers, price, green_score, owner_id, approved))
+                INSERT INTO stations (name, location, chargers, price, green_score, owner_id, approved, lat, lng)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, location, chargers, price, green_score, owner_id, approved, lat, lng))
             print(f"  ✅ Created: {name} ({chargers} chargers, ₹{price}/kWh, score: {green_score})")
         except sqlite3.IntegrityError:
             print(f"  ⚠️  {name} already exists")
@@ -152,9 +154,9 @@ def seed_charging_sessions(conn):
     for user_id, station_name, units, amount, status in sessions:
         try:
             cursor.execute('''
-                INSERT INTO charging_sessions (user_id, station_name, units, amount, status, duration_minutes)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, station_name, units, amount, status, random.randint(30, 120)))
+                INSERT INTO charging_sessions (user_id, station_id, station_name, units, amount, status, duration_minutes)
+                VALUES (?, (SELECT id FROM stations WHERE name = ? ORDER BY id LIMIT 1), ?, ?, ?, ?, ?)
+            ''', (user_id, station_name, station_name, units, amount, status, random.randint(30, 120)))
             print(f"  ✅ Session: User {user_id} charged {units}kWh at {station_name}")
         except sqlite3.IntegrityError as e:
             print(f"  ⚠️  Error creating session: {e}")
@@ -171,25 +173,28 @@ def seed_waiting_queue(conn):
     cursor.execute("SELECT id FROM users WHERE role='user' LIMIT 3")
     user_ids = [row[0] for row in cursor.fetchall()]
     
-    cursor.execute("SELECT name FROM stations LIMIT 3")
-    station_names = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id, name FROM stations LIMIT 3")
+    stations = [(row[0], row[1]) for row in cursor.fetchall()]
     
-    if not user_ids or not station_names:
+    if not user_ids or not stations:
         print("  ⚠️  Not enough users or stations")
         return
     
     queue_entries = [
-        (station_names[0], user_ids[0]),
-        (station_names[1], user_ids[1]),
-        (station_names[2], user_ids[2]),
+        (stations[0], user_ids[0]),
+        (stations[1], user_ids[1]),
+        (stations[2], user_ids[2]),
     ]
     
-    for station_name, user_id in queue_entries:
+    for (station_id, station_name), user_id in queue_entries:
         try:
+            # Take the next per-station queue sequence number
+            cursor.execute("INSERT OR IGNORE INTO queue_heads (station_id) VALUES (?)", (station_id,))
+            cursor.execute("UPDATE queue_heads SET next_seq = next_seq + 1 WHERE station_id = ?", (station_id,))
             cursor.execute('''
-                INSERT INTO waiting_queue (station_name, user_id)
-                VALUES (?, ?)
-            ''', (station_name, user_id))
+                INSERT INTO waiting_queue (station_id, station_name, user_id, seq)
+                VALUES (?, ?, ?, (SELECT next_seq FROM queue_heads WHERE station_id = ?))
+            ''', (station_id, station_name, user_id, station_id))
             print(f"  ✅ Queue: User {user_id} added to {station_name}")
         except sqlite3.IntegrityError:
             print(f"  ⚠️  Queue entry already exists")